@@ -0,0 +1,176 @@
+import os
+import shutil
+import tarfile
+import zipfile
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.utils import secure_filename
+
+from lake_files import publish_file
+
+# Archive types accepted by batch uploads; TARs are read as a stream, ZIPs
+# through their central directory (spooled to a temp file when not seekable)
+ZIP_EXTENSIONS = ('.zip',)
+TAR_EXTENSIONS = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+# Request body content types read as a raw archive instead of a multipart form
+ARCHIVE_CONTENT_TYPES = {
+    'application/zip': '.zip',
+    'application/x-zip-compressed': '.zip',
+    'application/x-tar': '.tar',
+    'application/gzip': '.tar.gz',
+    'application/x-gzip': '.tar.gz',
+    'application/x-gtar': '.tar.gz',
+}
+
+# Extractions running alongside the upload; archives larger than this many members are cut off
+EXTRACT_WORKERS = int(os.environ.get('UPLOAD_EXTRACT_WORKERS', min(4, os.cpu_count() or 1)))
+MAX_MEMBERS = 10_000
+COPY_BUFFER_BYTES = 1 << 20
+
+# Per-member outcomes
+STATUS_LOADED = 'loaded'
+STATUS_SAVED = 'saved'  # Published, but extracting it failed
+STATUS_SKIPPED = 'skipped'
+STATUS_ERROR = 'error'
+
+
+def archive_type(filename):
+    name = filename.lower()
+    if name.endswith(ZIP_EXTENSIONS):
+        return 'zip'
+    if name.endswith(TAR_EXTENSIONS):
+        return 'tar'
+    return None
+
+
+# Directories, macOS resource forks and hidden files are not lake data
+def _is_data_member(name):
+    parts = name.replace('\\', '/').split('/')
+    return bool(parts[-1]) and '__MACOSX' not in parts and not parts[-1].startswith('.')
+
+
+def iter_zip_members(stream):
+    """Yield (member name, file object) of a ZIP archive, opening one member at a time."""
+    spooled = None
+    if not (hasattr(stream, 'seekable') and stream.seekable()):
+        # The central directory is at the end of the archive
+        spooled = tempfile.TemporaryFile()
+        shutil.copyfileobj(stream, spooled, COPY_BUFFER_BYTES)
+        spooled.seek(0)
+        stream = spooled
+    try:
+        with zipfile.ZipFile(stream) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not _is_data_member(info.filename):
+                    continue
+                with archive.open(info) as member:
+                    yield info.filename, member
+    finally:
+        if spooled is not None:
+            spooled.close()
+
+
+def iter_tar_members(stream):
+    """Yield (member name, file object) of a (compressed) TAR archive while it is read as a stream."""
+    with tarfile.open(fileobj=stream, mode='r|*') as archive:
+        for info in archive:
+            if not info.isfile() or not _is_data_member(info.name):
+                continue
+            yield info.name, archive.extractfile(info)
+
+
+class BatchUploader:
+    """
+    Publish many lake files from one request: plain files of a multi-file
+    upload and the members of ZIP or TAR archives. Members are copied
+    straight from the archive stream into their lake folder (see
+    lake_files.publish_file); each published file is handed to a pool
+    that extracts it while the rest of the archive is still being read.
+    Args:
+        directory_for (callable): Lake folder of a file name, or None if the type is not accepted
+        extract_func (callable): Extracts a published file; returns a frame or records
+        max_workers (int): Parallel extractions
+        layout (LakeLayout): Shard placement of published files; None writes into the folder itself
+    """
+
+    def __init__(self, directory_for, extract_func, max_workers=EXTRACT_WORKERS, layout=None):
+        self.directory_for = directory_for
+        self.layout = layout
+        self.extract_func = extract_func
+        self.max_workers = max_workers
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _executor(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='upload-extract')
+            return self._pool
+
+    def _extract(self, file_path):
+        data = self.extract_func(file_path)
+        return len(data) if data is not None else 0
+
+    # Publish one file and queue its extraction; returns (result, future or None)
+    def _publish(self, source, member, stream):
+        result = {'source': source, 'member': member}
+        file_name = secure_filename(os.path.basename(member.replace('\\', '/')))
+        directory = self.directory_for(file_name) if file_name else None
+        if directory is None:
+            result.update(status=STATUS_SKIPPED, error="Unsupported file type")
+            return result, None
+        file_path = (self.layout.path_for(directory, file_name) if self.layout is not None
+                     else os.path.join(directory, file_name))
+        try:
+            def write(tmp_path):
+                with open(tmp_path, 'wb') as out:
+                    shutil.copyfileobj(stream, out, COPY_BUFFER_BYTES)
+            publish_file(file_path, write)
+        except Exception as e:
+            result.update(status=STATUS_ERROR, error=str(e))
+            return result, None
+        result.update(file_name=file_name, file_path=file_path, bytes=os.path.getsize(file_path))
+        return result, self._executor().submit(self._extract, file_path)
+
+    def _members(self, filename, stream):
+        kind = archive_type(filename)
+        if kind is None:
+            yield filename, stream
+            return
+        members = iter_zip_members(stream) if kind == 'zip' else iter_tar_members(stream)
+        for count, (name, member) in enumerate(members):
+            if count >= MAX_MEMBERS:
+                raise ValueError(f"{filename} has more than {MAX_MEMBERS} files")
+            yield name, member
+
+    def ingest(self, uploads):
+        """
+        Publish and extract every file of a batch.
+        Args:
+            uploads (iterable): (file name, binary stream) of each uploaded file or archive
+        Returns:
+            Dict with the per-member results and totals
+        """
+        pending = []
+        for filename, stream in uploads:
+            try:
+                for member, member_stream in self._members(filename, stream):
+                    pending.append(self._publish(filename, member, member_stream))
+            except (tarfile.TarError, zipfile.BadZipFile, ValueError, EOFError, OSError) as e:
+                pending.append(({'source': filename, 'member': None, 'status': STATUS_ERROR,
+                                 'error': f"Unreadable archive: {e}"}, None))
+
+        results = []
+        for result, future in pending:
+            if future is not None:
+                try:
+                    result.update(status=STATUS_LOADED, rows=future.result())
+                except Exception as e:
+                    result.update(status=STATUS_SAVED, error=f"Extraction failed: {e}")
+            results.append(result)
+        counts = {status: sum(1 for result in results if result['status'] == status)
+                  for status in (STATUS_LOADED, STATUS_SAVED, STATUS_SKIPPED, STATUS_ERROR)}
+        return {'files': results, 'counts': counts, 'rows': sum(result.get('rows', 0) for result in results)}
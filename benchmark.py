@@ -0,0 +1,637 @@
+import os
+import io
+import sys
+import json
+import time
+import signal
+import socket
+import shutil
+import subprocess
+import urllib.request
+import platform
+import tempfile
+import argparse
+import statistics
+import contextlib
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import benchmark_data
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Scenarios run by default, in order; 'listing' (100K files), 'serialize' (1M records)
+# and 'serve' (real servers) are opt-in
+SCENARIOS = ['extract', 'summarize', 'sql_load', 'http', 'rates']
+
+
+class BenchmarkRunner:
+    """
+    Times benchmark cases and collects machine-readable results.
+    Args:
+        repeat (int): Number of timed runs per case
+        quiet (bool): Whether to swallow the pipeline's print output while timing
+    """
+
+    def __init__(self, repeat=3, quiet=True):
+        self.repeat = repeat
+        self.quiet = quiet
+        self.results = []
+
+    def time_case(self, scenario, name, func, rows=None, setup=None):
+        timings = []
+        result = None
+        for _ in range(self.repeat):
+            if setup:
+                setup()
+            sink = io.StringIO() if self.quiet else sys.stdout
+            with contextlib.redirect_stdout(sink):
+                start = time.perf_counter()
+                result = func()
+                timings.append(time.perf_counter() - start)
+        best = min(timings)
+        entry = {
+            'scenario': scenario,
+            'name': name,
+            'rows': rows,
+            'repeat': self.repeat,
+            'best_s': round(best, 6),
+            'median_s': round(statistics.median(timings), 6),
+            'mean_s': round(statistics.mean(timings), 6),
+            'rows_per_s': round(rows / best, 1) if rows and best > 0 else None,
+        }
+        self.results.append(entry)
+        print(f"[{scenario}] {name}: best {best:.4f}s over {self.repeat} runs", file=sys.stderr)
+        return result
+
+    def add_result(self, scenario, name, **fields):
+        entry = {'scenario': scenario, 'name': name}
+        entry.update(fields)
+        self.results.append(entry)
+        print(f"[{scenario}] {name}: {fields}", file=sys.stderr)
+        return entry
+
+    # Run untimed preparation work without its print output
+    def prepare(self, func):
+        sink = io.StringIO() if self.quiet else sys.stdout
+        with contextlib.redirect_stdout(sink):
+            return func()
+
+
+# Repoint a module's lake directory globals at a synthetic lake
+def point_at_lake(module, root):
+    module.csv_dir = os.path.join(root, 'csv')
+    module.pdf_dir = os.path.join(root, 'pdf')
+    module.txt_dir = os.path.join(root, 'txt')
+    if hasattr(module, 'quarantine_dir'):
+        module.quarantine_dir = os.path.join(root, 'quarantine')
+    if hasattr(module, 'snapshot_dir'):
+        module.snapshot_dir = os.path.join(root, 'snapshots')
+
+
+def _import_apps(workdir):
+    # Both Flask apps read their database URL at import time; point them at SQLite stand-ins
+    os.environ.setdefault('RETURNS_DATABASE_URL', f"sqlite:///{os.path.join(workdir, 'returns.db')}")
+    os.environ.setdefault('PURCHASES_DATABASE_URL', f"sqlite:///{os.path.join(workdir, 'purchases.db')}")
+    os.environ.setdefault('LAKE_SNAPSHOT_DIR', os.path.join(workdir, 'snapshots'))
+    import data_lake_solution
+    import data_process_calculate
+    import purchase_data_api
+    import test as purchases_postgres_app
+    return data_lake_solution, data_process_calculate, purchase_data_api, purchases_postgres_app
+
+
+def run_extract(runner, lakes, apps):
+    returns_app, calculate, purchase_api, _ = apps
+    returns_files, purchase_files = lakes['returns_files'], lakes['purchase_files']
+    rows, purchase_rows = lakes['rows_per_file'], lakes['purchase_rows_per_file']
+
+    extractors = {'.csv': returns_app.extract_from_csv,
+                  '.pdf': returns_app.extract_from_pdf,
+                  '.txt': returns_app.extract_from_txt}
+    for extension, extract in extractors.items():
+        path = next(f for f in returns_files if f.endswith(extension))
+        runner.time_case('extract', f"returns_{extension[1:]}", lambda: extract(path), rows=rows)
+    runner.time_case('extract', 'returns_process_all_files', returns_app.process_all_files,
+                     rows=rows * len(returns_files))
+
+    # Cold store reads of the whole lake vs one month pruned by the lake catalog
+    from returns_store import ReturnsStore
+    runner.time_case('extract', 'returns_store_full_lake',
+                     lambda: ReturnsStore(returns_app.lake_sources).snapshot(), rows=rows * len(returns_files))
+    runner.time_case('extract', 'returns_store_one_month',
+                     lambda: ReturnsStore(returns_app.lake_sources).snapshot_range('2011-06', '2011-06'), rows=rows)
+
+    # Startup to first data: parsing the lake vs mapping the warm-start snapshot
+    snapshot_path = os.path.join(lakes['workdir'], 'returns.snap')
+    runner.prepare(lambda: ReturnsStore(returns_app.lake_sources, snapshot_path=lambda: snapshot_path).refresh())
+
+    def warm_start_returns():
+        store = ReturnsStore(returns_app.lake_sources, snapshot_path=lambda: snapshot_path)
+        store.warm_start()
+        return store.frame()
+
+    runner.time_case('extract', 'returns_warm_start_snapshot', warm_start_returns, rows=rows * len(returns_files))
+
+    extractors = {'.csv': calculate.extract_from_csv,
+                  '.pdf': calculate.extract_from_pdf,
+                  '.txt': calculate.extract_from_txt}
+    for path in purchase_files:
+        extension = os.path.splitext(path)[1]
+        extract = extractors[extension]
+        runner.time_case('extract', f"purchases_{extension[1:]}", lambda: extract(path), rows=purchase_rows)
+    runner.time_case('extract', 'purchases_process_all_files', calculate.process_all_files,
+                     rows=purchase_rows * len(purchase_files))
+
+    processor = lakes['processor']
+    runner.time_case('extract', 'purchase_api_get_purchase_frame',
+                     lambda: processor.get_purchase_frame(use_cache=False),
+                     rows=purchase_rows * len(purchase_files))
+
+    purchase_snapshot = os.path.join(lakes['workdir'], 'purchases.snap')
+    dirs = {'csv_dir': processor.csv_dir, 'pdf_dir': processor.pdf_dir, 'txt_dir': processor.txt_dir}
+    runner.prepare(lambda: purchase_api.DataProcessor(snapshot_path=purchase_snapshot, **dirs).get_purchase_frame())
+
+    def warm_start_purchases():
+        warm = purchase_api.DataProcessor(snapshot_path=purchase_snapshot, **dirs)
+        warm.warm_start()
+        return warm.get_purchase_frame()
+
+    runner.time_case('extract', 'purchase_api_warm_start_snapshot', warm_start_purchases,
+                     rows=purchase_rows * len(purchase_files))
+    runner.time_case('extract', 'purchase_api_get_all_purchase_data',
+                     lambda: processor.get_all_purchase_data(use_cache=False),
+                     rows=purchase_rows * len(purchase_files))
+
+
+def run_summarize(runner, lakes, apps):
+    _, calculate, _, _ = apps
+    purchase_data = runner.prepare(calculate.process_all_files)
+    output_file = os.path.join(lakes['workdir'], 'purchase_summary.csv')
+    runner.time_case('summarize', 'save_results', lambda: calculate.save_results(purchase_data, output_file),
+                     rows=len(purchase_data))
+
+    chunk_size = max(len(purchase_data) // 10, 1)
+    runner.time_case('summarize', 'save_results_chunked',
+                     lambda: calculate.save_results_chunked(calculate.iter_purchase_chunks(chunk_size), output_file,
+                                                            spill_dir=lakes['workdir']),
+                     rows=len(purchase_data))
+
+    processor = lakes['processor']
+    runner.prepare(lambda: processor.get_all_purchase_data(use_cache=False))
+    runner.time_case('summarize', 'get_purchase_statistics_cached', processor.get_purchase_statistics,
+                     rows=len(purchase_data))
+
+
+def run_sql_load(runner, lakes, apps):
+    returns_app, _, _, purchases_app = apps
+    return_data = runner.prepare(returns_app.process_all_files)
+    # Checkpoints make repeated loads of the same rows no-ops; clear them so every run loads everything
+    runner.time_case('sql_load', 'insert_into_sqlserver', lambda: returns_app.insert_into_sqlserver(return_data),
+                     rows=len(return_data), setup=returns_app.returns_loader.clear)
+
+    run_pipelined_save(runner, lakes, returns_app)
+
+    purchase_data = runner.prepare(purchases_app.process_all_files)
+    runner.time_case('sql_load', 'insert_into_postgres', lambda: purchases_app.insert_into_postgres(purchase_data),
+                     rows=len(purchase_data), setup=purchases_app.purchases_loader.clear)
+
+    postgres_url = lakes['args'].postgres_url
+    if postgres_url and purchase_data:
+        run_postgres_load(runner, postgres_url, purchases_app.prepare_purchase_frame(purchase_data))
+    else:
+        print("Skipping PostgreSQL COPY cases; pass --postgres-url to run them", file=sys.stderr)
+
+
+# Extract-then-load vs the pipelined save, from a cold returns store each run
+def run_pipelined_save(runner, lakes, returns_app):
+    from returns_store import RECORD_COLUMNS, ReturnsStore
+    from pipelined_load import run_pipeline
+
+    rows = lakes['rows_per_file'] * len(lakes['returns_files'])
+
+    def cold_store():
+        returns_app.returns_store = ReturnsStore(returns_app.lake_sources)
+        returns_app.returns_loader.clear()
+
+    def extract_then_load():
+        _, frame = returns_app.returns_store.snapshot()
+        return returns_app.insert_into_sqlserver(frame)
+
+    runner.time_case('sql_load', 'save_extract_then_load', extract_then_load, rows=rows, setup=cold_store)
+    runner.time_case('sql_load', 'save_pipelined', lambda: returns_app.pipelined_save(None, None),
+                     rows=rows, setup=cold_store)
+
+    # SQLite loads run in-process and hold the GIL like parsing does; a remote
+    # server mostly waits on the network. Simulate that with a sleep per row.
+    latency = lakes['args'].load_latency_us / 1e6
+
+    def remote_load(frame):
+        time.sleep(len(frame) * latency)
+        return len(frame)
+
+    def remote_extract_then_load():
+        _, frame = returns_app.returns_store.snapshot()
+        for _, file_frame in frame.groupby('source_file', sort=False):
+            remote_load(file_frame)
+
+    def remote_pipelined():
+        store = returns_app.returns_store
+        paths = sorted(store.scan())
+        return run_pipeline(paths, lambda path: store.load_file(path)[RECORD_COLUMNS], remote_load)
+
+    runner.time_case('sql_load', 'simulated_remote_extract_then_load', remote_extract_then_load, rows=rows,
+                     setup=cold_store)
+    stats = runner.time_case('sql_load', 'simulated_remote_pipelined', remote_pipelined, rows=rows,
+                             setup=cold_store)
+    runner.add_result('sql_load', 'simulated_remote_pipelined_stages',
+                      extract_utilization=stats['extract']['utilization'],
+                      load_utilization=stats['load']['utilization'], peak_queue_depth=stats['peak_queue_depth'])
+
+
+# to_sql INSERTs vs COPY FROM STDIN vs an unlogged staging-table swap on a real PostgreSQL
+def run_postgres_load(runner, url, frame):
+    from sqlalchemy import create_engine, text
+    import pg_copy
+
+    engine = create_engine(url)
+    table = 'benchmark_purchases'
+    frame = frame.assign(inserted_at=pd.Timestamp.now())
+
+    def truncate():
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {pg_copy.quote_identifier(table)}"))
+
+    runner.time_case('sql_load', 'postgres_to_sql_insert',
+                     lambda: frame.to_sql(table, engine, if_exists='append', index=False, chunksize=10_000),
+                     rows=len(frame), setup=truncate)
+    runner.time_case('sql_load', 'postgres_copy',
+                     lambda: frame.to_sql(table, engine, if_exists='append', index=False, method=pg_copy.copy_rows),
+                     rows=len(frame), setup=truncate)
+    runner.time_case('sql_load', 'postgres_copy_staging_swap',
+                     lambda: pg_copy.copy_replace_table(engine, table, frame), rows=len(frame))
+    truncate()
+    engine.dispose()
+
+
+def run_http(runner, lakes, apps):
+    returns_app, _, purchase_api, _ = apps
+    rows = lakes['rows_per_file']
+
+    client = returns_app.app.test_client()
+    return_rows = rows * len(lakes['returns_files'])
+    runner.time_case('http', 'flask_get_api_returns', lambda: client.get('/api/returns').get_data(),
+                     rows=return_rows, setup=returns_app.response_cache.clear)
+    runner.time_case('http', 'flask_get_api_returns_cached', lambda: client.get('/api/returns').get_data(),
+                     rows=return_rows)
+    runner.time_case('http', 'flask_get_api_returns_gzip_cached',
+                     lambda: client.get('/api/returns', headers={'Accept-Encoding': 'gzip'}).get_data(),
+                     rows=return_rows)
+    etag = client.get('/api/returns').headers['ETag']
+    runner.time_case('http', 'flask_get_api_returns_not_modified',
+                     lambda: client.get('/api/returns', headers={'If-None-Match': etag}).get_data(),
+                     rows=return_rows)
+
+    # Ad-hoc SQL over the cached frames; the first query copies the table into SQLite
+    query = {'sql': "SELECT month, territory_key, SUM(return_quantity) FROM returns GROUP BY 1, 2"}
+    runner.time_case('http', 'flask_api_query_load_returns', lambda: client.get('/api/query', query_string=query),
+                     rows=return_rows, setup=lambda: returns_app.query_engine._versions.clear())
+    runner.time_case('http', 'flask_api_query_group_by', lambda: client.get('/api/query', query_string=query),
+                     rows=return_rows)
+
+    from fastapi.testclient import TestClient
+    processor = lakes['processor']
+    purchase_api.data_processor = processor
+    fastapi_client = TestClient(purchase_api.app)
+    purchase_rows = lakes['purchase_rows_per_file'] * len(lakes['purchase_files'])
+    runner.time_case('http', 'fastapi_get_purchases_cold', lambda: fastapi_client.get('/purchases/').content,
+                     rows=purchase_rows, setup=lambda: (setattr(processor, '_snapshot', None),
+                                                        purchase_api.response_cache.clear()))
+    runner.time_case('http', 'fastapi_get_purchases_cached', lambda: fastapi_client.get('/purchases/').content,
+                     rows=purchase_rows)
+    etag = fastapi_client.get('/purchases/').headers['etag']
+    runner.time_case('http', 'fastapi_get_purchases_not_modified',
+                     lambda: fastapi_client.get('/purchases/', headers={'If-None-Match': etag}).content,
+                     rows=purchase_rows)
+    runner.time_case('http', 'fastapi_get_statistics', lambda: fastapi_client.get('/statistics/').content,
+                     rows=purchase_rows)
+
+
+def run_rates(runner, lakes, apps):
+    returns_app = apps[0]
+    from return_rates import OrderVolumes, create_orders_standin, return_rates
+
+    args = lakes['args']
+    lines = benchmark_data.generate_order_lines(args.order_lines, months=min(args.months, 12), seed=args.seed)
+    orders = pd.DataFrame(lines, columns=['order_date', 'territory_key', 'product_key', 'order_quantity'])
+    standin = runner.prepare(lambda: create_orders_standin(
+        f"sqlite:///{os.path.join(lakes['workdir'], 'orders.db')}", orders))
+    volumes = OrderVolumes(standin)
+    runner.time_case('rates', 'order_volumes_bulk_load', volumes.load, rows=len(orders))
+    returns_app.order_volumes = volumes
+
+    store = returns_app.returns_store
+    returns_rollup = runner.prepare(store.rollup)
+    orders_rollup = volumes.rollup()
+    return_rows = lakes['rows_per_file'] * len(lakes['returns_files'])
+    runner.time_case('rates', 'return_rates_month_territory_product',
+                     lambda: return_rates(returns_rollup, orders_rollup, start='2011-01', end='2011-12'),
+                     rows=return_rows)
+    runner.time_case('rates', 'return_rates_by_month',
+                     lambda: return_rates(returns_rollup, orders_rollup, ['month'], '2011-01', '2011-12'),
+                     rows=return_rows)
+    client = returns_app.app.test_client()
+    runner.time_case('rates', 'flask_get_api_returns_rates_2011',
+                     lambda: client.get('/api/returns/rates?from=2011-01&to=2011-12').get_data(),
+                     rows=return_rows)
+
+
+def run_listing(runner, lakes, apps):
+    from lake_files import LakeScanner, is_lake_file, publish_file
+    from lake_layout import LakeLayout
+
+    n_files = lakes['args'].listing_files
+    for scheme in ('flat', 'hash'):
+        layout = LakeLayout(scheme, scanner=LakeScanner())
+        root = os.path.join(lakes['workdir'], f"listing_{scheme}")
+        if not os.path.isdir(root):
+            runner.prepare(lambda: benchmark_data.build_listing_lake(root, n_files, layout))
+
+        if scheme == 'flat':
+            # Before: os.listdir of one flat folder, an extension check and a stat per file
+            def listdir_and_stat():
+                return [(name, os.stat(os.path.join(root, name))) for name in os.listdir(root)
+                        if is_lake_file(name, '.csv')]
+
+            runner.time_case('listing', 'listdir_stat_flat', listdir_and_stat, rows=n_files)
+
+        runner.time_case('listing', f"scan_cold_{scheme}", lambda: LakeScanner().list(root, '.csv'), rows=n_files)
+        scanner = LakeScanner()
+        scanner.list(root, '.csv')
+        runner.time_case('listing', f"scan_cached_{scheme}", lambda: scanner.list(root, '.csv'), rows=n_files)
+        # Opt-in file cache: signatures of unchanged folders are trusted without a stat
+        trusting = LakeScanner(recent_seconds=0)
+        trusting.list(root, '.csv')
+        runner.time_case('listing', f"scan_cached_trusted_{scheme}", lambda: trusting.list(root, '.csv'),
+                         rows=n_files)
+
+        # One upload between listings: only the folder it lands in is read again
+        uploads = iter(range(10 ** 9))
+
+        def upload():
+            name = f"AdventureWorks Returns Data - Upload {next(uploads):07d}.csv"
+            publish_file(os.path.join(root, layout.shard(name), name), lambda path: open(path, 'w').close())
+
+        runner.time_case('listing', f"scan_after_upload_{scheme}", lambda: scanner.list(root, '.csv'),
+                         rows=n_files, setup=upload)
+
+
+# Typed frames shaped like the /api/returns and /purchases/ snapshots
+def _serialize_frames(n_rows, seed):
+    returns = pd.DataFrame(benchmark_data.generate_return_rows(n_rows, seed=seed),
+                           columns=['return_date', 'territory_key', 'product_key', 'return_quantity'])
+    returns['return_date'] = pd.to_datetime(returns['return_date'], format='%m/%d/%Y')
+    returns['return_quantity'] = returns['return_quantity'].astype('int64')
+    returns['source_file'] = benchmark_data.lake_file_name(2011, 1, '.csv')
+    purchases = pd.DataFrame(benchmark_data.generate_purchase_rows(n_rows, seed=seed),
+                             columns=benchmark_data.PURCHASES_HEADER)
+    purchases = purchases[['Purchase_ID', 'Total_Amount']].assign(Source_File='Purchases 01.csv')
+    return returns, purchases
+
+
+def run_serialize(runner, lakes, apps):
+    returns_app, _, purchase_api, _ = apps
+    import fast_json
+    from typing import List
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from returns_store import frame_to_records
+
+    n_rows = lakes['args'].serialize_rows
+    returns, purchases = _serialize_frames(n_rows, lakes['args'].seed)
+    message = "Data retrieved but not saved to SQL Server. Click Get and Returns to save."
+
+    # Before: record dicts through Flask's jsonify encoder
+    def jsonify_returns():
+        with returns_app.app.app_context():
+            return returns_app.app.json.response({"data": frame_to_records(returns), "message": message}).get_data()
+
+    runner.time_case('serialize', 'returns_jsonify', jsonify_returns, rows=n_rows)
+    runner.time_case('serialize', 'returns_fast_json',
+                     lambda: returns_app.returns_response_body(returns, False, message), rows=n_rows)
+
+    # Before: FastAPI validating every record against response_model=List[PurchaseData]
+    legacy_app = FastAPI()
+
+    @legacy_app.get("/purchases/", response_model=List[purchase_api.PurchaseData])
+    async def legacy_get_all_purchases():
+        return purchases.to_dict('records')
+
+    client = TestClient(legacy_app)
+    runner.time_case('serialize', 'purchases_pydantic_response_model',
+                     lambda: client.get('/purchases/').content, rows=n_rows)
+    runner.time_case('serialize', 'purchases_fast_json', lambda: fast_json.dumps_records(purchases), rows=n_rows)
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_for_server(url, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=timeout) as response:
+                response.read()
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+# Issue GETs from `concurrency` threads for `duration` seconds
+def drive_load(url, concurrency, duration):
+    deadline = time.monotonic() + duration
+
+    def worker():
+        done = errors = 0
+        while time.monotonic() < deadline:
+            try:
+                with urllib.request.urlopen(url, timeout=300) as response:
+                    response.read()
+                done += 1
+            except OSError:
+                errors += 1
+        return done, errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: worker(), range(concurrency)))
+    elapsed = time.perf_counter() - start
+    done = sum(r[0] for r in results)
+    return {'requests': done, 'errors': sum(r[1] for r in results), 'seconds': round(elapsed, 3),
+            'requests_per_s': round(done / elapsed, 2) if elapsed else None}
+
+
+# Start a server in a directory whose data_lake/ points at a synthetic lake
+def _start_server(command, lake_root, workdir, name):
+    cwd = os.path.join(workdir, f"serve_{name}")
+    os.makedirs(cwd, exist_ok=True)
+    link = os.path.join(cwd, 'data_lake')
+    if not os.path.exists(link):
+        os.symlink(lake_root, link)
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [REPO_DIR, env.get('PYTHONPATH')]))
+    env['LAKE_CACHE_DIR'] = os.path.join(cwd, 'lake_cache')
+    log = open(os.path.join(cwd, 'server.log'), 'w')
+    return subprocess.Popen(command, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT,
+                            start_new_session=True)
+
+
+def _stop_server(process):
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=30)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(process.pid, signal.SIGKILL)
+
+
+def run_serve(runner, lakes, apps):
+    args = lakes['args']
+    setups = [
+        ('returns_flask_dev_server', lakes['returns_root'], '/api/returns',
+         [sys.executable, '-m', 'flask', '--app', 'data_lake_solution', 'run', '--debug', '--port', '{port}']),
+        ('returns_gunicorn', lakes['returns_root'], '/api/returns',
+         [sys.executable, os.path.join(REPO_DIR, 'serve.py'), 'returns', '--host', '127.0.0.1',
+          '--port', '{port}', '--workers', str(args.serve_workers)]),
+        ('purchases_uvicorn_single', lakes['purchases_root'], '/purchases/',
+         [sys.executable, '-m', 'uvicorn', 'purchase_data_api:app', '--port', '{port}']),
+        ('purchases_uvicorn_workers', lakes['purchases_root'], '/purchases/',
+         [sys.executable, os.path.join(REPO_DIR, 'serve.py'), 'purchases', '--host', '127.0.0.1',
+          '--port', '{port}', '--workers', str(args.serve_workers)]),
+    ]
+    for name, lake_root, path, command in setups:
+        port = _free_port()
+        process = _start_server([part.format(port=port) for part in command], lake_root, lakes['workdir'], name)
+        try:
+            url = f"http://127.0.0.1:{port}{path}"
+            if not _wait_for_server(url):
+                runner.add_result('serve', name, error="server did not start")
+                continue
+            result = drive_load(url, args.serve_concurrency, args.serve_duration)
+            runner.add_result('serve', name, concurrency=args.serve_concurrency, **result)
+        finally:
+            _stop_server(process)
+
+
+SCENARIO_FUNCS = {
+    'extract': run_extract,
+    'summarize': run_summarize,
+    'sql_load': run_sql_load,
+    'http': run_http,
+    'rates': run_rates,
+    'listing': run_listing,
+    'serialize': run_serialize,
+    'serve': run_serve,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the data lake ingest pipeline")
+    parser.add_argument('--rows', type=int, default=2000, help="Rows per generated file")
+    parser.add_argument('--purchase-rows', type=int, help="Rows per generated purchases file (default: --rows)")
+    parser.add_argument('--purchase-formats', default='csv,txt,pdf',
+                        help="Comma-separated purchases file formats to generate")
+    parser.add_argument('--months', type=int, default=12, help="Monthly returns files to generate")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per case")
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"Comma-separated subset of: {', '.join(SCENARIO_FUNCS)}")
+    parser.add_argument('--postgres-url', default=os.environ.get('BENCHMARK_POSTGRES_URL'),
+                        help="PostgreSQL URL for the COPY loader cases of sql_load (skipped when unset)")
+    parser.add_argument('--order-lines', type=int, default=121_317,
+                        help="Order lines in the rates scenario's orders stand-in (AdventureWorks has 121,317)")
+    parser.add_argument('--listing-files', type=int, default=100_000,
+                        help="Empty lake files per layout in the listing scenario")
+    parser.add_argument('--load-latency-us', type=float, default=15,
+                        help="Simulated database time per row in the sql_load pipeline cases")
+    parser.add_argument('--serialize-rows', type=int, default=1_000_000,
+                        help="Records encoded in the serialize scenario")
+    parser.add_argument('--serve-workers', type=int, default=4, help="Worker processes in the serve scenario")
+    parser.add_argument('--serve-concurrency', type=int, default=8, help="Concurrent clients in the serve scenario")
+    parser.add_argument('--serve-duration', type=float, default=10, help="Seconds of load per server")
+    parser.add_argument('--workdir', help="Directory for generated lakes (kept); defaults to a temp dir")
+    parser.add_argument('--output', help="Write JSON results to this file instead of stdout")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    unknown = set(scenarios) - set(SCENARIO_FUNCS)
+    if unknown:
+        parser.error(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='datalake-bench-')
+    os.makedirs(workdir, exist_ok=True)
+    try:
+        returns_root = os.path.join(workdir, 'returns_lake')
+        purchases_root = os.path.join(workdir, 'purchases_lake')
+        purchases_pg_root = os.path.join(workdir, 'purchases_pg_lake')
+        purchase_rows = args.purchase_rows or args.rows
+        purchase_formats = ['.' + f.strip().lstrip('.') for f in args.purchase_formats.split(',') if f.strip()]
+        lakes = {
+            'args': args,
+            'returns_root': returns_root,
+            'purchases_root': purchases_root,
+            'workdir': workdir,
+            'rows_per_file': args.rows,
+            'purchase_rows_per_file': purchase_rows,
+            'returns_files': benchmark_data.build_returns_lake(returns_root, args.rows, args.months, seed=args.seed),
+            'purchase_files': benchmark_data.build_purchases_lake(purchases_root, purchase_rows,
+                                                                  formats=purchase_formats, seed=args.seed),
+        }
+        # test.py reads lowercase tab headers from its TXT files
+        benchmark_data.build_purchases_lake(purchases_pg_root, purchase_rows, formats=purchase_formats,
+                                            seed=args.seed, lowercase_headers=True)
+
+        apps = _import_apps(workdir)
+        returns_app, calculate, purchase_api, purchases_app = apps
+        point_at_lake(returns_app, returns_root)
+        point_at_lake(calculate, purchases_root)
+        point_at_lake(purchases_app, purchases_pg_root)
+        lakes['processor'] = purchase_api.DataProcessor(
+            csv_dir=os.path.join(purchases_root, 'csv'),
+            pdf_dir=os.path.join(purchases_root, 'pdf'),
+            txt_dir=os.path.join(purchases_root, 'txt'),
+        )
+
+        runner = BenchmarkRunner(repeat=args.repeat)
+        for scenario in scenarios:
+            SCENARIO_FUNCS[scenario](runner, lakes, apps)
+
+        report = {
+            'benchmark': 'datalake-ingest',
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'params': {'rows_per_file': args.rows, 'purchase_rows_per_file': purchase_rows,
+                       'purchase_formats': purchase_formats, 'months': args.months, 'repeat': args.repeat,
+                       'scenarios': scenarios, 'seed': args.seed},
+            'results': runner.results,
+        }
+        payload = json.dumps(report, indent=2)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as file:
+                file.write(payload + '\n')
+        else:
+            print(payload)
+        return report
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+import os
+import time
+import random
+import calendar
+from datetime import date
+
+# Month abbreviations used in the lake file naming convention
+MONTH_NAMES = [calendar.month_abbr[m] for m in range(1, 13)]
+
+# Value domains seen in the AdventureWorks returns exports
+TERRITORY_KEYS = list(range(1, 11))
+PRODUCT_KEYS = list(range(700, 800))
+
+# Column headers expected by the extractors
+RETURNS_HEADER = ['ReturnDate', 'TerritoryKey', 'ProductKey', 'ReturnQuantity']
+PURCHASES_HEADER = ['Purchase_Date', 'Purchase_ID', 'Customer_ID', 'Product_ID',
+                    'Quantity', 'Unit_Price', 'Total_Amount']
+
+PDF_ROWS_PER_PAGE = 60
+
+
+# Build the lake file name for a month, e.g. "AdventureWorks Returns Data - Jan 2011.csv"
+def lake_file_name(year, month, extension, underscore=False):
+    name = f"AdventureWorks Returns Data - {MONTH_NAMES[month - 1]} {year}{extension}"
+    if underscore:
+        name = name.replace(' ', '_')
+    return name
+
+
+# Generate return rows as (ReturnDate, TerritoryKey, ProductKey, ReturnQuantity) tuples
+def generate_return_rows(n_rows, year=2011, month=1, seed=0):
+    rng = random.Random(seed)
+    days = calendar.monthrange(year, month)[1]
+    rows = []
+    for _ in range(n_rows):
+        day = rng.randint(1, days)
+        rows.append((
+            f"{month}/{day}/{year}",
+            rng.choice(TERRITORY_KEYS),
+            rng.choice(PRODUCT_KEYS),
+            rng.choice((1, 1, 1, 2, 3)),
+        ))
+    rows.sort(key=lambda row: int(row[0].split('/')[1]))
+    return rows
+
+
+# Generate purchase rows matching PURCHASES_HEADER
+def generate_purchase_rows(n_rows, year=2011, month=1, seed=0, id_offset=0):
+    rng = random.Random(seed)
+    days = calendar.monthrange(year, month)[1]
+    rows = []
+    for i in range(n_rows):
+        quantity = rng.randint(1, 10)
+        unit_price = round(rng.uniform(5, 5000), 2)
+        rows.append((
+            date(year, month, rng.randint(1, days)).isoformat(),
+            f"P{id_offset + i + 1:07d}",
+            f"C{rng.randint(1, 20000):05d}",
+            f"PR{rng.choice(PRODUCT_KEYS)}",
+            quantity,
+            unit_price,
+            round(quantity * unit_price, 2),
+        ))
+    return rows
+
+
+# Generate order lines as (order_date, territory_key, product_key, order_quantity) tuples,
+# spread over the months of a year like the AdventureWorks sales orders
+def generate_order_lines(n_rows, year=2011, months=12, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(n_rows):
+        month = rng.randint(1, months)
+        rows.append((
+            date(year, month, rng.randint(1, calendar.monthrange(year, month)[1])).isoformat(),
+            rng.choice(TERRITORY_KEYS),
+            rng.choice(PRODUCT_KEYS),
+            rng.randint(1, 12),
+        ))
+    return rows
+
+
+def write_returns_csv(path, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        file.write(','.join(RETURNS_HEADER) + '\n')
+        file.writelines(f"{d},{t},{p},{q}\n" for d, t, p, q in rows)
+    return path
+
+
+# Whitespace-aligned layout used by the monthly TXT exports
+def write_returns_txt(path, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        file.write(' '.join(RETURNS_HEADER) + '\n')
+        file.writelines(f"{d:<10}{t:>13}{p:>11}{q:>15}\n" for d, t, p, q in rows)
+    return path
+
+
+def write_returns_pdf(path, rows, rows_per_page=PDF_ROWS_PER_PAGE):
+    lines = [' '.join(str(v) for v in row) for row in rows]
+    return _write_text_pdf(path, ' '.join(RETURNS_HEADER), lines, rows_per_page)
+
+
+def write_purchases_csv(path, rows):
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        file.write(','.join(PURCHASES_HEADER) + '\n')
+        file.writelines(','.join(str(v) for v in row) + '\n' for row in rows)
+    return path
+
+
+# Tab-separated layout; lowercase headers match the PostgreSQL loader in test.py
+def write_purchases_txt(path, rows, lowercase_headers=False):
+    header = [h.lower() for h in PURCHASES_HEADER] if lowercase_headers else PURCHASES_HEADER
+    with open(path, 'w', encoding='utf-8', newline='') as file:
+        file.write('\t'.join(header) + '\n')
+        file.writelines('\t'.join(str(v) for v in row) + '\n' for row in rows)
+    return path
+
+
+def write_purchases_pdf(path, rows, rows_per_page=PDF_ROWS_PER_PAGE):
+    lines = [' '.join(str(v) for v in row) for row in rows]
+    return _write_text_pdf(path, ' '.join(PURCHASES_HEADER), lines, rows_per_page)
+
+
+def _pdf_escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+# Write a minimal text-only PDF (one header line per page) that PyPDF2 can extract
+def _write_text_pdf(path, header, lines, rows_per_page):
+    pages = [lines[i:i + rows_per_page] for i in range(0, len(lines), rows_per_page)] or [[]]
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Pages object, filled in once the page ids are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for page_lines in pages:
+        content = ["BT /F1 9 Tf 11 TL 40 810 Td", f"({_pdf_escape(header)}) Tj"]
+        content.extend(f"T* ({_pdf_escape(line)}) Tj" for line in page_lines)
+        content.append("ET")
+        stream = '\n'.join(content).encode('latin-1')
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_ids.append(len(objects))
+    kids = ' '.join(f"{i} 0 R" for i in page_ids).encode()
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(page_ids)
+
+    with open(path, 'wb') as file:
+        file.write(b"%PDF-1.4\n")
+        offsets = []
+        for number, body in enumerate(objects, 1):
+            offsets.append(file.tell())
+            file.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+        xref_offset = file.tell()
+        file.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for offset in offsets:
+            file.write(b"%010d 00000 n \n" % offset)
+        file.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                   % (len(objects) + 1, xref_offset))
+    return path
+
+
+RETURNS_WRITERS = {
+    '.csv': write_returns_csv,
+    '.txt': write_returns_txt,
+    '.pdf': write_returns_pdf,
+}
+
+PURCHASES_WRITERS = {
+    '.csv': write_purchases_csv,
+    '.txt': write_purchases_txt,
+    '.pdf': write_purchases_pdf,
+}
+
+
+# Empty lake files named like daily drops, placed by a LakeLayout, with mtimes
+# age_seconds in the past so they look like settled files; returns their paths
+def build_listing_lake(root, n_files, layout, extension='.csv', age_seconds=3600):
+    paths = []
+    for index in range(n_files):
+        name = f"AdventureWorks Returns Data - Day {index:07d}{extension}"
+        path = os.path.join(root, layout.shard(name), name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, 'w').close()
+        paths.append(path)
+    stamp = time.time() - age_seconds
+    for folder, _, files in os.walk(root, topdown=False):
+        for name in files:
+            os.utime(os.path.join(folder, name), (stamp, stamp))
+        os.utime(folder, (stamp, stamp))
+    return paths
+
+
+# Create a synthetic returns lake with <root>/csv, <root>/pdf and <root>/txt
+# directories, one file per month rotating through the three formats
+def build_returns_lake(root, rows_per_file, months=12, year=2011, seed=0):
+    extensions = ['.csv', '.pdf', '.txt']
+    written = []
+    for index in range(months):
+        month = index % 12 + 1
+        file_year = year + index // 12
+        extension = extensions[index % 3]
+        directory = os.path.join(root, extension[1:])
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, lake_file_name(file_year, month, extension, underscore=index % 2 == 1))
+        rows = generate_return_rows(rows_per_file, file_year, month, seed=seed + index)
+        written.append(RETURNS_WRITERS[extension](path, rows))
+    return written
+
+
+# Create a synthetic purchases lake with one file per format
+def build_purchases_lake(root, rows_per_file, formats=('.csv', '.txt', '.pdf'), year=2011, seed=0,
+                         lowercase_headers=False):
+    written = []
+    for index, extension in enumerate(formats):
+        directory = os.path.join(root, extension[1:])
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"Purchases {index + 1:02d}{extension}")
+        rows = generate_purchase_rows(rows_per_file, year, index % 12 + 1, seed=seed + index,
+                                      id_offset=index * rows_per_file)
+        if extension == '.txt':
+            written.append(write_purchases_txt(path, rows, lowercase_headers=lowercase_headers))
+        else:
+            written.append(PURCHASES_WRITERS[extension](path, rows))
+    return written
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate a synthetic AdventureWorks-shaped data lake")
+    parser.add_argument('root', help="Output lake directory")
+    parser.add_argument('--kind', choices=['returns', 'purchases'], default='returns')
+    parser.add_argument('--rows', type=int, default=1000, help="Rows per file")
+    parser.add_argument('--months', type=int, default=12, help="Monthly files (returns only)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.kind == 'returns':
+        files = build_returns_lake(args.root, args.rows, months=args.months, seed=args.seed)
+    else:
+        files = build_purchases_lake(args.root, args.rows, seed=args.seed)
+    for path in files:
+        print(f"Wrote {path}")
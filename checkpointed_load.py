@@ -0,0 +1,310 @@
+import re
+import time
+import random
+import hashlib
+
+import pandas as pd
+from sqlalchemy import (Column, DateTime, Integer, MetaData, String, Table, and_, column, exc, insert, select,
+                        table as table_clause, update)
+
+from ingest_metrics import metrics
+
+# Persistent progress of chunked loads, one row per target table and source file
+CHECKPOINT_TABLE = 'load_checkpoints'
+
+DEFAULT_CHUNK_ROWS = 50_000
+DEFAULT_RETRIES = 5
+DEFAULT_BASE_DELAY = 0.5
+DEFAULT_MAX_DELAY = 30
+
+
+class LoadError(Exception):
+    """A load stopped before all chunks were committed; stats describe what was committed."""
+
+    def __init__(self, message, stats):
+        super().__init__(message)
+        self.stats = stats
+
+
+# SQLSTATEs worth retrying besides connection exceptions (class 08): serialization
+# failure, PostgreSQL deadlock and ODBC timeouts
+TRANSIENT_SQLSTATES = {'40001', '40P01', 'HYT00', 'HYT01'}
+# SQL Server native errors: deadlock victim, lock request timeout
+TRANSIENT_SQLSERVER_ERRORS = {1205, 1222}
+# SQLite's lock conflicts (a database or table locked by another connection)
+TRANSIENT_SQLITE_ERRORS = {'SQLITE_BUSY', 'SQLITE_LOCKED'}
+
+
+# SQLSTATE and native error code of a DBAPI error (psycopg, pyodbc, pymssql)
+def _error_codes(error):
+    sqlstate = getattr(error, 'pgcode', None) or getattr(error, 'sqlstate', None)
+    native = None
+    args = getattr(error, 'args', ())
+    if args and isinstance(args[0], int):
+        native = args[0]  # pymssql: (number, message)
+    elif args and isinstance(args[0], str) and len(args) > 1 and len(args[0]) == 5:
+        sqlstate = sqlstate or args[0]  # pyodbc: (sqlstate, message ending in "(native) (SQLFunction)")
+        match = re.search(r'\((\d+)\) \(SQL\w+\)$', str(args[1]))
+        native = int(match.group(1)) if match else None
+    return sqlstate, native
+
+
+# Connection drops, timeouts and lock conflicts are worth retrying; anything else
+# (missing tables, constraint violations, bad data) fails on the first attempt
+def is_transient_error(error):
+    if isinstance(error, exc.DBAPIError):
+        if error.connection_invalidated:
+            return True
+        sqlstate, native = _error_codes(error.orig)
+        if sqlstate and (sqlstate.startswith('08') or sqlstate in TRANSIENT_SQLSTATES):
+            return True
+        if native in TRANSIENT_SQLSERVER_ERRORS:
+            return True
+        return getattr(error.orig, 'sqlite_errorname', None) in TRANSIENT_SQLITE_ERRORS
+    return isinstance(error, (exc.DisconnectionError, exc.TimeoutError, ConnectionError, TimeoutError))
+
+
+def retry_with_backoff(func, retries=DEFAULT_RETRIES, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY,
+                       is_transient=is_transient_error, sleep=time.sleep):
+    """
+    Call func, retrying transient errors with jittered exponential backoff.
+    Args:
+        func (callable): Work to run; must be safe to call again after a failure
+        retries (int): Retries after the first attempt
+        base_delay, max_delay (float): Backoff bounds in seconds
+    Returns:
+        The result of func
+    """
+    for attempt in range(retries + 1):
+        try:
+            return func()
+        except Exception as e:
+            if attempt == retries or not is_transient(e):
+                raise
+            delay = min(max_delay, base_delay * 2 ** attempt) * (0.5 + random.random() / 2)
+            print(f"Transient error ({type(e).__name__}: {e}); retry {attempt + 1}/{retries} in {delay:.1f}s")
+            metrics.count('load_retries', 1)
+            sleep(delay)
+
+
+# Content fingerprint of a file's rows; a checkpoint only resumes the same content
+def frame_fingerprint(frame):
+    hashes = pd.util.hash_pandas_object(frame, index=False).to_numpy()
+    digest = hashlib.sha1(hashes.tobytes())
+    digest.update(','.join(map(str, frame.columns)).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+class CheckpointedLoader:
+    """
+    Append a frame to a table in chunks, one transaction per chunk. Each
+    transaction also advances a checkpoint row for the chunk's source file,
+    so a load that fails partway resumes after the last committed chunk
+    instead of re-appending everything, and loading the same content again
+    inserts nothing. Frames are loaded a whole source file at a time; when a
+    file's content changed since it was loaded, its earlier rows are deleted
+    in the transaction of its first chunk, so a corrected file replaces its
+    rows instead of adding to them.
+    Args:
+        engine: SQLAlchemy engine of the target database
+        table (str): Target table
+        source_column (str): Column naming the source file of each row
+        columns (list): Columns loaded and fingerprinted; None loads every column of the frame
+        chunk_rows (int): Rows per chunk and transaction
+        timestamp_column (str): Column set to the commit time of each chunk, or None
+        method: pandas to_sql insertion method, e.g. pg_copy.copy_rows; None for INSERTs
+        retries, base_delay, max_delay: Backoff for transient errors (see retry_with_backoff)
+    """
+
+    def __init__(self, engine, table, source_column='source_file', columns=None, chunk_rows=DEFAULT_CHUNK_ROWS,
+                 timestamp_column='inserted_at', method=None, checkpoint_table=CHECKPOINT_TABLE,
+                 retries=DEFAULT_RETRIES, base_delay=DEFAULT_BASE_DELAY, max_delay=DEFAULT_MAX_DELAY):
+        self.engine = engine
+        self.table = table
+        self.method = method
+        self.source_column = source_column
+        self.columns = list(columns) if columns is not None else None
+        self.rows = table_clause(table, column(source_column))
+        self.chunk_rows = chunk_rows
+        self.timestamp_column = timestamp_column
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.checkpoints = Table(
+            checkpoint_table, MetaData(),
+            Column('target_table', String(128), primary_key=True),
+            Column('source_file', String(255), primary_key=True),
+            Column('fingerprint', String(32), nullable=False),
+            Column('chunk_rows', Integer, nullable=False),
+            Column('total_chunks', Integer, nullable=False),
+            Column('last_chunk', Integer, nullable=False),
+            Column('rows_loaded', Integer, nullable=False),
+            Column('updated_at', DateTime, nullable=False),
+        )
+        self._table_ready = False
+
+    def _retry(self, func):
+        return retry_with_backoff(func, self.retries, self.base_delay, self.max_delay)
+
+    def ensure_checkpoint_table(self):
+        if not self._table_ready:
+            self._retry(lambda: self.checkpoints.create(self.engine, checkfirst=True))
+            self._table_ready = True
+
+    def _key(self, source_file):
+        return and_(self.checkpoints.c.target_table == self.table, self.checkpoints.c.source_file == source_file)
+
+    def checkpoint(self, source_file, conn=None):
+        """Checkpoint row of a source file as a dict, or None if it has none."""
+        self.ensure_checkpoint_table()
+        query = select(self.checkpoints).where(self._key(source_file))
+        if conn is not None:
+            row = conn.execute(query).mappings().first()
+        else:
+            with self.engine.connect() as new_conn:
+                row = new_conn.execute(query).mappings().first()
+        return dict(row) if row is not None else None
+
+    # Next chunk to load for this content, 0 when there is no matching checkpoint
+    def _resume_chunk(self, checkpoint, fingerprint):
+        if checkpoint is None or checkpoint['fingerprint'] != fingerprint or \
+                checkpoint['chunk_rows'] != self.chunk_rows:
+            return 0
+        return checkpoint['last_chunk'] + 1
+
+    # Rows of a frame as they are loaded and fingerprinted
+    def _select(self, frame):
+        frame = frame.reset_index(drop=True)
+        return frame[self.columns] if self.columns is not None else frame
+
+    def _commit_chunk(self, source_file, fingerprint, chunk_index, total_chunks, chunk):
+        # Advance the checkpoint and insert the chunk in one transaction. The advance
+        # only applies if the checkpoint still holds what was read here, and the
+        # UPDATE (or INSERT) locks its row until commit, so of two loaders of the
+        # same file (workers, the ingest daemon) only one commits each chunk; the
+        # other gets None and continues from the progress it finds.
+        with self.engine.begin() as conn:
+            checkpoint = self.checkpoint(source_file, conn)
+            resume = self._resume_chunk(checkpoint, fingerprint)
+            if resume > chunk_index:
+                return 0  # Committed by an attempt whose acknowledgement was lost, or by another loader
+            if resume < chunk_index:
+                return None  # Another loader restarted this file with other content
+            rows_loaded = (checkpoint['rows_loaded'] if chunk_index else 0) + len(chunk)
+            values = {'fingerprint': fingerprint, 'chunk_rows': self.chunk_rows, 'total_chunks': total_chunks,
+                      'last_chunk': chunk_index, 'rows_loaded': rows_loaded,
+                      'updated_at': pd.Timestamp.now().to_pydatetime()}
+            if checkpoint is None:
+                try:
+                    conn.execute(insert(self.checkpoints).values(target_table=self.table, source_file=source_file,
+                                                                 **values))
+                except exc.IntegrityError:
+                    conn.rollback()
+                    return None  # Another loader started this file first
+            else:
+                columns = self.checkpoints.c
+                unchanged = and_(self._key(source_file), columns.fingerprint == checkpoint['fingerprint'],
+                                 columns.chunk_rows == checkpoint['chunk_rows'],
+                                 columns.last_chunk == checkpoint['last_chunk'])
+                if conn.execute(update(self.checkpoints).where(unchanged).values(**values)).rowcount != 1:
+                    conn.rollback()
+                    return None  # Advanced by another loader since it was read
+                if chunk_index == 0:
+                    # The file was loaded before with other content (or chunking): replace its rows
+                    print(f"{source_file} changed since it was loaded into {self.table}; replacing its rows")
+                    conn.execute(self.rows.delete().where(self.rows.c[self.source_column] == source_file))
+            if self.timestamp_column:
+                chunk = chunk.assign(**{self.timestamp_column: pd.Timestamp.now()})
+            with metrics.stage('load', source_file):
+                chunk.to_sql(self.table, conn, if_exists='append', index=False, method=self.method)
+        metrics.count('rows_loaded', len(chunk), source_file)
+        return len(chunk)
+
+    def load_file(self, source_file, frame, stats=None):
+        """
+        Load the rows of one source file, resuming after its last committed chunk.
+        Loaders of the same file may run at once; each chunk is committed by one of them.
+        Args:
+            source_file (str): Checkpoint key of the rows
+            frame (DataFrame): Every row of the file, in a deterministic order
+            stats (dict): Counters to add to (see load); a new dict by default
+        Returns:
+            Dict with rows_loaded, rows_skipped, chunks_loaded and chunks_skipped
+        """
+        if stats is None:
+            stats = {'rows_loaded': 0, 'rows_skipped': 0, 'chunks_loaded': 0, 'chunks_skipped': 0}
+        self.ensure_checkpoint_table()
+        frame = self._select(frame)
+        fingerprint = frame_fingerprint(frame)
+        total_chunks = max(1, -(-len(frame) // self.chunk_rows))
+        start = min(total_chunks, self._resume_chunk(self._retry(lambda: self.checkpoint(source_file)), fingerprint))
+        stats['rows_skipped'] += min(len(frame), start * self.chunk_rows)
+        stats['chunks_skipped'] += start
+        if start == total_chunks:
+            print(f"{source_file} is already loaded into {self.table}")
+        elif start > 0:
+            print(f"Resuming {source_file} at chunk {start + 1}/{total_chunks}")
+        chunk_index = start
+        while chunk_index < total_chunks:
+            chunk = frame.iloc[chunk_index * self.chunk_rows:(chunk_index + 1) * self.chunk_rows]
+            loaded = self._retry(lambda: self._commit_chunk(source_file, fingerprint, chunk_index, total_chunks,
+                                                            chunk))
+            if loaded is None:
+                # Another loader moved the checkpoint; continue from its progress (or from the start)
+                resume = min(total_chunks, self._resume_chunk(self._retry(lambda: self.checkpoint(source_file)),
+                                                              fingerprint))
+                if resume > chunk_index:
+                    stats['rows_skipped'] += min(len(frame), resume * self.chunk_rows) - chunk_index * self.chunk_rows
+                    stats['chunks_skipped'] += resume - chunk_index
+                chunk_index = resume
+                continue
+            if loaded:
+                stats['rows_loaded'] += loaded
+                stats['chunks_loaded'] += 1
+            else:
+                stats['rows_skipped'] += len(chunk)
+                stats['chunks_skipped'] += 1
+            chunk_index += 1
+        return stats
+
+    def load(self, frame):
+        """
+        Load a frame file by file (grouped by source_column) with checkpoints.
+        Args:
+            frame (DataFrame): Rows to append to the target table, all rows of each source file
+        Returns:
+            Dict with rows_loaded, rows_skipped, chunks_loaded, chunks_skipped and files
+        Raises:
+            LoadError: A chunk failed after retries; stats cover the chunks committed so far
+        """
+        totals = {'rows_loaded': 0, 'rows_skipped': 0, 'chunks_loaded': 0, 'chunks_skipped': 0, 'files': 0}
+        for source_file, file_frame in frame.groupby(self.source_column, sort=False):
+            try:
+                self.load_file(str(source_file), file_frame, totals)
+            except Exception as e:
+                raise LoadError(f"Load into {self.table} failed at {source_file}: {e}", totals) from e
+            totals['files'] += 1
+        return totals
+
+    def mark_loaded(self, frame):
+        """Record every source file of a frame as fully loaded, e.g. after its rows were bulk-replaced."""
+        self.ensure_checkpoint_table()
+        with self.engine.begin() as conn:
+            for source_file, file_frame in frame.groupby(self.source_column, sort=False):
+                source_file = str(source_file)
+                total_chunks = max(1, -(-len(file_frame) // self.chunk_rows))
+                conn.execute(self.checkpoints.delete().where(self._key(source_file)))
+                conn.execute(insert(self.checkpoints).values(
+                    target_table=self.table, source_file=source_file,
+                    fingerprint=frame_fingerprint(self._select(file_frame)), chunk_rows=self.chunk_rows,
+                    total_chunks=total_chunks, last_chunk=total_chunks - 1, rows_loaded=len(file_frame),
+                    updated_at=pd.Timestamp.now().to_pydatetime()))
+
+    def clear(self, source_files=None):
+        """Drop the checkpoints of this table (or of some source files) so their rows load again."""
+        self.ensure_checkpoint_table()
+        condition = self.checkpoints.c.target_table == self.table
+        if source_files is not None:
+            condition = and_(condition, self.checkpoints.c.source_file.in_(list(source_files)))
+        with self.engine.begin() as conn:
+            conn.execute(self.checkpoints.delete().where(condition))
@@ -3,11 +3,30 @@ import PyPDF2
 import re
 import csv
 import pandas as pd
-import pyodbc
-from flask import Flask, jsonify, request 
+from flask import Flask, Response, jsonify, request
 from sqlalchemy import create_engine, text
 from sqlalchemy.exc import SQLAlchemyError
 from werkzeug.utils import secure_filename
+from ingest_metrics import metrics
+from sketches import DEFAULT_PRECISION, HyperLogLog
+from returns_store import (ReturnsStore, GROUP_BY_COLUMNS, METRICS, RECORD_COLUMNS, SKETCH_KEYS, lake_version,
+                           records_to_frame, frame_to_records)
+from dimension_cache import DimensionCache
+from return_rates import RATE_KEYS, OrderVolumes, return_rates
+from checkpointed_load import CheckpointedLoader, LoadError
+from pipelined_load import run_pipeline
+from lake_catalog import parse_month
+from lake_query import QueryEngine, QueryError, QueryTimeout
+from request_control import AdmissionGate, Overloaded, SingleFlight
+from shared_cache import SharedFileCache
+from lake_files import list_lake_files, publish_file
+from lake_layout import LakeLayout
+from lake_preview import DEFAULT_PREVIEW_ROWS, preview_lake
+from batch_upload import ARCHIVE_CONTENT_TYPES, BatchUploader, archive_type
+import fast_json
+from http_cache import ResponseCache, cache_headers, choose_encoding, etag_matches, make_etag
+from returns_validation import (RAW_COLUMNS, REASON_MISSING_FIELDS, split_return_lines, validate_returns,
+                                write_quarantine)
 
 
 # Define directories for CSV, PDF, and TXT files
@@ -15,25 +34,51 @@ csv_dir = "data_lake/csv"
 pdf_dir = "data_lake/pdf"
 txt_dir = "data_lake/txt"
 
+# Rejected rows are written here with their reason codes, one file per source file
+quarantine_dir = "data_lake/quarantine"
+
+# Warm-start snapshots of the processed lake; LAKE_SNAPSHOT_DIR='' disables them
+snapshot_dir = os.environ.get('LAKE_SNAPSHOT_DIR', "data_lake/snapshots")
 
-app = Flask(__name__)
 
-# Retrieve SQL Server credentials from environment variables
-pwd = os.environ['PGPASS']
-uid = os.environ['PGIUD']
+app = Flask(__name__)
 
 # SQL Server connection details
 sql_server_driver = "{SQL Server Native Client 11.0}"
 sql_server = "DESKTOP-HK27CB8\\SQLEXPRESS"
 sql_database = "AdventureWorks2019"
 
-# SQL Server connection string using SQLAlchemy
-sqlserver_connection_string = pyodbc.connect(
-            f'DRIVER={sql_server_driver};SERVER={sql_server};DATABASE={sql_database};UID={uid};PWD={pwd}'
-        )
+# Optional SQLAlchemy URL override, e.g. a local SQLite stand-in for benchmarks
+returns_database_url = os.environ.get('RETURNS_DATABASE_URL')
+
+if returns_database_url:
+    engine = create_engine(returns_database_url)
+else:
+    # Only needed for SQL Server; a RETURNS_DATABASE_URL override runs without the ODBC driver
+    import pyodbc
+
+    # Retrieve SQL Server credentials from environment variables
+    pwd = os.environ['PGPASS']
+    uid = os.environ['PGIUD']
+
+    # SQL Server connection string using SQLAlchemy
+    sqlserver_connection_string = pyodbc.connect(
+                f'DRIVER={sql_server_driver};SERVER={sql_server};DATABASE={sql_database};UID={uid};PWD={pwd}'
+            )
+
+    # Create SQL Server engine using SQLAlchemy
+    engine = create_engine(f'mssql+pyodbc://{uid}:{pwd}@{sql_server}/{sql_database}?driver=SQL+Server+Native+Client+11.0')
 
-# Create SQL Server engine using SQLAlchemy
-engine = create_engine(f'mssql+pyodbc://{uid}:{pwd}@{sql_server}/{sql_database}?driver=SQL+Server+Native+Client+11.0')
+# Valid product and territory keys from AdventureWorks2019, or from
+# DIMENSIONS_DATABASE_URL (e.g. a SQLite stand-in). Until the dimensions can
+# be loaded, validation falls back to the static territory domain.
+dimensions_database_url = os.environ.get('DIMENSIONS_DATABASE_URL')
+dimensions = DimensionCache(create_engine(dimensions_database_url) if dimensions_database_url else engine)
+
+# Order quantities per month, territory and product for return rates, from
+# AdventureWorks2019 or ORDERS_DATABASE_URL (e.g. a SQLite stand-in)
+orders_database_url = os.environ.get('ORDERS_DATABASE_URL')
+order_volumes = OrderVolumes(create_engine(orders_database_url) if orders_database_url else engine)
 
 # Define allowed file extensions for uploads
 ALLOWED_EXTENSIONS = {'.csv', '.pdf', '.txt'}
@@ -41,232 +86,483 @@ ALLOWED_EXTENSIONS = {'.csv', '.pdf', '.txt'}
 def allowed_file(filename):
     return any(filename.lower().endswith(ext) for ext in ALLOWED_EXTENSIONS)
 
-# Function to save uploaded file to the correct directory
-def save_file_to_datalake(file, filename):
+# Lake directory of an uploaded file, or None for unsupported types
+def lake_directory_for(filename):
     file_extension = os.path.splitext(filename)[1].lower()
     if file_extension == '.csv':
-        directory = csv_dir
+        return csv_dir
     elif file_extension == '.pdf':
-        directory = pdf_dir
+        return pdf_dir
     elif file_extension == '.txt':
-        directory = txt_dir
-    else:
+        return txt_dir
+    return None
+
+# Placement of uploads inside the lake folders (LAKE_LAYOUT=flat, hash or date)
+lake_layout = LakeLayout()
+
+# Function to save uploaded file to the correct directory
+def save_file_to_datalake(file, filename):
+    directory = lake_directory_for(filename)
+    if directory is None:
         return None  # Unsupported file type
-    
-    # Ensure directory exists
-    os.makedirs(directory, exist_ok=True)
-    file_path = os.path.join(directory, filename)
-    file.save(file_path)
+
+    # Written to a hidden temp file and renamed into place under the path's
+    # lock, so scans never see a partial file and same-name uploads don't interleave
+    file_path = lake_layout.path_for(directory, filename)
+    publish_file(file_path, file.save)
     return file_path
 
+# Validate a batch of raw rows once, quarantine the rejects and return the typed accepted frame
+def validate_and_quarantine(raw, source_file, date_format='%m/%d/%Y'):
+    with metrics.stage('validate', source_file):
+        accepted, rejected = validate_returns(raw, source_file, date_format=date_format,
+                                              territory_keys=dimensions.territory_keys(),
+                                              product_keys=dimensions.product_keys())
+        write_quarantine(rejected, source_file, quarantine_dir)
+    invalid = int(rejected['reason'].str.contains(REASON_MISSING_FIELDS, regex=False).sum())
+    metrics.count('rows_accepted', len(accepted), source_file)
+    metrics.count('rows_rejected', len(rejected) - invalid, source_file)
+    metrics.count('rows_invalid', invalid, source_file)
+    return accepted
+
 def extract_from_pdf(pdf_file):
+    source_file = os.path.basename(pdf_file)
     try:
-        return_data = []
+        lines = []
         with open(pdf_file, 'rb') as file:
-            reader = PyPDF2.PdfReader(file)
+            with metrics.stage('read', source_file):
+                metrics.add_bytes(os.fstat(file.fileno()).st_size, source_file)
+                reader = PyPDF2.PdfReader(file)
             for page in reader.pages:
-                text = page.extract_text()
-                lines = text.split('\n')
-                for line in lines:
-                    parts = re.split(r'\s+', line.strip())
-                    if len(parts) >= 4:
-                        try:
-                            return_date = parts[0]
-                            territory_key = parts[1]
-                            product_key = parts[2]
-                            return_quantity = int(parts[3])
-
-                            # Validate date format
-                            try:
-                                return_date = pd.to_datetime(return_date, format='%m/%d/%Y').strftime('%Y-%m-%d')
-                            except ValueError:
-                                return_date = None  # Mark invalid dates as None
-
-                            if return_date and return_quantity >= 0:
-                                return_data.append({
-                                    'return_date': return_date,
-                                    'territory_key': territory_key,
-                                    'product_key': product_key,
-                                    'return_quantity': return_quantity,
-                                    'source_file': os.path.basename(pdf_file)
-                                })
-                        except (ValueError, IndexError):
-                            continue
-        return return_data
+                with metrics.stage('text_extract', source_file):
+                    text = page.extract_text()
+                lines.extend(text.split('\n'))
+        with metrics.stage('parse', source_file):
+            # Each page repeats the header line
+            lines = [line for line in lines if not line.lstrip().startswith('ReturnDate')]
+            raw = split_return_lines(lines)
+        return validate_and_quarantine(raw, source_file)
     except Exception as e:
         print(f"Error processing PDF file {pdf_file}: {e}")
-        return []
+        return records_to_frame([])
 
 def extract_from_txt(txt_file):
+    source_file = os.path.basename(txt_file)
     try:
-        return_data = []
         with open(txt_file, 'r', encoding='utf-8') as file:
-            lines = file.readlines()
-            for line_num, line in enumerate(lines[1:], 2):  # Skip header
-                try:
-                    parts = [part for part in line.split() if part.strip()]
-                    if len(parts) >= 4:
-                        return_date = parts[0]
-                        territory_key = parts[1]
-                        product_key = parts[2]
-                        return_quantity = int(parts[3])
-
-                        # Validate date format
-                        try:
-                            return_date = pd.to_datetime(return_date, format='%m/%d/%Y').strftime('%Y-%m-%d')
-                        except ValueError:
-                            return_date = None
-
-                        if return_date and return_quantity >= 0:
-                            return_data.append({
-                                'return_date': return_date,
-                                'territory_key': territory_key,
-                                'product_key': product_key,
-                                'return_quantity': return_quantity,
-                                'source_file': os.path.basename(txt_file)
-                            })
-                except (ValueError, IndexError):
-                    continue
-        return return_data
+            with metrics.stage('read', source_file):
+                lines = file.read().splitlines()
+                metrics.add_bytes(file.tell(), source_file)
+        with metrics.stage('parse', source_file):
+            raw = split_return_lines(lines[1:])  # Skip header
+        return validate_and_quarantine(raw, source_file)
     except Exception as e:
         print(f"Error processing TXT file {txt_file}: {e}")
-        return []
+        return records_to_frame([])
 
 def extract_from_csv(csv_file):
+    source_file = os.path.basename(csv_file)
     try:
-        return_data = []
-        df = pd.read_csv(csv_file)
+        with metrics.stage('read', source_file):
+            metrics.add_bytes(os.path.getsize(csv_file), source_file)
+            df = pd.read_csv(csv_file, dtype='object', keep_default_na=False)
         if {'ReturnDate', 'TerritoryKey', 'ProductKey', 'ReturnQuantity'}.issubset(df.columns):
-            for _, row in df.iterrows():
-                try:
-                    return_date = pd.to_datetime(row['ReturnDate'], errors='coerce').strftime('%Y-%m-%d')
-                    territory_key = str(row['TerritoryKey'])
-                    product_key = str(row['ProductKey'])
-                    return_quantity = int(row['ReturnQuantity'])
-
-                    if return_date and return_quantity >= 0:
-                        return_data.append({
-                            'return_date': return_date,
-                            'territory_key': territory_key,
-                            'product_key': product_key,
-                            'return_quantity': return_quantity,
-                            'source_file': os.path.basename(csv_file)
-                        })
-                except (ValueError, KeyError):
-                    continue
+            with metrics.stage('parse', source_file):
+                raw = df[['ReturnDate', 'TerritoryKey', 'ProductKey', 'ReturnQuantity']]
+                raw.columns = RAW_COLUMNS
+            # CSV exports may use other date formats than m/d/Y
+            return validate_and_quarantine(raw, source_file, date_format=None)
         else:
             print(f"Required columns not found in {csv_file}")
-        return return_data
+        return records_to_frame([])
     except Exception as e:
         print(f"Error processing CSV file {csv_file}: {e}")
-        return []
+        return records_to_frame([])
 
-# Function to process all files and return the combined return data
-def process_all_files():
-    all_return_data = []
-    for directory, file_type, process_func in [
+# Lake directories with their file type and extractor
+def lake_sources():
+    return [
         (csv_dir, '.csv', extract_from_csv),
         (pdf_dir, '.pdf', extract_from_pdf),
         (txt_dir, '.txt', extract_from_txt)
-    ]:
-        if os.path.exists(directory):
-            for file_name in os.listdir(directory):
-                if file_name.endswith(file_type):
-                    file_path = os.path.join(directory, file_name)
-                    data = process_func(file_path)
-                    all_return_data.extend(data)
-                    print(f"Processed {file_type.upper()} file: {file_name}")
-                    if data:
-                        print(f"Found {len(data)} records in {file_name}")
-    return all_return_data
-
-# Function to insert return data into SQL Server
+    ]
+
+# Function to process all files and return the combined return data
+def process_all_files():
+    frames = []
+    with metrics.run('process_all_files'):
+        for directory, file_type, process_func in lake_sources():
+            for file_path, _ in list_lake_files(directory, file_type):
+                file_name = os.path.basename(file_path)
+                data = process_func(file_path)
+                frames.append(data)
+                metrics.count('files_processed', 1, file_name)
+                print(f"Processed {file_type.upper()} file: {file_name}")
+                if not data.empty:
+                    print(f"Found {len(data)} records in {file_name}")
+        if not frames:
+            return []
+        return frame_to_records(pd.concat(frames, ignore_index=True))
+
+# Chunked loads into the Returns table with a checkpoint per source file;
+# only the record columns are loaded, never the enrichment names
+returns_loader = CheckpointedLoader(engine, 'Returns', columns=RECORD_COLUMNS)
+
+# Function to insert return data into SQL Server. Rows come from the
+# extractors and were validated there, so they are loaded as-is, whole
+# source files at a time. Each chunk commits with its checkpoint, so a retry
+# after a failure only loads the remaining chunks and a changed file replaces
+# its earlier rows; LoadError is raised once retries are exhausted.
 def insert_into_sqlserver(return_data):
-    print("\n=== Starting SQL Server Insert Process ===")
-    print(f"Records to process: {len(return_data)}")
-    
-    try:
-        if not return_data:
-            print("No data to insert")
-            return 0
-            
-        # Create DataFrame
-        df = pd.DataFrame(return_data)
-        print(f"\nInitial DataFrame shape: {df.shape}")
-        print("\nColumn data types:")
-        print(df.dtypes)
-        
-        # Print sample data before conversion
-        print("\nSample data before conversion:")
-        print(df.head())
-        
-        # Convert return_date
-        print("\nConverting dates...")
-        df['return_date'] = pd.to_datetime(df['return_date'], errors='coerce')
-        invalid_dates = df[df['return_date'].isna()]
-        if not invalid_dates.empty:
-            print(f"Found {len(invalid_dates)} invalid dates:")
-            print(invalid_dates)
-        
-        # Drop invalid rows
-        original_len = len(df)
-        df = df.dropna()
-        dropped_rows = original_len - len(df)
-        
-        if dropped_rows > 0:
-            print(f"\nDropped {dropped_rows} invalid rows")
-            print(f"Remaining valid rows: {len(df)}")
-        
-        if df.empty:
-            print("No valid data remaining after cleanup")
-            return 0
-        
-        # Add timestamp
-        df['inserted_at'] = pd.Timestamp.now()
-        
-        # Test database connection
-        print("\nTesting database connection...")
-        try:
-            with engine.connect() as conn:
-                result = conn.execute(text("SELECT 1"))
-                print("Database connection successful")
-        except Exception as e:
-            print(f"Database connection failed: {str(e)}")
-            raise  # Re-raise the exception to be caught by outer try-except
-        
-        # Insert data
-        print("\nInserting data into SQL Server...")
-        df.to_sql('Returns', engine, if_exists='append', index=False)
-        print(f"Successfully inserted {len(df)} records")
-        return len(df)
-        
-    except Exception as e:
-        print(f"Error during insertion: {str(e)}")
+    if len(return_data) == 0:
+        print("No data to insert")
         return 0
-    finally:
-        print("=== SQL Server Insert Process Completed ===")
+
+    if isinstance(return_data, pd.DataFrame):
+        df = return_data[RECORD_COLUMNS].copy()
+    else:
+        df = pd.DataFrame(return_data, columns=RECORD_COLUMNS)
+        df['return_date'] = pd.to_datetime(df['return_date'], format='%Y-%m-%d')
+
+    try:
+        stats = returns_loader.load(df)
+    except LoadError as e:
+        print(f"Error during insertion: {e} (committed {e.stats['rows_loaded']} records before the failure)")
+        raise
+    print(f"Inserted {stats['rows_loaded']} records into SQL Server"
+          f" ({stats['rows_skipped']} already loaded by an earlier run)")
+    return stats['rows_loaded']
+
+# Inputs of validation besides the file itself: the dimension keys and today's
+# upper date bound. Cached files and snapshots of another version are extracted again.
+def validation_version():
+    return f"{dimensions.version()}-{pd.Timestamp.now():%Y-%m-%d}"
+
+# Columnar cache of the lake. Files are only re-extracted when they change;
+# with LAKE_CACHE_DIR set, worker processes share the extracted files on disk.
+# The processed state is snapshotted so a restart maps it back instead of reparsing.
+returns_store = ReturnsStore(lake_sources, shared_cache=SharedFileCache.from_env('returns', validation_version),
+                             snapshot_path=lambda: os.path.join(snapshot_dir, 'returns.snap') if snapshot_dir else None,
+                             validation_version=validation_version)
+if returns_store.warm_start():
+    print(f"Warm start: restored {len(returns_store.frame(refresh=False))} return records from {snapshot_dir}")
+
+# Multi-file and archive uploads; each published file is extracted into the
+# store in the background while the rest of the request is still being read
+batch_uploader = BatchUploader(lake_directory_for, returns_store.load_file, layout=lake_layout)
+
+# Serialized /api/returns bodies per lake version; polls of an unchanged lake
+# are answered with 304 or the cached (optionally compressed) bytes
+response_cache = ResponseCache()
+
+# Concurrent identical save requests share one load; at most SAVE_CONCURRENCY
+# different saves run at once, SAVE_QUEUE more wait and the rest get 429
+save_flights = SingleFlight()
+save_gate = AdmissionGate(max_active=int(os.environ.get('SAVE_CONCURRENCY', 2)),
+                          max_queued=int(os.environ.get('SAVE_QUEUE', 8)),
+                          queue_timeout=float(os.environ.get('SAVE_QUEUE_TIMEOUT', 30)))
+
+# Load a snapshot into SQL Server once a save slot is free
+def admitted_save(return_frame):
+    with save_gate.admit():
+        return insert_into_sqlserver(return_frame)
+
+# Saves extract and load file by file at the same time unless SAVE_PIPELINE=false
+# or ?pipeline=false, which extracts the whole snapshot before loading it
+save_pipeline = os.environ.get('SAVE_PIPELINE', 'true').lower() == 'true'
+
+# Extract the lake files of a month range and load each one into SQL Server as
+# soon as it is extracted; returns the pipeline stats (see pipelined_load.py).
+# Files are loaded whole, so their checkpoints match those of a full save.
+def pipelined_save(start_month, end_month):
+    found = returns_store.scan()
+    paths = [path for path, (signature, _) in sorted(found.items())
+             if returns_store.catalog.matches(path, signature, start_month, end_month)]
+
+    def extract(path):
+        # Cached in the returns store, so the snapshot served afterwards is not parsed again
+        frame = returns_store.load_file(path)
+        if frame is None:
+            return None
+        return frame[RECORD_COLUMNS]
+
+    def load(frame):
+        return returns_loader.load(frame)['rows_loaded']
+
+    with save_gate.admit(), metrics.run('pipelined_save'):
+        stats = run_pipeline(paths, extract, load)
+    metrics.record_pipeline('save', stats)
+    print(f"Inserted {stats['rows_loaded']} records into SQL Server in {stats['seconds']}s "
+          f"(extract {stats['extract']['utilization']:.0%} busy, load {stats['load']['utilization']:.0%} busy)")
+    return stats
+
+# Return records of a snapshot, optionally with product and territory names
+def returns_payload(return_frame, enrich=False):
+    return_frame = return_frame[RECORD_COLUMNS]
+    if enrich and not return_frame.empty:
+        return_frame = dimensions.enrich(return_frame)
+    return return_frame
+
+# Encode {"data": [...records], "message": ...} with the fast columnar encoder;
+# keys are sorted like jsonify's output
+def returns_response_body(return_frame, enrich, message):
+    return fast_json.dumps_with_records(returns_payload(return_frame, enrich), 'data',
+                                        {"message": message}, sort_keys=True)
 
 # API endpoint to get all return data with save option
 @app.route('/api/returns', methods=['GET'])
 def get_returns():
-    return_data = process_all_files()
-    
+    # Optionally add product and territory names from the dimension cache
+    enrich = request.args.get('enrich', 'false').lower() == 'true'
+
     # Check if save to SQL Server is requested via query parameter
     save_to_sqlserver = request.args.get('save', 'false').lower() == 'true'
-    
+
+    # Optional month range, e.g. ?from=2011-06&to=2011-08; only matching files are opened
+    try:
+        start_month = parse_month(request.args.get('from'))
+        end_month = parse_month(request.args.get('to'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def take_snapshot(whole_files=False):
+        # Rows also depend on the validation inputs, so they are part of the version. Read
+        # first: a snapshot validated under a newer version only makes the next ETag differ.
+        validation = validation_version()
+        if start_month is None and end_month is None:
+            version, frame = returns_store.snapshot()
+        else:
+            version, frame = returns_store.snapshot_range(start_month, end_month, whole_files=whole_files)
+        return lake_version({'lake': version, 'validation': validation}), frame
+
+    pipelined = save_to_sqlserver and request.args.get('pipeline', str(save_pipeline)).lower() == 'true'
+    if not pipelined:
+        version, return_frame = take_snapshot()
+
     if save_to_sqlserver:
-        inserted_count = insert_into_sqlserver(return_data)
-        response_message = {
-            "data": return_data,
-            "message": f"Inserted {inserted_count} records into SQL Server"
-        }
-    else:
-        response_message = {
-            "data": return_data,
-            "message": "Data retrieved but not saved to SQL Server. Click Get and Returns to save."
-        }
-    
-    return jsonify(response_message)
+        # Requests for the same snapshot that arrive while it is being saved wait for that save
+        if pipelined:
+            lake = lake_version({path: signature for path, (signature, _) in returns_store.scan().items()})
+            key = (lake, start_month, end_month, 'pipelined')
+            save = lambda: pipelined_save(start_month, end_month)['rows_loaded']
+        else:
+            # Checkpoints cover whole files, so a month range saves every row of its files
+            key = (version, start_month, end_month)
+            save_frame = return_frame if start_month is None and end_month is None else take_snapshot(True)[1]
+            save = lambda: admitted_save(save_frame)
+        try:
+            inserted_count, shared = save_flights.do(key, save)
+        except Overloaded as e:
+            metrics.count('saves_rejected', 1)
+            return jsonify({"error": f"Too many saves in progress: {e}"}), 429, \
+                {"Retry-After": str(e.retry_after)}
+        except LoadError as e:
+            return jsonify({"error": str(e), "load": e.stats}), 503
+        if pipelined:
+            # Every file was extracted into the store while it was loaded
+            version, return_frame = take_snapshot()
+        if shared:
+            metrics.count('saves_coalesced', 1)
+            message = f"Inserted {inserted_count} records into SQL Server (shared with a concurrent identical save)"
+        else:
+            message = f"Inserted {inserted_count} records into SQL Server"
+        body = returns_response_body(return_frame, enrich, message)
+        return Response(body, mimetype='application/json')
+
+    # Reads are cacheable: the ETag identifies the lake snapshot and validation version (and names for enrich)
+    variant = '-'.join(filter(None, [
+        f"{start_month or ''}..{end_month or ''}" if start_month or end_month else '',
+        f"enrich.{dimensions.version()}" if enrich else ''
+    ]))
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    etag = make_etag(version, variant, encoding)
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        return Response(status=304, headers=cache_headers(etag))
+
+    def build_body():
+        return returns_response_body(return_frame, enrich,
+                                     "Data retrieved but not saved to SQL Server. Click Get and Returns to save.")
+
+    body = response_cache.get(f"returns:{variant}", version, encoding, build_body)
+    return Response(body, mimetype='application/json', headers=cache_headers(etag, encoding))
+
+# API endpoint listing the lake files with the period each one holds
+@app.route('/api/returns/catalog', methods=['GET'])
+def get_returns_catalog():
+    for path, (signature, _) in returns_store.scan().items():
+        returns_store.catalog.period(path, signature)
+    return jsonify({"files": returns_store.catalog.entries()})
+
+# API endpoint streaming the records ingested since a watermark as NDJSON,
+# e.g. ?since=1729300000000000; the last line carries the next watermark
+@app.route('/api/returns/changes', methods=['GET'])
+def get_returns_changes():
+    try:
+        since = int(request.args.get('since', 0))
+    except ValueError:
+        return jsonify({"error": "since must be an integer watermark"}), 400
+    if since < 0:
+        return jsonify({"error": "since must be an integer watermark"}), 400
+    watermark, changed, removed = returns_store.changes(since)
+
+    def generate():
+        rows = 0
+        for path, sequence in removed:
+            yield fast_json.dumps({"op": "delete", "source_file": os.path.basename(path),
+                                   "ingest_seq": sequence}) + b'\n'
+        for path, sequence, frame in changed:
+            # Replaces every record received earlier from the same source file
+            yield fast_json.dumps({"op": "replace", "source_file": os.path.basename(path), "ingest_seq": sequence,
+                                   "rows": len(frame)}) + b'\n'
+            yield from fast_json.iter_ndjson_records(frame[RECORD_COLUMNS].assign(ingest_seq=sequence))
+            rows += len(frame)
+        yield fast_json.dumps({"op": "end", "watermark": watermark, "files": len(changed),
+                               "deleted": len(removed), "rows": rows}) + b'\n'
+
+    return Response(generate(), mimetype='application/x-ndjson', headers={"X-Watermark": str(watermark)})
+
+# API endpoint previewing the lake from the head of each file, e.g. ?rows=20&file=2011
+@app.route('/api/returns/preview', methods=['GET'])
+def get_returns_preview():
+    try:
+        rows = int(request.args.get('rows', DEFAULT_PREVIEW_ROWS))
+    except ValueError:
+        return jsonify({"error": "rows must be an integer"}), 400
+    files = preview_lake(lake_sources(), rows, request.args.get('file'))
+    return Response(fast_json.dumps({
+        "files": files,
+        "estimated_rows": sum(entry.get("estimated_rows", 0) for entry in files),
+    }, sort_keys=True), mimetype='application/json')
+
+# API endpoint showing the dimension cache state; ?refresh=true reloads it now
+@app.route('/api/dimensions', methods=['GET'])
+def get_dimensions():
+    if request.args.get('refresh', 'false').lower() == 'true':
+        dimensions.load()
+    return jsonify(dimensions.status())
+
+
+# API endpoint to aggregate returns, e.g. ?group_by=month,territory_key&metric=sum_quantity
+@app.route('/api/returns/aggregate', methods=['GET'])
+def get_returns_aggregate():
+    group_by = [c.strip() for c in request.args.get('group_by', 'month').split(',') if c.strip()]
+    metric = request.args.get('metric', 'sum_quantity')
+    try:
+        result = returns_store.aggregate(group_by, metric)
+    except ValueError as e:
+        return jsonify({
+            "error": str(e),
+            "group_by_columns": GROUP_BY_COLUMNS,
+            "metrics": METRICS
+        }), 400
+    body = fast_json.dumps_with_records(result, 'data', {
+        "group_by": group_by,
+        "metric": metric,
+        "version": returns_store.version(),
+        "rows": len(result)
+    }, sort_keys=True)
+    return Response(body, mimetype='application/json')
+
+# API endpoint for approximate distinct products and top returned products
+# per group, merged from per-file sketches,
+# e.g. ?group_by=month,territory_key&from=2011-01&to=2011-06&top=5
+@app.route('/api/returns/sketch', methods=['GET'])
+def get_returns_sketch():
+    group_by = [c.strip() for c in request.args.get('group_by', ','.join(SKETCH_KEYS)).split(',') if c.strip()]
+    try:
+        start_month = parse_month(request.args.get('from'))
+        end_month = parse_month(request.args.get('to'))
+        top = max(0, int(request.args.get('top', 10)))
+        version, sketches = returns_store.sketch(group_by, start_month, end_month)
+    except ValueError as e:
+        return jsonify({"error": str(e), "group_by_columns": SKETCH_KEYS}), 400
+
+    data = []
+    for key in sorted(sketches):
+        hll, top_products = sketches[key]
+        entry = dict(zip(group_by, key))
+        entry["distinct_products"] = int(round(hll.estimate()))
+        entry["top_products"] = [{"product_key": product, "quantity_low": low, "quantity_high": high}
+                                 for product, low, high in top_products.top(top)]
+        data.append(entry)
+    return Response(fast_json.dumps({
+        "data": data,
+        "group_by": group_by,
+        "from": start_month,
+        "to": end_month,
+        "distinct_relative_error": round(float(HyperLogLog(DEFAULT_PRECISION).relative_error), 4),
+        "version": version,
+    }, sort_keys=True), mimetype='application/json')
+
+# API endpoint for return rates against AdventureWorks orders,
+# e.g. ?group_by=month,territory_key&from=2011-01&to=2011-12
+@app.route('/api/returns/rates', methods=['GET'])
+def get_return_rates():
+    group_by = [c.strip() for c in request.args.get('group_by', ','.join(RATE_KEYS)).split(',') if c.strip()]
+    try:
+        start_month = parse_month(request.args.get('from'))
+        end_month = parse_month(request.args.get('to'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    orders = order_volumes.rollup()
+    if orders is None:
+        return jsonify({"error": "Order volumes are unavailable", "orders": order_volumes.status()}), 503
+    try:
+        result = return_rates(returns_store.rollup(), orders, group_by, start_month, end_month)
+    except ValueError as e:
+        return jsonify({"error": str(e), "group_by_columns": RATE_KEYS}), 400
+    body = fast_json.dumps_with_records(result, 'data', {
+        "group_by": group_by,
+        "from": start_month,
+        "to": end_month,
+        "version": returns_store.version(),
+        "orders_version": order_volumes.version(),
+        "rows": len(result)
+    }, sort_keys=True)
+    return Response(body, mimetype='application/json')
+
+# Order rollup for the query engine, or None while the orders are unavailable
+def order_volumes_snapshot():
+    rollup = order_volumes.rollup()
+    return (order_volumes.version(), rollup) if rollup is not None else None
+
+# Read-only SQL over the cached lake frames; tables are copied into SQLite
+# only when their version changes
+query_engine = QueryEngine({
+    'returns': lambda: returns_store.snapshot(),
+    'returns_monthly': lambda: (returns_store.version(), returns_store.rollup(refresh=False)),
+    'order_volumes': order_volumes_snapshot,
+})
+
+# API endpoint for ad-hoc read-only SQL, e.g.
+# ?sql=SELECT month, SUM(return_quantity) FROM returns GROUP BY month&limit=100
+# (or POST {"sql": ..., "limit": ..., "timeout": ...})
+@app.route('/api/query', methods=['GET', 'POST'])
+def run_query():
+    params = (request.get_json(silent=True) or {}) if request.method == 'POST' else request.args
+    try:
+        limit = params.get('limit')
+        timeout = params.get('timeout')
+        result = query_engine.query(params.get('sql'), int(limit) if limit is not None else None,
+                                    float(timeout) if timeout is not None else None)
+    except QueryTimeout as e:
+        return jsonify({"error": str(e)}), 408
+    except (QueryError, ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+    return Response(fast_json.dumps(result), mimetype='application/json')
+
+# API endpoint listing the tables /api/query can read, with their columns
+@app.route('/api/query/tables', methods=['GET'])
+def get_query_tables():
+    return jsonify({"tables": query_engine.tables()})
+
+# API endpoint exposing ingest timers and counters (JSON, or ?format=prometheus)
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    if request.args.get('format') == 'prometheus':
+        return Response(metrics.to_prometheus(), mimetype='text/plain; version=0.0.4')
+    return jsonify(metrics.snapshot())
 
 # API endpoint for file upload
 @app.route('/api/upload', methods=['POST'])
@@ -293,6 +589,28 @@ def upload_file():
     else:
         return jsonify({"error": "Invalid file or unsupported extension"}), 400
 
+# API endpoint for batch uploads: several files and/or ZIP and TAR archives as
+# multipart 'files', or one archive as the raw request body (?name=2011.tar.gz)
+@app.route('/api/upload/batch', methods=['POST'])
+def upload_batch():
+    content_type = (request.mimetype or '').lower()
+    if content_type in ARCHIVE_CONTENT_TYPES:
+        # Raw archive body: TARs are unpacked as the body arrives
+        name = request.args.get('name') or f"upload{ARCHIVE_CONTENT_TYPES[content_type]}"
+        if archive_type(name) is None:
+            name += ARCHIVE_CONTENT_TYPES[content_type]
+        uploads = [(name, request.stream)]
+    else:
+        files = request.files.getlist('files') + request.files.getlist('file')
+        uploads = [(file.filename, file.stream) for file in files if file.filename]
+    if not uploads:
+        return jsonify({"error": "No files or archive in the request"}), 400
+
+    with metrics.run('upload_batch'):
+        result = batch_uploader.ingest(uploads)
+    status = 200 if result['counts']['loaded'] or result['counts']['saved'] else 400
+    return jsonify(result), status
+
 # Update index() method to show save instructions
 @app.route('/')
 def index():
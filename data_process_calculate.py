@@ -2,133 +2,154 @@ import os
 import PyPDF2
 import re
 import csv
+import math
+import heapq
+import shutil
+import tempfile
 import pandas as pd
+from lake_files import list_lake_files
 
 # Define directories
 csv_dir = "data_lake/csv"
 pdf_dir = "data_lake/pdf"
 txt_dir = "data_lake/txt"
 
+# Columns of the extracted purchase frames
+PURCHASE_COLUMNS = ['Purchase_ID', 'Total_Amount', 'Source_File']
+
+# Empty purchase frame with the expected columns and dtypes
+def empty_purchase_frame():
+    return pd.DataFrame({
+        'Purchase_ID': pd.Series(dtype='object'),
+        'Total_Amount': pd.Series(dtype='float64'),
+        'Source_File': pd.Series(dtype='object')
+    })
+
+# Parse PDF text lines ("date id customer product qty price amount") into a purchase frame
+def parse_purchase_lines(lines, source_file):
+    lines = pd.Series(lines, dtype='object')
+    # Skip header lines
+    lines = lines[~lines.str.contains('Purchase_ID|Purchase_Date', regex=True)]
+
+    # Using more flexible pattern to account for varying formats
+    parts = lines.str.strip().str.split(r'\s+', regex=True)
+    parts = parts[parts.str.len() >= 7]  # Ensure we have all required parts
+    purchase_ids = parts.str[1]  # Second element should be Purchase_ID
+    total_amounts = pd.to_numeric(parts.str[-1], errors='coerce')  # Last element should be Total_Amount
+    valid = purchase_ids.str.startswith('P') & (total_amounts > 0)
+
+    return pd.DataFrame({
+        'Purchase_ID': purchase_ids[valid].values,
+        'Total_Amount': total_amounts[valid].astype('float64').values,
+        'Source_File': source_file
+    }, columns=PURCHASE_COLUMNS)
+
 # Function to extract purchase info from PDF files
 def extract_from_pdf(pdf_file):
     try:
-        purchase_data = []
+        lines = []
         with open(pdf_file, 'rb') as file:
             reader = PyPDF2.PdfReader(file)
             for page in reader.pages:
-                text = page.extract_text()
-                
-                # Split text into lines and process each line
-                lines = text.split('\n')
-                for line in lines:
-                    # Skip header line
-                    if 'Purchase_ID' in line or 'Purchase_Date' in line:
-                        continue
-                    
-                    # Pattern to match: date id customer product qty price amount
-                    # Using more flexible pattern to account for varying formats
-                    parts = re.split(r'\s+', line.strip())
-                    if len(parts) >= 7:  # Ensure we have all required parts
-                        try:
-                            purchase_id = parts[1]  # Second element should be Purchase_ID
-                            total_amount = float(parts[-1])  # Last element should be Total_Amount
-                            if purchase_id.startswith('P') and total_amount > 0:
-                                purchase_data.append({
-                                    'Purchase_ID': purchase_id,
-                                    'Total_Amount': total_amount,
-                                    'Source_File': os.path.basename(pdf_file)
-                                })
-                        except (ValueError, IndexError):
-                            continue
-                    
-        return purchase_data
+                lines.extend(page.extract_text().split('\n'))
+        return parse_purchase_lines(lines, os.path.basename(pdf_file))
     except Exception as e:
         print(f"Error processing PDF file {pdf_file}: {e}")
-        return []
+        return empty_purchase_frame()
 
-# Function to extract purchase info from TXT files
+# read_csv options for the tab-separated purchases files
+TSV_READ_OPTIONS = dict(sep='\t', usecols=['Product_ID', 'Total_Amount'], keep_default_na=False,
+                        encoding='utf-8', on_bad_lines='skip')
+
+# Read the Product_ID and Total_Amount columns of a tab-separated purchases file.
+# Amounts are parsed as floats directly; only files containing a bad amount
+# fall back to reading them as text so the bad rows can be dropped.
+def read_purchases_tsv(txt_file):
+    try:
+        return pd.read_csv(txt_file, dtype={'Product_ID': 'object', 'Total_Amount': 'float64'}, **TSV_READ_OPTIONS)
+    except ValueError:
+        return pd.read_csv(txt_file, dtype={'Product_ID': 'object', 'Total_Amount': 'object'}, **TSV_READ_OPTIONS)
+
+# Build a purchase frame from raw Product_ID/Total_Amount columns; rows with
+# an unparseable amount or missing fields are skipped
+def clean_purchases_tsv(df, source_file):
+    total_amounts = pd.to_numeric(df['Total_Amount'], errors='coerce')
+    valid = total_amounts.notna() & df['Product_ID'].notna()
+    return pd.DataFrame({
+        'Purchase_ID': df['Product_ID'][valid].values,  # Using Product_ID as Purchase_ID
+        'Total_Amount': total_amounts[valid].astype('float64').values,
+        'Source_File': source_file
+    }, columns=PURCHASE_COLUMNS)
+
+# Function to extract purchase info from tab-separated TXT files
 def extract_from_txt(txt_file):
     try:
-        purchase_data = []
         with open(txt_file, 'r', encoding='utf-8') as file:
-            lines = file.readlines()
-            headers = lines[0].strip().split('\t')
-            
-            # Find index of relevant columns
-            try:
-                total_amount_idx = headers.index('Total_Amount')
-                product_id_idx = headers.index('Product_ID')
-            except ValueError:
-                print(f"Required columns not found in {txt_file}")
-                return []
-            
-            # Process each line
-            for line in lines[1:]:  # Skip header
-                parts = line.strip().split('\t')
-                if len(parts) >= max(total_amount_idx, product_id_idx) + 1:
-                    try:
-                        purchase_data.append({
-                            'Purchase_ID': parts[product_id_idx],  # Using Product_ID as Purchase_ID
-                            'Total_Amount': float(parts[total_amount_idx]),
-                            'Source_File': os.path.basename(txt_file)
-                        })
-                    except (ValueError, IndexError):
-                        continue
-                        
-        return purchase_data
+            headers = file.readline().strip().split('\t')
+
+        # Check for required columns
+        if 'Total_Amount' not in headers or 'Product_ID' not in headers:
+            print(f"Required columns not found in {txt_file}")
+            return empty_purchase_frame()
+
+        return clean_purchases_tsv(read_purchases_tsv(txt_file), os.path.basename(txt_file))
     except Exception as e:
         print(f"Error processing TXT file {txt_file}: {e}")
-        return []
+        return empty_purchase_frame()
 
 # Function to extract purchase info from CSV files
 def extract_from_csv(csv_file):
     try:
-        purchase_data = []
-        df = pd.read_csv(csv_file)
-        
+        columns = pd.read_csv(csv_file, nrows=0).columns
+
         # Check for required columns
-        if 'Purchase_ID' in df.columns and 'Total_Amount' in df.columns:
-            for _, row in df.iterrows():
-                purchase_data.append({
-                    'Purchase_ID': str(row['Purchase_ID']),
-                    'Total_Amount': float(row['Total_Amount']),
-                    'Source_File': os.path.basename(csv_file)
-                })
-        else:
+        if 'Purchase_ID' not in columns or 'Total_Amount' not in columns:
             print(f"Required columns not found in {csv_file}")
-            print(f"Available columns: {', '.join(df.columns)}")
-            
-        return purchase_data
+            print(f"Available columns: {', '.join(columns)}")
+            return empty_purchase_frame()
+
+        df = pd.read_csv(
+            csv_file,
+            usecols=['Purchase_ID', 'Total_Amount'],
+            dtype={'Purchase_ID': 'object', 'Total_Amount': 'float64'}
+        )
+        df['Source_File'] = os.path.basename(csv_file)
+        return df[PURCHASE_COLUMNS]
     except Exception as e:
         print(f"Error processing CSV file {csv_file}: {e}")
-        return []
+        return empty_purchase_frame()
 
 def process_all_files():
-    all_purchase_data = []
-    
+    frames = []
+
     # Process each type of file
     for directory, file_type, process_func in [
         (csv_dir, '.csv', extract_from_csv),
         (pdf_dir, '.pdf', extract_from_pdf),
         (txt_dir, '.txt', extract_from_txt)
     ]:
-        if os.path.exists(directory):
-            for file_name in os.listdir(directory):
-                if file_name.endswith(file_type):
-                    file_path = os.path.join(directory, file_name)
-                    data = process_func(file_path)
-                    all_purchase_data.extend(data)
-                    print(f"Processed {file_type.upper()} file: {file_name}")
-                    if data:
-                        print(f"Found {len(data)} records in {file_name}")
-    
-    return all_purchase_data
+        for file_path, _ in list_lake_files(directory, file_type):
+            file_name = os.path.basename(file_path)
+            data = process_func(file_path)
+            frames.append(data)
+            print(f"Processed {file_type.upper()} file: {file_name}")
+            if not data.empty:
+                print(f"Found {len(data)} records in {file_name}")
+
+    if not frames:
+        return empty_purchase_frame()
+    return pd.concat(frames, ignore_index=True)
 
 def save_results(purchase_data, output_file='purchase_summary.csv'):
-    if purchase_data:
-        df = pd.DataFrame(purchase_data)
+    # Accept the extracted frame as-is; lists of record dicts are still supported
+    if isinstance(purchase_data, pd.DataFrame):
+        df = purchase_data
+    else:
+        df = pd.DataFrame(purchase_data, columns=PURCHASE_COLUMNS)
+
+    if not df.empty:
         # Sort by Purchase_ID
-        df = df.sort_values('Purchase_ID')
+        df = df.sort_values('Purchase_ID', kind='stable')
         df.to_csv(output_file, index=False)
         print(f"\nResults saved to {output_file}")
         
@@ -156,13 +177,174 @@ def save_results(purchase_data, output_file='purchase_summary.csv'):
     else:
         print("No purchase data found")
 
+# Yield the purchase data as frames of at most chunk_size rows, one file at a time
+def iter_purchase_chunks(chunk_size=1_000_000):
+    for directory, file_type in [(csv_dir, '.csv'), (pdf_dir, '.pdf'), (txt_dir, '.txt')]:
+        for file_path, _ in list_lake_files(directory, file_type):
+            file_name = os.path.basename(file_path)
+            try:
+                if file_type == '.csv':
+                    columns = pd.read_csv(file_path, nrows=0).columns
+                    if 'Purchase_ID' not in columns or 'Total_Amount' not in columns:
+                        print(f"Required columns not found in {file_path}")
+                        continue
+                    for chunk in pd.read_csv(file_path, usecols=['Purchase_ID', 'Total_Amount'],
+                                             dtype={'Purchase_ID': 'object', 'Total_Amount': 'float64'},
+                                             chunksize=chunk_size):
+                        chunk['Source_File'] = file_name
+                        yield chunk[PURCHASE_COLUMNS]
+                elif file_type == '.txt':
+                    with open(file_path, 'r', encoding='utf-8') as file:
+                        headers = file.readline().strip().split('\t')
+                    if 'Total_Amount' not in headers or 'Product_ID' not in headers:
+                        print(f"Required columns not found in {file_path}")
+                        continue
+                    for chunk in pd.read_csv(file_path, dtype='object', chunksize=chunk_size, **TSV_READ_OPTIONS):
+                        yield clean_purchases_tsv(chunk, file_name)
+                else:
+                    lines = []
+                    with open(file_path, 'rb') as file:
+                        reader = PyPDF2.PdfReader(file)
+                        for page in reader.pages:
+                            lines.extend(page.extract_text().split('\n'))
+                            if len(lines) >= chunk_size:
+                                yield parse_purchase_lines(lines, file_name)
+                                lines = []
+                    if lines:
+                        yield parse_purchase_lines(lines, file_name)
+                print(f"Processed {file_type.upper()} file: {file_name}")
+            except Exception as e:
+                print(f"Error processing {file_type.upper()} file {file_path}: {e}")
+
+# Sort key for spilled rows: (missing flag, Purchase_ID). sort_values orders an
+# empty ID like any other string (first) but a missing (NaN) ID last, and both
+# are written as '', so runs carry the flag in their first column.
+def _purchase_sort_key(row):
+    return (row[0], row[1])
+
+# k-way merge of sorted CSV runs into one output file; the final output
+# (written with a header) drops the missing flag column
+def _merge_runs(run_paths, output_file, header=None):
+    files = [open(path, 'r', encoding='utf-8', newline='') for path in run_paths]
+    try:
+        readers = [csv.reader(file) for file in files]
+        with open(output_file, 'w', encoding='utf-8', newline='') as out:
+            writer = csv.writer(out, lineterminator=os.linesep)
+            merged = heapq.merge(*readers, key=_purchase_sort_key)
+            if header:
+                writer.writerow(header)
+                merged = (row[1:] for row in merged)
+            writer.writerows(merged)
+    finally:
+        for file in files:
+            file.close()
+
+# Merge sorted runs, at most fan_in files at a time, into output_file
+def merge_sorted_runs(run_paths, output_file, header, fan_in=64):
+    run_paths = list(run_paths)
+    level = 0
+    while len(run_paths) > fan_in:
+        merged = []
+        for start in range(0, len(run_paths), fan_in):
+            group = run_paths[start:start + fan_in]
+            merged_path = os.path.join(os.path.dirname(group[0]), f"merge_{level}_{start // fan_in:06d}.csv")
+            _merge_runs(group, merged_path)
+            for path in group:
+                os.remove(path)
+            merged.append(merged_path)
+        run_paths = merged
+        level += 1
+    _merge_runs(run_paths, output_file, header)
+
+# Out-of-core variant of save_results: memory is bounded by the chunk size.
+# Summary statistics are accumulated per chunk and the sorted output is
+# produced by an external merge sort over runs spilled to spill_dir.
+def save_results_chunked(chunks, output_file='purchase_summary.csv', spill_dir=None, fan_in=64):
+    total_purchases = 0
+    amount_count = 0
+    amount_sums = []
+    file_stats = {}  # Source_File -> [purchase count, total amount]
+
+    run_dir = tempfile.mkdtemp(prefix='purchase_runs_', dir=spill_dir)
+    try:
+        run_paths = []
+        for chunk in chunks:
+            if chunk.empty:
+                continue
+            total_purchases += len(chunk)
+            amount_count += int(chunk['Total_Amount'].count())
+            amount_sums.append(float(chunk['Total_Amount'].sum()))
+            per_file = chunk.groupby('Source_File').agg({'Purchase_ID': 'count', 'Total_Amount': 'sum'})
+            for source_file, count, amount in zip(per_file.index, per_file['Purchase_ID'], per_file['Total_Amount']):
+                stats = file_stats.setdefault(source_file, [0, []])
+                stats[0] += int(count)
+                stats[1].append(float(amount))
+
+            # Spill the chunk as a sorted run, in the order save_results sorts it
+            run_path = os.path.join(run_dir, f"run_{len(run_paths):06d}.csv")
+            run = chunk.sort_values('Purchase_ID', kind='stable')
+            run.insert(0, 'missing', run['Purchase_ID'].isna().astype('int64'))
+            run.to_csv(run_path, index=False, header=False)
+            run_paths.append(run_path)
+
+        if not total_purchases:
+            print("No purchase data found")
+            return None
+
+        merge_sorted_runs(run_paths, output_file, PURCHASE_COLUMNS, fan_in=fan_in)
+        print(f"\nResults saved to {output_file} (merged {len(run_paths)} sorted runs)")
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+
+    # Display summary statistics
+    total_amount = math.fsum(amount_sums)
+    avg_amount = total_amount / amount_count if amount_count else float('nan')
+
+    print(f"\nSummary Statistics:")
+    print(f"Total number of purchases: {total_purchases}")
+    print(f"Total amount: ${total_amount:,.2f}")
+    print(f"Average amount per purchase: ${avg_amount:,.2f}")
+
+    # Display summary by file type
+    print("\nPurchases by file type:")
+    file_summary = pd.DataFrame(
+        [(source_file, count, math.fsum(amounts)) for source_file, (count, amounts) in sorted(file_stats.items())],
+        columns=['Source_File', 'Purchase_ID', 'Total_Amount']
+    )
+    print(file_summary)
+
+    # Display first few records
+    print("\nFirst few records:")
+    print(pd.read_csv(output_file, nrows=5))
+
+    return {
+        'total_purchases': total_purchases,
+        'total_amount': total_amount,
+        'average_amount': avg_amount,
+        'file_summary': file_summary.to_dict('records'),
+        'runs': len(run_paths)
+    }
+
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Extract and summarize purchase data from the data lake")
+    parser.add_argument('--output', default='purchase_summary.csv', help="Sorted output CSV")
+    parser.add_argument('--chunk-size', type=int,
+                        help="Process out of core in chunks of this many rows (for lakes larger than RAM)")
+    parser.add_argument('--spill-dir', help="Directory for sorted runs in chunked mode (default: system temp)")
+    args = parser.parse_args()
+
     # Create directories if they don't exist
     for directory in [csv_dir, pdf_dir, txt_dir]:
         os.makedirs(directory, exist_ok=True)
     
-    # Process all files and get purchase data
-    purchase_data = process_all_files()
-    
-    # Save and display results
-    save_results(purchase_data)
\ No newline at end of file
+    if args.chunk_size:
+        # Stream chunks through the accumulators and external sort
+        save_results_chunked(iter_purchase_chunks(args.chunk_size), args.output, spill_dir=args.spill_dir)
+    else:
+        # Process all files and get purchase data
+        purchase_data = process_all_files()
+
+        # Save and display results
+        save_results(purchase_data, args.output)
\ No newline at end of file
@@ -0,0 +1,158 @@
+import time
+import hashlib
+import threading
+
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+# Bulk queries against the OLTP AdventureWorks2019 database
+SQLSERVER_PRODUCT_QUERY = "SELECT ProductID AS product_key, Name AS product_name FROM Production.Product"
+SQLSERVER_TERRITORY_QUERY = "SELECT TerritoryID AS territory_key, Name AS territory_name FROM Sales.SalesTerritory"
+
+# Same dimensions in a local SQLite stand-in (see create_sqlite_standin)
+SQLITE_PRODUCT_QUERY = "SELECT product_key, product_name FROM product"
+SQLITE_TERRITORY_QUERY = "SELECT territory_key, territory_name FROM sales_territory"
+
+# Refresh the cached dimensions once an hour by default
+DEFAULT_REFRESH_INTERVAL = 3600
+DEFAULT_RETRY_INTERVAL = 60
+
+
+class DimensionCache:
+    """
+    In-memory cache of valid product and territory keys with their names.
+    Both dimensions are loaded with one bulk query each and reloaded once
+    refresh_interval has passed, so key checks are set/dict lookups and
+    never a query per row.
+    Args:
+        engine: SQLAlchemy engine for AdventureWorks2019 or a SQLite stand-in
+        refresh_interval (int): Seconds before the cached keys are reloaded
+        retry_interval (int): Seconds before a failed load is retried
+        product_query, territory_query (str): Override the bulk queries
+    """
+
+    def __init__(self, engine, refresh_interval=DEFAULT_REFRESH_INTERVAL, retry_interval=DEFAULT_RETRY_INTERVAL,
+                 product_query=None, territory_query=None):
+        self.engine = engine
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        sqlite = engine.dialect.name == 'sqlite'
+        self.product_query = product_query or (SQLITE_PRODUCT_QUERY if sqlite else SQLSERVER_PRODUCT_QUERY)
+        self.territory_query = territory_query or (SQLITE_TERRITORY_QUERY if sqlite else SQLSERVER_TERRITORY_QUERY)
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._products = None  # product_key -> product_name
+        self._territories = None  # territory_key -> territory_name
+        self._product_keys = None
+        self._territory_keys = None
+        self._loaded_at = None
+        self._version = None
+        self._last_attempt = None
+        self.last_error = None
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        return cls(create_engine(url), **kwargs)
+
+    @staticmethod
+    def _read_mapping(conn, query, key_column, name_column):
+        df = pd.read_sql(text(query), conn)
+        keys = df[key_column].astype('int64').astype(str)
+        return dict(zip(keys, df[name_column].astype(str)))
+
+    def load(self):
+        """
+        Bulk-load both dimensions, replacing the cached keys atomically.
+        Returns:
+            True if the dimensions were loaded, False if the query failed
+        """
+        self._last_attempt = time.monotonic()
+        try:
+            with self.engine.connect() as conn:
+                products = self._read_mapping(conn, self.product_query, 'product_key', 'product_name')
+                territories = self._read_mapping(conn, self.territory_query, 'territory_key', 'territory_name')
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Error loading dimension keys: {e}")
+            return False
+        with self._lock:
+            self._products = products
+            self._territories = territories
+            self._product_keys = frozenset(products)
+            self._territory_keys = frozenset(territories)
+            self._loaded_at = time.monotonic()
+            self._version = hashlib.sha1(repr((sorted(products.items()), sorted(territories.items())))
+                                         .encode('utf-8')).hexdigest()[:12]
+            self.last_error = None
+        return True
+
+    def _ensure_fresh(self):
+        interval = self.refresh_interval if self.last_error is None else self.retry_interval
+        if self._last_attempt is None or time.monotonic() - self._last_attempt >= interval:
+            with self._load_lock:
+                # Another thread may have reloaded while this one waited
+                if self._last_attempt is None or time.monotonic() - self._last_attempt >= interval:
+                    self.load()
+
+    @property
+    def available(self):
+        self._ensure_fresh()
+        return self._products is not None
+
+    def product_keys(self):
+        """Valid product keys as strings, or None if the dimensions could not be loaded."""
+        self._ensure_fresh()
+        return self._product_keys
+
+    def territory_keys(self):
+        """Valid territory keys as strings, or None if the dimensions could not be loaded."""
+        self._ensure_fresh()
+        return self._territory_keys
+
+    def version(self):
+        """Content hash of the loaded dimensions, or None if they could not be loaded."""
+        self._ensure_fresh()
+        return self._version
+
+    def enrich(self, frame):
+        """
+        Add product_name and territory_name columns to a typed returns frame.
+        Args:
+            frame (DataFrame): Frame with product_key and territory_key text columns
+        Returns:
+            New frame with the name columns (None where a key is unknown)
+        """
+        self._ensure_fresh()
+        enriched = frame.copy()
+        for key_column, name_column, mapping in [('product_key', 'product_name', self._products),
+                                                 ('territory_key', 'territory_name', self._territories)]:
+            names = frame[key_column].map(mapping or {}).astype('object')
+            enriched[name_column] = names.where(names.notna(), None)
+        return enriched
+
+    def status(self):
+        return {
+            'loaded': self._products is not None,
+            'products': len(self._products or {}),
+            'territories': len(self._territories or {}),
+            'age_seconds': round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None,
+            'refresh_interval': self.refresh_interval,
+            'last_error': self.last_error,
+        }
+
+
+# Create (or replace) the product and sales_territory tables of a SQLite stand-in
+def create_sqlite_standin(url_or_engine, products, territories):
+    """
+    Args:
+        url_or_engine: SQLAlchemy URL or engine of the SQLite database
+        products (dict): product_key -> product_name
+        territories (dict): territory_key -> territory_name
+    """
+    engine = create_engine(url_or_engine) if isinstance(url_or_engine, str) else url_or_engine
+    pd.DataFrame({'product_key': [int(k) for k in products], 'product_name': list(products.values())}).to_sql(
+        'product', engine, if_exists='replace', index=False)
+    pd.DataFrame({'territory_key': [int(k) for k in territories],
+                  'territory_name': list(territories.values())}).to_sql(
+        'sales_territory', engine, if_exists='replace', index=False)
+    return engine
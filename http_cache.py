@@ -0,0 +1,142 @@
+import gzip
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+# Content codings this module can produce, in order of preference
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def supported_encodings():
+    return (['br'] if brotli is not None else []) + ['gzip']
+
+
+# Pick the preferred content coding accepted by the client, or 'identity'
+def choose_encoding(accept_encoding):
+    accepted = set()
+    for part in (accept_encoding or '').split(','):
+        coding, _, params = part.strip().partition(';')
+        q = params.strip()
+        if q.startswith('q='):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    for encoding in supported_encodings():
+        if encoding in accepted or '*' in accepted:
+            return encoding
+    return 'identity'
+
+
+def compress(body, encoding):
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return body
+
+
+# Strong ETag for one representation; the coding is appended after '+'
+def make_etag(version, variant='', encoding='identity'):
+    tag = f"{version}-{variant}" if variant else str(version)
+    if encoding != 'identity':
+        tag += f"+{encoding}"
+    return f'"{tag}"'
+
+
+# Weak comparison of an If-None-Match header against an ETag; any coding of
+# the same snapshot matches, since they decode to the same body
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    wanted = etag.strip('"').split('+', 1)[0]
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate.strip('"').split('+', 1)[0] == wanted:
+            return True
+    return False
+
+
+class ResponseCache:
+    """
+    Serialized response bodies per snapshot version, with their compressed variants.
+    Each key keeps only the body of its latest version, so a poll against an
+    unchanged lake costs a dictionary lookup instead of rebuilding and
+    re-serializing the dataset. The least recently used keys are dropped
+    beyond max_entries.
+    """
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (version, {encoding: body})
+
+    def get(self, key, version, encoding, build_body):
+        """
+        Get the body of a response, building and compressing it once per version.
+        Args:
+            key (str): Response variant, e.g. the endpoint and its query options
+            version (str): Snapshot version the body is built from
+            encoding (str): 'identity', 'gzip' or 'br'
+            build_body (callable): Returns the uncompressed body as bytes
+        Returns:
+            The body bytes in the requested encoding
+        """
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+            if cached is not None and cached[0] == version:
+                if encoding in cached[1]:
+                    return cached[1][encoding]
+                bodies = dict(cached[1])
+            else:
+                bodies = None
+
+        if bodies is None:
+            body = build_body()
+            if isinstance(body, str):
+                body = body.encode('utf-8')
+            bodies = {'identity': body}
+        if encoding not in bodies:
+            bodies[encoding] = compress(bodies['identity'], encoding)
+
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[0] == version:
+                cached[1].update(bodies)
+            else:
+                self._entries[key] = (version, bodies)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return bodies[encoding]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {key: {'version': version, 'bytes': {enc: len(body) for enc, body in bodies.items()}}
+                    for key, (version, bodies) in self._entries.items()}
+
+
+# Response headers for a cached representation
+def cache_headers(etag, encoding='identity'):
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    return headers
@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import signal
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from ingest_metrics import metrics
+from lake_files import extract_consistent, list_lake_files, publish_file
+
+# Committed offsets: the signature of every lake file whose rows were loaded
+DEFAULT_OFFSETS_PATH = 'data_lake/ingest_offsets.json'
+
+DEFAULT_POLL_INTERVAL = 1.0
+# A file is ingested once its size and mtime stayed the same for this long,
+# so files still being written by SFTP or a copy to a mount are not read early
+DEFAULT_SETTLE_SECONDS = 2.0
+DEFAULT_BATCH_FILES = 16
+DEFAULT_EXTRACT_WORKERS = 4
+
+
+class OffsetStore:
+    """
+    Signatures of the lake files that were loaded, kept in a JSON file that
+    is replaced atomically on every commit. A file is loaded again only when
+    its signature changes.
+    Args:
+        path (str): Offsets file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offsets = {}  # path -> {'signature': [size, mtime_ns], 'rows': n, 'committed_at': ts}
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                self.offsets = json.load(file).get('files', {})
+        except FileNotFoundError:
+            pass
+        except (ValueError, OSError) as e:
+            print(f"Ignoring unreadable offsets file {path}: {e}")
+
+    def is_committed(self, path, signature):
+        entry = self.offsets.get(path)
+        return entry is not None and tuple(entry['signature']) == tuple(signature)
+
+    def commit(self, loaded, present=None):
+        """
+        Record loaded files and persist the offsets.
+        Args:
+            loaded (dict): path -> (signature, rows)
+            present (set): Paths still in the lake; offsets of other files are dropped
+        """
+        now = time.time()
+        for path, (signature, rows) in loaded.items():
+            self.offsets[path] = {'signature': list(signature), 'rows': int(rows), 'committed_at': now}
+        if present is not None:
+            for path in list(self.offsets):
+                if path not in present and path not in loaded:
+                    del self.offsets[path]
+        payload = json.dumps({'files': self.offsets}, indent=1, sort_keys=True)
+
+        def write(tmp_path):
+            with open(tmp_path, 'w', encoding='utf-8') as file:
+                file.write(payload)
+
+        publish_file(self.path, write)
+
+
+class IngestDaemon:
+    """
+    Poll the lake folders and load new or changed files in micro-batches.
+    Each poll lists the folders; files whose signature held still for
+    settle_seconds and is not committed yet are ready. Ready files are
+    extracted in parallel, loaded with one load_func call per batch of up
+    to batch_files and then committed to the offsets, so a restart resumes
+    after the last committed batch (the checkpointed loader skips chunks of
+    a batch that was loaded but not committed).
+    Args:
+        sources (callable): Returns a list of (directory, extension, extract_func)
+        load_func (callable): Loads one concatenated batch frame
+        offsets (OffsetStore): Committed offsets
+        poll_interval (float): Seconds between polls
+        settle_seconds (float): Quiet time before a file is considered complete
+        batch_files (int): Files per micro-batch
+        extract_workers (int): Parallel extractions per batch
+    """
+
+    def __init__(self, sources, load_func, offsets, poll_interval=DEFAULT_POLL_INTERVAL,
+                 settle_seconds=DEFAULT_SETTLE_SECONDS, batch_files=DEFAULT_BATCH_FILES,
+                 extract_workers=DEFAULT_EXTRACT_WORKERS):
+        self.sources = sources
+        self.load_func = load_func
+        self.offsets = offsets
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self.batch_files = batch_files
+        self.extract_workers = extract_workers
+        self._stop = threading.Event()
+        self._seen = {}  # path -> (signature, monotonic time the signature was first seen)
+        self.batches = 0
+
+    def stop(self):
+        self._stop.set()
+
+    def poll(self):
+        """
+        List the lake and return the files ready to ingest.
+        Returns:
+            (ready, present): ready is a list of (path, signature, extract_func)
+            in modification order; present is the set of all lake paths
+        """
+        now = time.monotonic()
+        wall_now = time.time()
+        ready, present, seen = [], set(), {}
+        for directory, file_type, extract_func in self.sources():
+            for path, signature in list_lake_files(directory, file_type):
+                present.add(path)
+                previous = self._seen.get(path)
+                since = previous[1] if previous is not None and previous[0] == signature else now
+                seen[path] = (signature, since)
+                if self.offsets.is_committed(path, signature):
+                    continue
+                settled = now - since >= self.settle_seconds or \
+                    wall_now - signature[1] / 1e9 >= self.settle_seconds
+                if previous is not None and previous[0] == signature and settled:
+                    ready.append((path, signature, extract_func))
+        self._seen = seen
+        ready.sort(key=lambda entry: entry[1][1])
+        return ready, present
+
+    def _extract(self, entry):
+        path, signature, extract_func = entry
+        signature, data = extract_consistent(path, signature, extract_func)
+        metrics.count('files_processed', 1, os.path.basename(path))
+        return path, signature, data
+
+    def run_batch(self, batch, present=None):
+        """
+        Extract, load and commit one micro-batch.
+        Returns:
+            Dict with files, rows and per-step seconds
+        """
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.extract_workers) as pool:
+            extracted = list(pool.map(self._extract, batch))
+        extract_seconds = time.perf_counter() - start
+
+        frames = [data for _, _, data in extracted if data is not None and len(data)]
+        rows = sum(len(frame) for frame in frames)
+        load_start = time.perf_counter()
+        if frames:
+            self.load_func(pd.concat(frames, ignore_index=True))
+        load_seconds = time.perf_counter() - load_start
+
+        self.offsets.commit({path: (signature, len(data) if data is not None else 0)
+                             for path, signature, data in extracted}, present)
+        self.batches += 1
+        # Freshness: time from the last write of a file until its rows were committed
+        lag = max(time.time() - signature[1] / 1e9 for _, signature, _ in batch)
+        stats = {'files': len(batch), 'rows': rows, 'extract_seconds': round(extract_seconds, 3),
+                 'load_seconds': round(load_seconds, 3), 'seconds': round(time.perf_counter() - start, 3),
+                 'max_freshness_seconds': round(lag, 3)}
+        print(f"Batch {self.batches}: {stats['files']} files, {rows} rows in {stats['seconds']}s "
+              f"(extract {stats['extract_seconds']}s, load {stats['load_seconds']}s); "
+              f"freshness {stats['max_freshness_seconds']}s")
+        return stats
+
+    def run_once(self):
+        """Poll once and ingest every ready file; returns the stats of each batch."""
+        ready, present = self.poll()
+        results = []
+        for index in range(0, len(ready), self.batch_files):
+            if self._stop.is_set():
+                break
+            with metrics.run('ingest_batch'):
+                results.append(self.run_batch(ready[index:index + self.batch_files], present))
+        return results
+
+    def run(self, max_idle_polls=None):
+        """
+        Poll until stopped. Failed batches are not committed and are retried
+        on the next poll after a backoff.
+        Args:
+            max_idle_polls (int): Return after this many polls in a row found nothing, e.g. for --drain
+        """
+        idle = 0
+        failures = 0
+        while not self._stop.is_set():
+            try:
+                results = self.run_once()
+                failures = 0
+            except Exception as e:
+                failures += 1
+                delay = min(60.0, self.poll_interval * 2 ** failures)
+                print(f"Ingest batch failed ({type(e).__name__}: {e}); retrying in {delay:.1f}s")
+                self._stop.wait(delay)
+                continue
+            idle = 0 if results or self._seen_pending() else idle + 1
+            if max_idle_polls is not None and idle >= max_idle_polls:
+                break
+            self._stop.wait(self.poll_interval)
+
+    # Whether some listed file is not committed yet (still settling)
+    def _seen_pending(self):
+        return any(not self.offsets.is_committed(path, signature) for path, (signature, _) in self._seen.items())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Continuously load new lake files into SQL Server")
+    parser.add_argument('--interval', type=float, default=DEFAULT_POLL_INTERVAL, help="Seconds between polls")
+    parser.add_argument('--settle', type=float, default=DEFAULT_SETTLE_SECONDS,
+                        help="Seconds a file must stay unchanged before it is ingested")
+    parser.add_argument('--batch-files', type=int, default=DEFAULT_BATCH_FILES, help="Files per micro-batch")
+    parser.add_argument('--extract-workers', type=int, default=DEFAULT_EXTRACT_WORKERS,
+                        help="Parallel extractions per batch")
+    parser.add_argument('--offsets', default=DEFAULT_OFFSETS_PATH, help="Committed offsets file")
+    parser.add_argument('--drain', action='store_true',
+                        help="Exit once every file in the lake is loaded instead of running forever")
+    args = parser.parse_args(argv)
+
+    # Importing the app connects to SQL Server (or RETURNS_DATABASE_URL)
+    import data_lake_solution
+
+    daemon = IngestDaemon(data_lake_solution.lake_sources, data_lake_solution.insert_into_sqlserver,
+                          OffsetStore(args.offsets), poll_interval=args.interval, settle_seconds=args.settle,
+                          batch_files=args.batch_files, extract_workers=args.extract_workers)
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: daemon.stop())
+    print(f"Watching {', '.join(directory for directory, _, _ in data_lake_solution.lake_sources())} "
+          f"every {args.interval}s")
+    daemon.run(max_idle_polls=2 if args.drain else None)
+
+
+if __name__ == "__main__":
+    main()
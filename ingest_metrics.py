@@ -0,0 +1,161 @@
+import os
+import time
+import cProfile
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+# Stages timed by the ingest pipeline, in pipeline order
+STAGES = ['read', 'text_extract', 'parse', 'validate', 'load']
+
+# Counters reported for every run
+COUNTERS = ['rows_accepted', 'rows_rejected', 'rows_invalid', 'rows_loaded', 'load_retries', 'files_processed',
+            'bytes_read', 'saves_coalesced', 'saves_rejected']
+
+
+class IngestMetrics:
+    """
+    Thread-safe per-stage timers and row/byte counters for ingest runs.
+    Stage timings and counters are kept both in total and per source file.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._profile_output = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._stages = defaultdict(lambda: {'calls': 0, 'seconds': 0.0})
+            self._counters = defaultdict(int)
+            self._files = {}
+            self._runs = defaultdict(lambda: {'calls': 0, 'seconds': 0.0, 'last_seconds': 0.0})
+            self._pipelines = {}
+            self._started_at = time.time()
+
+    def _file_entry(self, source_file):
+        entry = self._files.get(source_file)
+        if entry is None:
+            entry = {'stages': defaultdict(float), 'counters': defaultdict(int)}
+            self._files[source_file] = entry
+        return entry
+
+    @contextmanager
+    def stage(self, name, source_file=None):
+        """
+        Time a block of work as one call of the given stage.
+        Args:
+            name (str): Stage name, usually one of STAGES
+            source_file (str): Optional file the work belongs to
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                stage = self._stages[name]
+                stage['calls'] += 1
+                stage['seconds'] += elapsed
+                if source_file is not None:
+                    self._file_entry(source_file)['stages'][name] += elapsed
+
+    def count(self, name, value=1, source_file=None):
+        if not value:
+            return
+        with self._lock:
+            self._counters[name] += value
+            if source_file is not None:
+                self._file_entry(source_file)['counters'][name] += value
+
+    def add_bytes(self, value, source_file=None):
+        self.count('bytes_read', value, source_file)
+
+    def profile_next_run(self, output_file):
+        """Arm cProfile for the next run() block; stats are written to output_file."""
+        with self._lock:
+            self._profile_output = output_file
+
+    @contextmanager
+    def run(self, name):
+        """
+        Time a whole ingest run, profiling it if profile_next_run() was armed.
+        Args:
+            name (str): Run name, e.g. 'process_all_files'
+        """
+        with self._lock:
+            profile_output, self._profile_output = self._profile_output, None
+        profiler = cProfile.Profile() if profile_output else None
+        start = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        try:
+            yield
+        finally:
+            if profiler:
+                profiler.disable()
+                profiler.dump_stats(profile_output)
+                print(f"Wrote ingest profile to {profile_output}")
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                run = self._runs[name]
+                run['calls'] += 1
+                run['seconds'] += elapsed
+                run['last_seconds'] = elapsed
+
+    def record_pipeline(self, name, stats):
+        """Keep the stage utilization stats of the last run of a pipeline (see pipelined_load.py)."""
+        with self._lock:
+            self._pipelines[name] = dict(stats, finished_at=round(time.time(), 3))
+
+    def snapshot(self):
+        """
+        Get a JSON-serializable copy of all timers and counters.
+        Returns:
+            Dict with stages, counters, throughput, runs and per-file breakdowns
+        """
+        with self._lock:
+            counters = {name: self._counters.get(name, 0) for name in COUNTERS}
+            counters.update(self._counters)
+            run_seconds = sum(run['seconds'] for run in self._runs.values())
+            read_seconds = self._stages['read']['seconds'] if 'read' in self._stages else 0.0
+            return {
+                'uptime_seconds': round(time.time() - self._started_at, 3),
+                'stages': {name: {'calls': stage['calls'], 'seconds': round(stage['seconds'], 6)}
+                           for name, stage in self._stages.items()},
+                'counters': counters,
+                'throughput': {
+                    'bytes_per_second': round(counters['bytes_read'] / run_seconds, 1) if run_seconds else None,
+                    'rows_per_second': round(counters['rows_accepted'] / run_seconds, 1) if run_seconds else None,
+                    'read_bytes_per_second': round(counters['bytes_read'] / read_seconds, 1) if read_seconds else None,
+                },
+                'runs': {name: {key: round(value, 6) if isinstance(value, float) else value
+                                for key, value in run.items()}
+                         for name, run in self._runs.items()},
+                'files': {source_file: {'stages': {k: round(v, 6) for k, v in entry['stages'].items()},
+                                        'counters': dict(entry['counters'])}
+                          for source_file, entry in self._files.items()},
+                'pipelines': dict(self._pipelines),
+            }
+
+    def to_prometheus(self, prefix='datalake_ingest'):
+        """Render the totals (without per-file detail) in Prometheus text format."""
+        snapshot = self.snapshot()
+        lines = [f"# TYPE {prefix}_stage_seconds_total counter"]
+        for name, stage in snapshot['stages'].items():
+            lines.append(f'{prefix}_stage_seconds_total{{stage="{name}"}} {stage["seconds"]}')
+            lines.append(f'{prefix}_stage_calls_total{{stage="{name}"}} {stage["calls"]}')
+        for name, value in snapshot['counters'].items():
+            lines.append(f"{prefix}_{name}_total {value}")
+        for name, run in snapshot['runs'].items():
+            lines.append(f'{prefix}_run_seconds_total{{run="{name}"}} {run["seconds"]}')
+            lines.append(f'{prefix}_run_calls_total{{run="{name}"}} {run["calls"]}')
+        return '\n'.join(lines) + '\n'
+
+
+# Process-wide metrics shared by the extractors, loaders and API apps
+metrics = IngestMetrics()
+
+# INGEST_PROFILE_OUTPUT=<path> profiles the first ingest run of the process
+if os.environ.get('INGEST_PROFILE_OUTPUT'):
+    metrics.profile_next_run(os.environ['INGEST_PROFILE_OUTPUT'])
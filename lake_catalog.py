@@ -0,0 +1,154 @@
+import os
+import re
+import threading
+
+import PyPDF2
+import pandas as pd
+
+from returns_validation import parse_return_dates
+
+# "AdventureWorks Returns Data - Jun 2011" and "AdventureWorks_Returns_Data_-_Jun_2011"
+MONTHS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+MONTH_NAMES = r'jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sept?(?:ember)?' \
+              r'|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?'
+PERIOD_PATTERN = re.compile(r'(?<![a-z])(' + MONTH_NAMES + r')[\s_\-]+((?:19|20)\d{2})(?!\d)', re.IGNORECASE)
+MONTH_PATTERN = re.compile(r'^\d{4}-(0[1-9]|1[0-2])$')
+
+# Data rows read when the period has to be taken from the file contents
+PEEK_ROWS = 20
+
+# Where a file's period came from
+ORIGIN_NAME = 'name'
+ORIGIN_ROWS = 'rows'
+ORIGIN_UNKNOWN = 'unknown'
+
+
+# Period 'YYYY-MM' from a lake file name, or None if the name has no single period
+def period_from_name(file_name):
+    stem = os.path.splitext(os.path.basename(file_name))[0]
+    periods = {f"{year}-{MONTHS.index(month.lower()[:3]) + 1:02d}"
+               for month, year in PERIOD_PATTERN.findall(stem)}
+    return periods.pop() if len(periods) == 1 else None
+
+
+def _peek_csv(path, n_rows):
+    df = pd.read_csv(path, nrows=n_rows, dtype='object', keep_default_na=False)
+    return df['ReturnDate'].tolist() if 'ReturnDate' in df.columns else []
+
+
+def _peek_txt(path, n_rows):
+    values = []
+    with open(path, 'r', encoding='utf-8') as file:
+        file.readline()  # Skip header
+        for line in file:
+            parts = line.split()
+            if parts:
+                values.append(parts[0])
+            if len(values) >= n_rows:
+                break
+    return values
+
+
+def _peek_pdf(path, n_rows):
+    with open(path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        if not reader.pages:
+            return []
+        lines = reader.pages[0].extract_text().split('\n')
+    values = [line.split()[0] for line in lines if line.strip() and not line.lstrip().startswith('ReturnDate')]
+    return values[:n_rows]
+
+
+PEEKERS = {'.csv': _peek_csv, '.txt': _peek_txt, '.pdf': _peek_pdf}
+
+
+# Period 'YYYY-MM' shared by the first rows of a file, or None if they span months or cannot be read
+def period_from_rows(path, n_rows=PEEK_ROWS):
+    peek = PEEKERS.get(os.path.splitext(path)[1].lower())
+    if peek is None:
+        return None
+    try:
+        values = pd.Series(peek(path, n_rows), dtype='object')
+    except Exception as e:
+        print(f"Error reading first rows of {path}: {e}")
+        return None
+    dates = parse_return_dates(values, None).dropna()
+    months = set(dates.dt.strftime('%Y-%m'))
+    return months.pop() if len(months) == 1 else None
+
+
+# Validate an optional 'YYYY-MM' bound
+def parse_month(value):
+    if value is None or value == '':
+        return None
+    if not MONTH_PATTERN.match(value):
+        raise ValueError(f"Invalid month '{value}', expected YYYY-MM")
+    return value
+
+
+class LakeCatalog:
+    """
+    Period of each lake file, parsed from its name or, when the name is
+    ambiguous, from its first rows. Entries are cached by file signature,
+    so a file is only looked at again after it changes.
+    """
+
+    def __init__(self, peek_rows=PEEK_ROWS):
+        self.peek_rows = peek_rows
+        self._lock = threading.Lock()
+        self._entries = {}  # path -> (signature, period, origin)
+
+    def period(self, path, signature):
+        """
+        Get the period of a lake file.
+        Args:
+            path (str): Lake file
+            signature (tuple): (size, mtime_ns) of the file
+        Returns:
+            'YYYY-MM', or None if the period is unknown
+        """
+        with self._lock:
+            cached = self._entries.get(path)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        period, origin = period_from_name(path), ORIGIN_NAME
+        if period is None:
+            period, origin = period_from_rows(path, self.peek_rows), ORIGIN_ROWS
+        if period is None:
+            origin = ORIGIN_UNKNOWN
+        with self._lock:
+            self._entries[path] = (signature, period, origin)
+        return period
+
+    def matches(self, path, signature, start=None, end=None):
+        """Whether a file may hold rows in [start, end]; files of unknown period always match."""
+        if start is None and end is None:
+            return True
+        period = self.period(path, signature)
+        if period is None:
+            return True
+        return (start is None or period >= start) and (end is None or period <= end)
+
+    def retain(self, paths):
+        """Drop the entries of files that are no longer in the lake."""
+        with self._lock:
+            for path in list(self._entries):
+                if path not in paths:
+                    del self._entries[path]
+
+    def export(self):
+        """Entries as JSON-serializable lists, for lake snapshots."""
+        with self._lock:
+            return [[path, list(signature), period, origin]
+                    for path, (signature, period, origin) in self._entries.items()]
+
+    def restore(self, exported):
+        with self._lock:
+            for path, signature, period, origin in exported:
+                self._entries.setdefault(path, (tuple(signature), period, origin))
+
+    def entries(self):
+        with self._lock:
+            return [{'file': os.path.basename(path), 'path': path, 'period': period, 'origin': origin}
+                    for path, (_, period, origin) in sorted(self._entries.items())]
@@ -0,0 +1,363 @@
+import os
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, threads still serialize
+    fcntl = None
+
+# Uploads are written to hidden temp files next to their final path and
+# renamed into place; lock files live in a hidden directory per lake folder.
+# Scanners skip every dot-prefixed name, so neither is ever read as data.
+TEMP_SUFFIX = '.uploading'
+LOCK_DIR = '.locks'
+
+# Reads of one file retried when an upload replaces it mid-read
+CONSISTENT_READ_ATTEMPTS = 3
+
+# Directory listing cache (see LakeScanner): the whole tree is re-verified at
+# this interval and a folder changed within RACY_SECONDS of being read is not
+# trusted yet. Every file is stat'ed on each scan unless RECENT_SECONDS is set,
+# which opts in to trusting the cached signatures of files older than that.
+RECENT_SECONDS = (float(os.environ['LAKE_SCAN_RECENT_SECONDS'])
+                  if os.environ.get('LAKE_SCAN_RECENT_SECONDS') else None)
+VERIFY_INTERVAL = float(os.environ.get('LAKE_SCAN_VERIFY_INTERVAL', 300))
+RACY_SECONDS = 2.0
+
+
+class FileChangedError(Exception):
+    """A lake file was replaced while it was being read."""
+
+
+# Signature of a lake file; changes whenever the file is rewritten
+def file_signature(path):
+    stat = os.stat(path)
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+# Published lake files only: no hidden temp, lock or editor files
+def is_lake_file(file_name, file_type):
+    return not file_name.startswith('.') and file_name.endswith(file_type)
+
+
+class _Folder:
+    # Cached entries of one scanned folder
+    __slots__ = ('mtime', 'trusted', 'subfolders', 'files', 'recent', 'paths', 'listings')
+
+    def __init__(self, path, mtime, trusted, subfolders, files, recent_since_ns):
+        self.mtime = mtime
+        self.trusted = trusted
+        self.subfolders = subfolders
+        self.files = files  # name -> signature
+        # Files stat'ed again while the folder itself is unchanged; all of them without a recent cutoff
+        self.recent = [name for name, signature in files.items()
+                       if recent_since_ns is None or signature[1] >= recent_since_ns]
+        self.update_paths(path)
+
+    def update_paths(self, path):
+        self.paths = {os.path.join(path, name): signature for name, signature in self.files.items()}
+        self.listings = {}  # file type -> sorted [(path, signature)] of its lake files
+
+    def listing(self, file_type):
+        listing = self.listings.get(file_type)
+        if listing is None:
+            listing = self.listings[file_type] = sorted(
+                (path, self.files[name]) for name, path in
+                ((os.path.basename(path), path) for path in self.paths) if is_lake_file(name, file_type))
+        return listing
+
+
+class LakeScanner:
+    """
+    Recursive lake listing that reuses cached directory entries. A folder
+    is read again with scandir only when its own mtime changed, which
+    happens whenever a file is added, removed or renamed in it, e.g. by
+    publish_file. The files of an unchanged folder are still stat'ed on
+    every scan, because in-place writes (SFTP, copies, overwrites) change
+    the file but not its folder. Setting recent_seconds opts in to
+    trusting the cached signature of files older than that, trading
+    freshness for fewer stats; every verify_interval seconds the whole
+    tree is read once more as a backstop. With sharded folders (see
+    lake_layout.py) an upload only invalidates its own shard.
+    Args:
+        recent_seconds (float): Age below which a file's signature is refreshed; None refreshes every file
+        verify_interval (float): Seconds between full scans; 0 disables the cache
+    """
+
+    def __init__(self, recent_seconds=RECENT_SECONDS, verify_interval=VERIFY_INTERVAL):
+        self.recent_seconds = recent_seconds
+        self.verify_interval = verify_interval
+        self._lock = threading.Lock()
+        self._dirs = {}  # folder -> _Folder
+        self._verified = {}  # root -> time of its last full scan
+        self._trees = {}  # root -> [_Folder] in scan order, as of the last change
+        self._listings = {}  # (root, file type) -> listing as of the last change
+        self._names = {}  # root -> {file name: path}, built on demand
+        self.stats = {'folders_read': 0, 'folders_cached': 0, 'files_stated': 0}
+
+    def invalidate(self, directory):
+        """Forget the cached entries of a folder, e.g. right after writing into it."""
+        with self._lock:
+            self._dirs.pop(os.path.abspath(directory), None)
+
+    # Re-stat the files of an unchanged folder (only the recent ones with a cutoff); returns whether any changed
+    def _refresh_recent(self, path, folder, recent_since_ns):
+        changed = False
+        still_recent = []
+        for name in folder.recent:
+            try:
+                current = file_signature(os.path.join(path, name))
+            except FileNotFoundError:
+                folder.files.pop(name, None)
+                changed = True
+                continue
+            self.stats['files_stated'] += 1
+            if current != folder.files.get(name):
+                folder.files[name] = current
+                changed = True
+            if recent_since_ns is None or current[1] >= recent_since_ns:
+                still_recent.append(name)
+        folder.recent = still_recent
+        if changed:
+            folder.update_paths(path)
+        return changed
+
+    # Cached entries of one folder, read again if it changed; returns (_Folder or None if gone, changed)
+    def _folder(self, path, now, full):
+        recent_since_ns = int((now - self.recent_seconds) * 1e9) if self.recent_seconds is not None else None
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except (FileNotFoundError, NotADirectoryError):
+            return None, self._dirs.pop(path, None) is not None
+        cached = self._dirs.get(path)
+        if cached is not None and cached.mtime == mtime and cached.trusted and not full:
+            self.stats['folders_cached'] += 1
+            return cached, bool(cached.recent) and self._refresh_recent(path, cached, recent_since_ns)
+
+        subfolders, files = [], {}
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.name.startswith('.'):
+                    continue  # Temp uploads, lock folders, editor files
+                try:
+                    if entry.is_dir():
+                        subfolders.append(entry.name)
+                    elif entry.is_file():
+                        stat = entry.stat()
+                        files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+                        self.stats['files_stated'] += 1
+                except FileNotFoundError:
+                    continue
+        # A change within the same mtime tick as this read would go unnoticed;
+        # a folder modified that recently is read again on the next scan
+        trusted = now - mtime / 1e9 > RACY_SECONDS
+        folder = self._dirs[path] = _Folder(path, mtime, trusted, sorted(subfolders), files, recent_since_ns)
+        self.stats['folders_read'] += 1
+        return folder, True
+
+    def _scan(self, root):
+        # Called with the lock held; returns the folders under root in scan order
+        now = time.time()
+        full = self.verify_interval <= 0 or now - self._verified.get(root, 0) >= self.verify_interval
+        visited, changed = [], root not in self._trees
+        pending = [root]
+        while pending:
+            path = pending.pop()
+            folder, folder_changed = self._folder(path, now, full)
+            changed = changed or folder_changed
+            if folder is None:
+                continue
+            visited.append((path, folder))
+            pending.extend(os.path.join(path, sub) for sub in reversed(folder.subfolders))
+        if full:
+            self._verified[root] = now
+        if changed:
+            seen = {path for path, _ in visited}
+            prefix = root + os.sep
+            for path in [path for path in self._dirs if path.startswith(prefix) and path not in seen]:
+                del self._dirs[path]
+            self._trees[root] = [folder for _, folder in visited]
+            self._names.pop(root, None)
+            for key in [key for key in self._listings if key[0] == root]:
+                del self._listings[key]
+        return self._trees[root]
+
+    def list(self, directory, file_type):
+        """
+        List the published files under a lake folder and its subfolders.
+        Args:
+            directory (str): Lake folder, e.g. data_lake/csv
+            file_type (str): Extension of the files to list, e.g. '.csv'
+        Returns:
+            List of (path, (size, mtime_ns)) folder by folder, with paths under directory as given
+        """
+        root = os.path.abspath(directory)
+        if not os.path.isdir(root):
+            return []
+        with self._lock:
+            folders = self._scan(root)
+            listing = self._listings.get((root, file_type))
+            if listing is None:
+                listing = self._listings[(root, file_type)] = [
+                    entry for folder in folders for entry in folder.listing(file_type)]
+        # Paths under the directory as it was given, like os.path.join would build them
+        base = directory.rstrip('/\\') or directory
+        if base == root:
+            return list(listing)
+        return [(base + path[len(root):], signature) for path, signature in listing]
+
+    def find(self, directory, file_name):
+        """Path of a file with this name anywhere under a lake folder, or None."""
+        root = os.path.abspath(directory)
+        if not os.path.isdir(root):
+            return None
+        with self._lock:
+            folders = self._scan(root)
+            names = self._names.get(root)
+            if names is None:
+                names = self._names[root] = {}
+                for folder in folders:
+                    names.update((os.path.basename(path), path) for path in folder.paths)
+            path = names.get(file_name)
+        return (directory.rstrip('/\\') or directory) + path[len(root):] if path is not None else None
+
+
+# Scanner shared by every reader of this process
+lake_scanner = LakeScanner()
+
+
+def list_lake_files(directory, file_type, scanner=None):
+    """
+    List the published files of one lake folder, including files sharded
+    into subfolders, with their signatures.
+    Args:
+        directory (str): Lake folder, e.g. data_lake/csv
+        file_type (str): Extension of the files to list, e.g. '.csv'
+        scanner (LakeScanner): Scanner whose cached entries to use (default lake_scanner)
+    Returns:
+        List of (path, (size, mtime_ns)) sorted by path; files removed while listing are left out
+    """
+    return (scanner or lake_scanner).list(directory, file_type)
+
+
+class PathLocks:
+    """
+    Exclusive locks per lake path: threads of one process serialize on a
+    lock per path, processes on flock() of a lock file in the folder's
+    .locks directory. Different paths never wait on each other.
+    """
+
+    def __init__(self):
+        self._thread_locks = {}
+        self._guard = threading.Lock()
+
+    @contextmanager
+    def hold(self, path):
+        path = os.path.abspath(path)
+        with self._guard:
+            thread_lock = self._thread_locks.setdefault(path, threading.Lock())
+        with thread_lock:
+            if fcntl is None:
+                yield
+                return
+            lock_dir = os.path.join(os.path.dirname(path), LOCK_DIR)
+            os.makedirs(lock_dir, exist_ok=True)
+            with open(os.path.join(lock_dir, os.path.basename(path) + '.lock'), 'a+') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+# Locks shared by every writer of this process
+path_locks = PathLocks()
+
+
+def _fsync_directory(directory):
+    # Persist the rename itself; not supported on every platform
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def publish_file(path, write_func, locks=path_locks):
+    """
+    Write a lake file atomically: readers see the previous file or the
+    complete new one, never a partial write. The data is written to a
+    hidden temp file in the same folder, flushed to disk and renamed over
+    the final path while holding the path's lock, so concurrent writers
+    of the same name replace the file one at a time.
+    Args:
+        path (str): Final lake path
+        write_func (callable): Writes the content to the temp path it is given,
+            e.g. a werkzeug FileStorage's save
+        locks (PathLocks): Per-path locks of the writers
+    Returns:
+        The final path
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f".{name}.{uuid.uuid4().hex[:12]}{TEMP_SUFFIX}")
+    with locks.hold(path):
+        try:
+            write_func(tmp_path)
+            with open(tmp_path, 'rb') as file:
+                os.fsync(file.fileno())
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    _fsync_directory(directory)
+    lake_scanner.invalidate(directory)
+    return path
+
+
+def extract_consistent(path, signature, extract_func, shared_cache=None, attempts=CONSISTENT_READ_ATTEMPTS):
+    """
+    Extract a lake file so that the result belongs to the signature it is
+    returned with. Uploads replace files by rename, so a reader always sees
+    one whole version; if the version changed between the scan and the end
+    of the read, the new version is read instead of caching the new content
+    under the old signature. No locks are taken, so reads never wait on uploads.
+    Args:
+        path (str): Lake file
+        signature (tuple): (size, mtime_ns) seen by the scan
+        extract_func (callable): Extracts the file
+        shared_cache (SharedFileCache): Optional cross-process cache of per-file results
+        attempts (int): Reads before giving up on a file that keeps changing
+    Returns:
+        (signature, extracted data) tuple
+    """
+    for _ in range(attempts - 1):
+        def checked(file_path, expected=signature):
+            data = extract_func(file_path)
+            try:
+                if file_signature(file_path) != expected:
+                    raise FileChangedError(file_path)
+            except FileNotFoundError:
+                pass  # Removed after the read; the next scan drops it
+            return data
+
+        try:
+            if shared_cache is not None:
+                return signature, shared_cache.get_or_extract(path, signature, checked)
+            return signature, checked(path)
+        except FileChangedError:
+            print(f"{path} was replaced while it was read; reading the new version")
+            try:
+                signature = file_signature(path)
+            except FileNotFoundError:
+                break
+    # Still changing: keep this read under the signature seen before it, so the next refresh reads it again
+    return signature, extract_func(path)
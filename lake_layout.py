@@ -0,0 +1,58 @@
+import os
+import time
+import hashlib
+
+from lake_files import lake_scanner
+
+# How uploads are placed inside a lake folder:
+#   flat - data_lake/csv/<name> (the original layout)
+#   hash - data_lake/csv/<2 hex digits of sha1(name)>/<name>, 256 shards
+#   date - data_lake/csv/<YYYY>/<MM>/<DD>/<name>, by upload day
+LAYOUTS = ('flat', 'hash', 'date')
+DEFAULT_LAYOUT = os.environ.get('LAKE_LAYOUT', 'flat')
+
+# Hex digits of the name hash used as the shard folder; 2 gives 256 shards
+HASH_DIGITS = 2
+
+
+class LakeLayout:
+    """
+    Place lake files into shard subfolders so no single folder grows to
+    tens of thousands of entries. Readers list the lake recursively (see
+    lake_files.LakeScanner), so every layout can be read at any time and
+    switching layouts needs no migration. A file that already exists
+    anywhere in the folder keeps its path, so re-uploading a name always
+    replaces the earlier file instead of adding a second copy.
+    Args:
+        scheme (str): One of LAYOUTS
+        scanner (LakeScanner): Scanner used to find existing files
+    """
+
+    def __init__(self, scheme=DEFAULT_LAYOUT, scanner=lake_scanner):
+        if scheme not in LAYOUTS:
+            raise ValueError(f"Unknown lake layout '{scheme}'; expected one of {', '.join(LAYOUTS)}")
+        self.scheme = scheme
+        self.scanner = scanner
+
+    def shard(self, file_name, now=None):
+        """Subfolder of a new file under its lake folder ('' for the flat layout)."""
+        if self.scheme == 'hash':
+            return hashlib.sha1(file_name.encode('utf-8')).hexdigest()[:HASH_DIGITS]
+        if self.scheme == 'date':
+            return os.path.join(*time.strftime('%Y/%m/%d', time.localtime(now)).split('/'))
+        return ''
+
+    def path_for(self, directory, file_name, now=None):
+        """
+        Path an uploaded file is published to.
+        Args:
+            directory (str): Lake folder of the file type, e.g. data_lake/csv
+            file_name (str): Sanitized file name
+            now (float): Upload time for the date layout (default: now)
+        Returns:
+            The existing path of that name, or a new path in the layout's shard
+        """
+        existing = self.scanner.find(directory, file_name)
+        if existing is not None:
+            return existing
+        return os.path.join(directory, self.shard(file_name, now), file_name)
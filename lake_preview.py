@@ -0,0 +1,178 @@
+import io
+import os
+import time
+
+import PyPDF2
+import pandas as pd
+
+from lake_files import list_lake_files
+from returns_validation import RAW_COLUMNS, parse_return_dates, split_return_lines
+
+DEFAULT_PREVIEW_ROWS = 20
+MAX_PREVIEW_ROWS = 1000
+
+# Bytes read from the end of CSV/TXT files for the last dates
+TAIL_BYTES = 64 * 1024
+
+# CSV header names of the raw return columns
+CSV_COLUMNS = ['ReturnDate', 'TerritoryKey', 'ProductKey', 'ReturnQuantity']
+
+
+# Header line and up to n_rows data lines, with the bytes they span
+def _head_lines(path, n_rows):
+    lines = []
+    consumed = 0
+    with open(path, 'rb') as file:
+        header = file.readline()
+        for line in file:
+            if not line.strip():
+                continue
+            lines.append(line)
+            consumed += len(line)
+            if len(lines) >= n_rows:
+                break
+        at_end = not file.read(1)
+    return header, lines, len(header), consumed, at_end
+
+
+# Last complete data lines of a file, from its final TAIL_BYTES
+def _tail_lines(path, header_bytes, n_rows):
+    size = os.path.getsize(path)
+    start = max(header_bytes, size - TAIL_BYTES)
+    with open(path, 'rb') as file:
+        file.seek(start)
+        data = file.read()
+    lines = data.split(b'\n')
+    if start > header_bytes:
+        lines = lines[1:]  # Likely a partial line
+    return [line.decode('utf-8', errors='replace') for line in lines if line.strip()][-n_rows:]
+
+
+# Rows of the whole file, exact if it was read to the end, else from the bytes per sampled row
+def _estimate_rows(size, header_bytes, sample_bytes, sample_rows, at_end):
+    if at_end or not sample_rows:
+        return sample_rows, 'exact'
+    return int(round((size - header_bytes) / (sample_bytes / sample_rows))), 'bytes'
+
+
+def _preview_csv(path, n_rows):
+    header, lines, header_bytes, sample_bytes, at_end = _head_lines(path, n_rows)
+    head = pd.read_csv(io.BytesIO(header + b''.join(lines)), dtype='object', keep_default_na=False)
+    columns = [str(column) for column in head.columns]
+    if set(CSV_COLUMNS).issubset(columns):
+        raw = head[CSV_COLUMNS].copy()
+        raw.columns = RAW_COLUMNS
+    else:
+        raw = pd.DataFrame(columns=RAW_COLUMNS)
+    tail_dates = []
+    if not at_end and 'ReturnDate' in columns:
+        tail_text = header.decode('utf-8', errors='replace') + '\n'.join(_tail_lines(path, header_bytes, n_rows))
+        tail = pd.read_csv(io.StringIO(tail_text), dtype='object', keep_default_na=False, on_bad_lines='skip')
+        tail_dates = tail['ReturnDate'].tolist() if 'ReturnDate' in tail.columns else []
+    rows, basis = _estimate_rows(os.path.getsize(path), header_bytes, sample_bytes, len(lines), at_end)
+    return {'columns': columns, 'raw': raw, 'tail_dates': tail_dates, 'estimated_rows': rows,
+            'estimate_basis': basis}
+
+
+def _preview_txt(path, n_rows):
+    header, lines, header_bytes, sample_bytes, at_end = _head_lines(path, n_rows)
+    raw = split_return_lines([line.decode('utf-8', errors='replace') for line in lines])
+    tail_dates = []
+    if not at_end:
+        tail_dates = split_return_lines(_tail_lines(path, header_bytes, n_rows))['return_date'].tolist()
+    rows, basis = _estimate_rows(os.path.getsize(path), header_bytes, sample_bytes, len(lines), at_end)
+    return {'columns': header.decode('utf-8', errors='replace').split(), 'raw': raw, 'tail_dates': tail_dates,
+            'estimated_rows': rows, 'estimate_basis': basis}
+
+
+# Header columns and data lines of one PDF page; each page repeats the header
+def _pdf_page_lines(page):
+    columns, data = [], []
+    for line in page.extract_text().split('\n'):
+        if not line.strip():
+            continue
+        if line.lstrip().startswith('ReturnDate'):
+            columns = columns or line.split()
+        else:
+            data.append(line)
+    return columns, data
+
+
+def _preview_pdf(path, n_rows):
+    with open(path, 'rb') as file:
+        reader = PyPDF2.PdfReader(file)
+        pages = len(reader.pages)
+        if not pages:
+            return {'columns': [], 'raw': pd.DataFrame(columns=RAW_COLUMNS), 'tail_dates': [],
+                    'estimated_rows': 0, 'estimate_basis': 'exact', 'pages': 0}
+        # Only the first page (and the last, for the date range) is extracted
+        columns, first = _pdf_page_lines(reader.pages[0])
+        tail_dates = []
+        if pages > 1:
+            _, last = _pdf_page_lines(reader.pages[pages - 1])
+            tail_dates = split_return_lines(last[-n_rows:])['return_date'].tolist()
+    raw = split_return_lines(first[:n_rows])
+    if pages == 1:
+        rows, basis = len(first), 'exact'
+    else:
+        rows, basis = len(first) * pages, 'pages'
+    return {'columns': columns, 'raw': raw, 'tail_dates': tail_dates, 'estimated_rows': rows,
+            'estimate_basis': basis, 'pages': pages}
+
+
+PREVIEWERS = {'.csv': _preview_csv, '.txt': _preview_txt, '.pdf': _preview_pdf}
+
+
+def preview_file(path, n_rows=DEFAULT_PREVIEW_ROWS):
+    """
+    Preview a lake file from its first records only: the CSV head is parsed
+    like nrows, TXT files are read for a bounded number of lines and PDFs
+    stop after the first page. The date range also looks at the last lines
+    (or last page), so the cost does not grow with the file size.
+    Args:
+        path (str): Lake file
+        n_rows (int): Records to read from the head
+    Returns:
+        Dict with columns, sample records, date range, estimated row count and timing
+    """
+    start = time.perf_counter()
+    extension = os.path.splitext(path)[1].lower()
+    result = {'file': os.path.basename(path), 'path': path, 'format': extension.lstrip('.'),
+              'size_bytes': os.path.getsize(path)}
+    try:
+        preview = PREVIEWERS[extension](path, n_rows)
+    except Exception as e:
+        result.update(error=str(e), elapsed_ms=round((time.perf_counter() - start) * 1000, 2))
+        return result
+
+    raw = preview.pop('raw').head(n_rows)
+    dates = parse_return_dates(pd.Series(raw['return_date'].tolist() + preview.pop('tail_dates'),
+                                         dtype='object'), None).dropna()
+    result.update(preview)
+    result.update({
+        'sample': raw.to_dict('records'),
+        'sample_rows': len(raw),
+        'date_min': dates.min().strftime('%Y-%m-%d') if len(dates) else None,
+        'date_max': dates.max().strftime('%Y-%m-%d') if len(dates) else None,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 2),
+    })
+    return result
+
+
+def preview_lake(sources, n_rows=DEFAULT_PREVIEW_ROWS, name=None):
+    """
+    Preview every lake file (or those whose name contains name).
+    Args:
+        sources (iterable): (directory, extension, ...) of the lake folders
+        n_rows (int): Records per file, capped at MAX_PREVIEW_ROWS
+        name (str): Case-insensitive file name filter
+    Returns:
+        List of preview_file results, by path
+    """
+    n_rows = max(1, min(int(n_rows), MAX_PREVIEW_ROWS))
+    paths = []
+    for directory, file_type, *_ in sources:
+        for path, _ in list_lake_files(directory, file_type):
+            if name is None or name.lower() in os.path.basename(path).lower():
+                paths.append(path)
+    return [preview_file(path, n_rows) for path in sorted(paths)]
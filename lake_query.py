@@ -0,0 +1,167 @@
+import re
+import time
+import sqlite3
+import threading
+
+import pandas as pd
+
+# Defaults for /api/query: wall-clock budget per query, and rows returned
+DEFAULT_TIME_LIMIT = 5.0
+DEFAULT_ROW_LIMIT = 10_000
+MAX_SQL_LENGTH = 10_000
+
+# SQLite VM instructions between deadline checks
+PROGRESS_STEPS = 10_000
+
+# Authorizer actions a read-only query may use; everything else (writes,
+# PRAGMA, ATTACH, temp objects, ...) is denied while a client query runs
+_ALLOWED_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION}
+if hasattr(sqlite3, 'SQLITE_RECURSIVE'):
+    _ALLOWED_ACTIONS.add(sqlite3.SQLITE_RECURSIVE)
+
+
+class QueryError(ValueError):
+    """A client query was rejected or failed."""
+
+
+class QueryTimeout(QueryError):
+    """A client query ran past its time limit."""
+
+
+# Frame as stored in SQLite: dates as ISO text so strftime() and comparisons work
+def _sqlite_frame(frame):
+    out = frame.copy()
+    for name in out.columns:
+        column = out[name]
+        if pd.api.types.is_datetime64_any_dtype(column):
+            date_only = bool((column.dropna() == column.dropna().dt.normalize()).all())
+            text = column.dt.strftime('%Y-%m-%d' if date_only else '%Y-%m-%d %H:%M:%S')
+            out[name] = text.astype('object').where(column.notna(), None)
+    return out
+
+
+# Result row as JSON-ready values; blobs (x'00', randomblob()) are returned as hex text
+def _json_row(row):
+    return [value.hex() if isinstance(value, bytes) else value for value in row]
+
+
+class QueryEngine:
+    """
+    Read-only SQL over the cached lake frames in an in-memory SQLite database.
+    Each table is copied in again only when its source reports a new version,
+    so queries run against the already extracted data and never reparse files
+    or touch the warehouse. Client queries are limited to a single SELECT,
+    a time budget and a row cap.
+    Args:
+        sources (dict): Table name -> callable returning (version, DataFrame),
+            or None when the table is unavailable
+        time_limit (float): Default seconds per query
+        row_limit (int): Default and maximum rows returned per query
+    """
+
+    def __init__(self, sources, time_limit=DEFAULT_TIME_LIMIT, row_limit=DEFAULT_ROW_LIMIT):
+        self.sources = sources
+        self.time_limit = time_limit
+        self.row_limit = row_limit
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(':memory:', check_same_thread=False)
+        self._versions = {}  # table -> version loaded into SQLite
+        self._rows = {}
+
+    def _sync(self, names=None):
+        # Called with the lock held; copies in new versions of the given tables (all by default)
+        for name, source in self.sources.items():
+            if names is not None and name not in names:
+                continue
+            snapshot = source()
+            if snapshot is None:
+                if name in self._versions:
+                    self._conn.execute(f'DROP TABLE IF EXISTS "{name}"')
+                    del self._versions[name], self._rows[name]
+                continue
+            version, frame = snapshot
+            if self._versions.get(name) == version:
+                continue
+            _sqlite_frame(frame).to_sql(name, self._conn, if_exists='replace', index=False, chunksize=50_000)
+            self._versions[name] = version
+            self._rows[name] = len(frame)
+
+    def tables(self):
+        """Registered tables with their columns, row counts and versions."""
+        with self._lock:
+            self._sync()
+            out = []
+            for name in self._versions:
+                columns = [{'name': row[1], 'type': row[2]}
+                           for row in self._conn.execute(f'PRAGMA table_info("{name}")')]
+                out.append({'name': name, 'rows': self._rows[name], 'version': self._versions[name],
+                            'columns': columns})
+            return out
+
+    @staticmethod
+    def _authorize(action, *args):
+        return sqlite3.SQLITE_OK if action in _ALLOWED_ACTIONS else sqlite3.SQLITE_DENY
+
+    def query(self, sql, limit=None, time_limit=None):
+        """
+        Run one read-only SELECT against the lake tables.
+        Args:
+            sql (str): A single SELECT (or WITH ... SELECT) statement
+            limit (int): Rows to return, capped at row_limit
+            time_limit (float): Seconds before the query is interrupted, capped at the engine's limit
+        Returns:
+            Dict with columns, rows (blobs as hex text), row_count, truncated, elapsed_ms and table versions
+        Raises:
+            QueryError: Empty, too long, not read-only or invalid SQL
+            QueryTimeout: The query ran past its time limit
+        """
+        sql = (sql or '').strip()
+        if not sql:
+            raise QueryError("Missing SQL query")
+        if len(sql) > MAX_SQL_LENGTH:
+            raise QueryError(f"Query is longer than {MAX_SQL_LENGTH} characters")
+        limit = self.row_limit if limit is None else max(0, min(int(limit), self.row_limit))
+        time_limit = self.time_limit if time_limit is None else max(0.0, min(float(time_limit), self.time_limit))
+
+        # Only tables the query mentions are brought up to date
+        referenced = {name for name in self.sources
+                      if re.search(r'\b' + re.escape(name) + r'\b', sql, re.IGNORECASE)}
+        with self._lock:
+            self._sync(referenced)
+            deadline = time.monotonic() + time_limit
+            timed_out = []
+
+            def check_deadline():
+                if time.monotonic() > deadline:
+                    timed_out.append(True)
+                    return 1  # Non-zero interrupts the statement
+                return 0
+
+            start = time.perf_counter()
+            self._conn.set_authorizer(self._authorize)
+            self._conn.set_progress_handler(check_deadline, PROGRESS_STEPS)
+            try:
+                cursor = self._conn.execute(sql)
+                if cursor.description is None:
+                    raise QueryError("Only SELECT queries are allowed")
+                columns = [column[0] for column in cursor.description]
+                rows = cursor.fetchmany(limit + 1)
+                cursor.close()
+            except sqlite3.Error as e:
+                if timed_out:
+                    raise QueryTimeout(f"Query exceeded the {time_limit:g}s time limit") from e
+                raise QueryError(f"Query failed: {e}") from e
+            finally:
+                self._conn.set_progress_handler(None, 0)
+                self._conn.set_authorizer(None)
+            elapsed = time.perf_counter() - start
+            versions = dict(self._versions)
+
+        return {
+            'columns': columns,
+            'rows': [_json_row(row) for row in rows[:limit]],
+            'row_count': min(len(rows), limit),
+            'truncated': len(rows) > limit,
+            'elapsed_ms': round(elapsed * 1000, 2),
+            'versions': versions,
+        }
@@ -0,0 +1,148 @@
+import os
+import json
+import mmap
+import struct
+import threading
+
+import numpy as np
+import pandas as pd
+
+# File layout: MAGIC, uint32 format version, uint64 header length, JSON header,
+# then the column buffers, each aligned to ALIGNMENT bytes
+MAGIC = b'LAKESNAP'
+SNAPSHOT_FORMAT = 1
+ALIGNMENT = 64
+_PREFIX = struct.Struct('<8sIQ')
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+# Split a column into mmap-able arrays: numbers and datetimes as-is, anything
+# else as int32 codes into a fixed-width unicode array of distinct values
+def _encode_column(column):
+    if isinstance(column.dtype, np.dtype) and column.dtype.kind == 'M':
+        # Stored as int64 ticks; the header keeps the unit (ns, us, ...)
+        return f"datetime:{column.dtype.str}", [column.to_numpy().view('int64')]
+    if isinstance(column.dtype, np.dtype) and (pd.api.types.is_bool_dtype(column) or
+                                               pd.api.types.is_numeric_dtype(column)):
+        return 'numeric', [column.to_numpy()]
+    codes, uniques = pd.factorize(column)
+    values = np.asarray([str(value) for value in uniques], dtype='U') if len(uniques) else np.zeros(0, dtype='U1')
+    # The header keeps the pandas dtype (object, str, category, ...) to restore
+    return f"dictionary:{column.dtype}", [codes.astype('int32'), values]
+
+
+def _decode_column(encoding, arrays):
+    if encoding.startswith('datetime:'):
+        return pd.Series(arrays[0].view(np.dtype(encoding.split(':', 1)[1])), copy=False)
+    if encoding == 'numeric':
+        return pd.Series(arrays[0], copy=False)
+    codes, values = arrays
+    # Code -1 (missing) picks the trailing None
+    lookup = np.append(values.astype('object'), None)
+    series = pd.Series(lookup[codes], dtype='object')
+    dtype = encoding.split(':', 1)[1]
+    return series if dtype == 'object' else series.astype(dtype)
+
+
+def write_snapshot(path, kind, tables, manifest, meta=None):
+    """
+    Write DataFrames to a versioned binary snapshot file, atomically.
+    Args:
+        path (str): Snapshot file
+        kind (str): What the snapshot holds, e.g. 'returns'; checked on load
+        tables (dict): name -> DataFrame
+        manifest (dict): path -> (size, mtime_ns) of the lake files the tables were built from
+        meta (dict): Other JSON-serializable state to restore
+    Returns:
+        Size of the snapshot in bytes
+    """
+    header = {'format': SNAPSHOT_FORMAT, 'kind': kind, 'created_at': pd.Timestamp.now().isoformat(),
+              'manifest': {file_path: list(signature) for file_path, signature in manifest.items()},
+              'meta': meta or {}, 'tables': {}}
+    buffers = []
+    offset = 0
+    for name, frame in tables.items():
+        columns = []
+        for column_name in frame.columns:
+            encoding, arrays = _encode_column(frame[column_name])
+            specs = []
+            for array in arrays:
+                array = np.ascontiguousarray(array)
+                offset = _align(offset)
+                specs.append({'dtype': array.dtype.str, 'count': int(array.size), 'offset': offset})
+                buffers.append((offset, array))
+                offset += array.nbytes
+            columns.append({'name': str(column_name), 'encoding': encoding, 'arrays': specs})
+        header['tables'][name] = {'rows': len(frame), 'columns': columns}
+
+    header_bytes = json.dumps(header).encode('utf-8')
+    data_start = _align(_PREFIX.size + len(header_bytes))
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(tmp_path, 'wb') as file:
+        file.write(_PREFIX.pack(MAGIC, SNAPSHOT_FORMAT, len(header_bytes)))
+        file.write(header_bytes)
+        for buffer_offset, array in buffers:
+            file.seek(data_start + buffer_offset)
+            file.write(array.tobytes())
+        size = file.tell()
+    os.replace(tmp_path, path)
+    return size
+
+
+class Snapshot:
+    """Tables, lake manifest and metadata restored from a snapshot file."""
+
+    def __init__(self, tables, manifest, meta, created_at):
+        self.tables = tables
+        self.manifest = manifest
+        self.meta = meta
+        self.created_at = created_at
+
+    def matches(self, signatures):
+        """Whether the snapshot was built from exactly these {path: (size, mtime_ns)} files."""
+        return self.manifest == {path: tuple(signature) for path, signature in signatures.items()}
+
+
+def read_snapshot(path, kind):
+    """
+    Load a snapshot through mmap; numeric and date columns are not copied.
+    Args:
+        path (str): Snapshot file
+        kind (str): Expected kind
+    Returns:
+        Snapshot, or None if the file is missing, of another format or kind, or corrupt
+    """
+    try:
+        with open(path, 'rb') as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        return None
+    try:
+        magic, file_format, header_length = _PREFIX.unpack_from(buffer, 0)
+        if magic != MAGIC or file_format != SNAPSHOT_FORMAT:
+            print(f"Ignoring snapshot {path}: unsupported format")
+            return None
+        header = json.loads(bytes(buffer[_PREFIX.size:_PREFIX.size + header_length]))
+        if header.get('kind') != kind:
+            print(f"Ignoring snapshot {path}: holds '{header.get('kind')}', expected '{kind}'")
+            return None
+        data_start = _align(_PREFIX.size + header_length)
+        tables = {}
+        for name, table in header['tables'].items():
+            columns = {}
+            for column in table['columns']:
+                arrays = [np.frombuffer(buffer, dtype=np.dtype(spec['dtype']), count=spec['count'],
+                                        offset=data_start + spec['offset'])
+                          if spec['count'] else np.zeros(0, dtype=np.dtype(spec['dtype']))
+                          for spec in column['arrays']]
+                columns[column['name']] = _decode_column(column['encoding'], arrays)
+            tables[name] = pd.DataFrame(columns, copy=False) if columns else pd.DataFrame(index=range(table['rows']))
+        manifest = {file_path: tuple(signature) for file_path, signature in header['manifest'].items()}
+        return Snapshot(tables, manifest, header.get('meta', {}), header.get('created_at'))
+    except Exception as e:
+        print(f"Ignoring unreadable snapshot {path}: {e}")
+        return None
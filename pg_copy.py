@@ -0,0 +1,152 @@
+import io
+import csv
+
+from sqlalchemy import text
+
+# Rows formatted into the in-memory CSV buffer per refill while COPY reads it
+COPY_BUFFER_ROWS = 10_000
+
+
+def is_postgres(engine):
+    return engine.dialect.name == 'postgresql'
+
+
+def quote_identifier(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def qualified_name(table_name, schema=None):
+    return f"{quote_identifier(schema)}.{quote_identifier(table_name)}" if schema else quote_identifier(table_name)
+
+
+class CsvRowStream(io.TextIOBase):
+    """
+    Read-only text stream that formats rows as CSV one buffer of
+    buffer_rows at a time, so COPY can stream any number of rows while
+    only one buffer is held in memory.
+    """
+
+    def __init__(self, rows, buffer_rows=COPY_BUFFER_ROWS):
+        self._rows = iter(rows)
+        self._buffer_rows = buffer_rows
+        self._pending = ''
+        self._done = False
+        self.rows_written = 0
+
+    def readable(self):
+        return True
+
+    def _fill(self):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator='\n')
+        count = 0
+        for row in self._rows:
+            writer.writerow(row)
+            count += 1
+            if count >= self._buffer_rows:
+                break
+        if count == 0:
+            self._done = True
+        self.rows_written += count
+        self._pending += buffer.getvalue()
+
+    def read(self, size=-1):
+        while not self._done and (size is None or size < 0 or len(self._pending) < size):
+            self._fill()
+        if size is None or size < 0:
+            data, self._pending = self._pending, ''
+        else:
+            data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+    def readline(self, size=-1):
+        while not self._done and '\n' not in self._pending:
+            self._fill()
+        end = self._pending.find('\n') + 1 or len(self._pending)
+        if size is not None and 0 <= size < end:
+            end = size
+        data, self._pending = self._pending[:end], self._pending[end:]
+        return data
+
+
+# Run COPY ... FROM STDIN on a DBAPI connection (psycopg2, or psycopg 3)
+def copy_from_stream(dbapi_conn, sql, stream):
+    cursor = dbapi_conn.cursor()
+    try:
+        if hasattr(cursor, 'copy_expert'):
+            cursor.copy_expert(sql, stream)
+        else:
+            with cursor.copy(sql) as copy:
+                while True:
+                    data = stream.read(1 << 16)
+                    if not data:
+                        break
+                    copy.write(data)
+    finally:
+        cursor.close()
+
+
+def copy_rows(table, conn, keys, data_iter):
+    """
+    pandas to_sql insertion method that streams the rows through COPY FROM STDIN
+    instead of batched INSERTs, e.g. df.to_sql('purchases', engine, method=copy_rows).
+    Args:
+        table: pandas SQLTable being written
+        conn: SQLAlchemy connection in the current transaction
+        keys (list): Column names
+        data_iter: Iterator over row tuples
+    Returns:
+        Number of rows copied
+    """
+    columns = ', '.join(quote_identifier(key) for key in keys)
+    sql = f"COPY {qualified_name(table.name, table.schema)} ({columns}) FROM STDIN WITH (FORMAT csv)"
+    stream = CsvRowStream(data_iter)
+    copy_from_stream(conn.connection, sql, stream)
+    return stream.rows_written
+
+
+# COPY insertion method when the engine is PostgreSQL, else pandas' default INSERTs
+def bulk_insert_method(engine):
+    return copy_rows if is_postgres(engine) else None
+
+
+def copy_replace_table(engine, table_name, frame, unlogged=True, schema=None):
+    """
+    Replace the contents of a table by COPYing the frame into a staging table
+    and swapping it in, so readers see either the old or the new rows.
+    The staging table is UNLOGGED while it is filled (no WAL for the bulk
+    copy) and set LOGGED before the swap so the result is crash-safe.
+    Args:
+        engine: PostgreSQL SQLAlchemy engine
+        table_name (str): Table to replace; created from the frame if missing
+        frame (DataFrame): New rows
+        unlogged (bool): Fill the staging table without WAL
+    Returns:
+        Number of rows in the replaced table
+    """
+    if not is_postgres(engine):
+        raise ValueError("copy_replace_table requires a PostgreSQL engine")
+    target = qualified_name(table_name, schema)
+    staging_name = f"{table_name}__staging"
+    staging = qualified_name(staging_name, schema)
+    old = qualified_name(f"{table_name}__old", schema)
+
+    with engine.begin() as conn:
+        frame.head(0).to_sql(table_name, conn, schema=schema, if_exists='append', index=False)
+        conn.execute(text(f"DROP TABLE IF EXISTS {staging}"))
+        conn.execute(text(f"CREATE {'UNLOGGED ' if unlogged else ''}TABLE {staging} "
+                          f"(LIKE {target} INCLUDING ALL)"))
+
+    with engine.begin() as conn:
+        frame.to_sql(staging_name, conn, schema=schema, if_exists='append', index=False, method=copy_rows)
+        if unlogged:
+            conn.execute(text(f"ALTER TABLE {staging} SET LOGGED"))
+
+    # Swap in one short transaction; only the renames hold the exclusive lock
+    with engine.begin() as conn:
+        conn.execute(text(f"LOCK TABLE {target} IN ACCESS EXCLUSIVE MODE"))
+        conn.execute(text(f"DROP TABLE IF EXISTS {old}"))
+        conn.execute(text(f"ALTER TABLE {target} RENAME TO {quote_identifier(table_name + '__old')}"))
+        conn.execute(text(f"ALTER TABLE {staging} RENAME TO {quote_identifier(table_name)}"))
+        conn.execute(text(f"DROP TABLE {old}"))
+    return len(frame)
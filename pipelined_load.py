@@ -0,0 +1,148 @@
+import os
+import time
+import queue
+import threading
+
+# Extracted batches waiting for a loader; extractors block once it is full,
+# so at most this many batches (plus one per worker) are held in memory
+DEFAULT_QUEUE_BATCHES = int(os.environ.get('PIPELINE_QUEUE_BATCHES', 4))
+DEFAULT_EXTRACT_WORKERS = int(os.environ.get('PIPELINE_EXTRACT_WORKERS', min(4, os.cpu_count() or 1)))
+DEFAULT_LOAD_WORKERS = int(os.environ.get('PIPELINE_LOAD_WORKERS', 1))
+
+_DONE = object()
+
+
+class _StageTimer:
+    # Busy and waiting time of the workers of one stage
+    def __init__(self, workers):
+        self.workers = workers
+        self.busy = 0.0
+        self.waiting = 0.0
+        self.batches = 0
+        self.rows = 0
+        self._lock = threading.Lock()
+
+    def add(self, busy=0.0, waiting=0.0, rows=None):
+        with self._lock:
+            self.busy += busy
+            self.waiting += waiting
+            if rows is not None:
+                self.batches += 1
+                self.rows += rows
+
+    def report(self, wall):
+        capacity = self.workers * wall
+        return {'workers': self.workers, 'batches': self.batches, 'rows': self.rows,
+                'busy_seconds': round(self.busy, 3), 'waiting_seconds': round(self.waiting, 3),
+                'utilization': round(self.busy / capacity, 3) if capacity else None}
+
+
+def run_pipeline(items, extract_func, load_func, extract_workers=DEFAULT_EXTRACT_WORKERS,
+                 load_workers=DEFAULT_LOAD_WORKERS, queue_batches=DEFAULT_QUEUE_BATCHES):
+    """
+    Extract and load at the same time: extractor threads push each extracted
+    batch into a bounded queue while loader threads write batches from it to
+    the database. A full queue blocks the extractors (backpressure), so memory
+    stays bounded when loading is the slower stage, and the wall time tends
+    to the slower stage's time instead of the sum of both.
+    Args:
+        items (iterable): Work items, e.g. lake file paths
+        extract_func (callable): item -> frame (or None to skip the item)
+        load_func (callable): frame -> rows loaded
+        extract_workers, load_workers (int): Threads per stage
+        queue_batches (int): Extracted batches the queue holds before extractors wait
+    Returns:
+        Dict with rows_loaded, seconds, per-stage utilization and the peak queue depth
+    Raises:
+        The first exception of either stage, after every worker stopped
+    """
+    pending = queue.Queue()
+    for item in items:
+        pending.put(item)
+    batches = queue.Queue(maxsize=max(1, queue_batches))
+    extract_stage = _StageTimer(extract_workers)
+    load_stage = _StageTimer(load_workers)
+    errors = []
+    failed = threading.Event()
+    peak = [0]
+    loaded = [0]
+    loaded_lock = threading.Lock()
+
+    def put(batch):
+        # Blocks while the queue is full, but gives up once the pipeline failed
+        while not failed.is_set():
+            try:
+                batches.put(batch, timeout=0.1)
+                peak[0] = max(peak[0], batches.qsize())
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def extractor():
+        while not failed.is_set():
+            try:
+                item = pending.get_nowait()
+            except queue.Empty:
+                return
+            start = time.perf_counter()
+            try:
+                frame = extract_func(item)
+            except Exception as e:
+                errors.append(e)
+                failed.set()
+                return
+            extracted = time.perf_counter()
+            if frame is None or not len(frame):
+                extract_stage.add(busy=extracted - start, rows=0)
+                continue
+            extract_stage.add(busy=extracted - start, rows=len(frame))
+            if not put(frame):
+                return
+            extract_stage.add(waiting=time.perf_counter() - extracted)
+
+    def loader():
+        while True:
+            start = time.perf_counter()
+            batch = batches.get()
+            got = time.perf_counter()
+            load_stage.add(waiting=got - start)
+            if batch is _DONE:
+                return
+            if failed.is_set():
+                continue  # Drain so blocked extractors can finish
+            try:
+                rows = load_func(batch)
+            except Exception as e:
+                errors.append(e)
+                failed.set()
+                continue
+            load_stage.add(busy=time.perf_counter() - got, rows=len(batch))
+            with loaded_lock:
+                loaded[0] += rows or 0
+
+    start = time.perf_counter()
+    extractors = [threading.Thread(target=extractor, name=f'pipeline-extract-{index}', daemon=True)
+                  for index in range(max(1, extract_workers))]
+    loaders = [threading.Thread(target=loader, name=f'pipeline-load-{index}', daemon=True)
+               for index in range(max(1, load_workers))]
+    for thread in extractors + loaders:
+        thread.start()
+    for thread in extractors:
+        thread.join()
+    for _ in loaders:
+        batches.put(_DONE)
+    for thread in loaders:
+        thread.join()
+    wall = time.perf_counter() - start
+    if errors:
+        raise errors[0]
+
+    return {
+        'rows_loaded': loaded[0],
+        'seconds': round(wall, 3),
+        'extract': extract_stage.report(wall),
+        'load': load_stage.report(wall),
+        'queue_batches': queue_batches,
+        'peak_queue_depth': peak[0],
+    }
@@ -6,9 +6,20 @@ import re
 import csv
 import pandas as pd
 from typing import List, Dict, Optional, Union
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, Response
 from pydantic import BaseModel
 from datetime import datetime
+from ingest_metrics import metrics
+from data_process_calculate import (PURCHASE_COLUMNS, clean_purchases_tsv, empty_purchase_frame,
+                                    parse_purchase_lines, read_purchases_tsv)
+from shared_cache import SharedFileCache
+from lake_files import extract_consistent, list_lake_files
+from returns_store import lake_version
+from lake_snapshot import read_snapshot, write_snapshot
+import fast_json
+from http_cache import ResponseCache, cache_headers, choose_encoding, etag_matches, make_etag
+from lake_query import QueryEngine, QueryError, QueryTimeout
 
 # Define data models
 class PurchaseData(BaseModel):
@@ -16,6 +27,11 @@ class PurchaseData(BaseModel):
     Total_Amount: float
     Source_File: str
 
+class QueryRequest(BaseModel):
+    sql: str
+    limit: Optional[int] = None
+    timeout: Optional[float] = None
+
 class PurchaseStats(BaseModel):
     total_purchases: int
     total_amount: float
@@ -23,120 +39,181 @@ class PurchaseStats(BaseModel):
     file_summary: List[Dict]
 
 class DataProcessor:
-    def __init__(self, csv_dir="data_lake/csv", pdf_dir="data_lake/pdf", txt_dir="data_lake/txt"):
+    def __init__(self, csv_dir="data_lake/csv", pdf_dir="data_lake/pdf", txt_dir="data_lake/txt", shared_cache=None,
+                 snapshot_path=None):
         self.csv_dir = csv_dir
         self.pdf_dir = pdf_dir
         self.txt_dir = txt_dir
-        self._cached_data = None
+        self.shared_cache = shared_cache  # Optional SharedFileCache shared by worker processes
+        self.snapshot_path = snapshot_path  # Optional warm-start snapshot file
+        self._snapshot = None  # (lake version, frame) of the last build, replaced as one value
         self._last_update = None
         self._cache_duration = 300  # 5 minutes cache
 
-    def _extract_from_pdf(self, pdf_file: str) -> List[Dict]:
+    @staticmethod
+    def _empty_frame() -> pd.DataFrame:
+        return empty_purchase_frame()
+
+    def _extract_from_pdf(self, pdf_file: str) -> pd.DataFrame:
+        source_file = os.path.basename(pdf_file)
         try:
-            purchase_data = []
+            lines = []
             with open(pdf_file, 'rb') as file:
-                reader = PyPDF2.PdfReader(file)
+                with metrics.stage('read', source_file):
+                    metrics.add_bytes(os.fstat(file.fileno()).st_size, source_file)
+                    reader = PyPDF2.PdfReader(file)
                 for page in reader.pages:
-                    text = page.extract_text()
-                    lines = text.split('\n')
-                    for line in lines:
-                        if 'Purchase_ID' in line or 'Purchase_Date' in line:
-                            continue
-                        parts = re.split(r'\s+', line.strip())
-                        if len(parts) >= 7:
-                            try:
-                                purchase_id = parts[1]
-                                total_amount = float(parts[-1])
-                                if purchase_id.startswith('P') and total_amount > 0:
-                                    purchase_data.append({
-                                        'Purchase_ID': purchase_id,
-                                        'Total_Amount': total_amount,
-                                        'Source_File': os.path.basename(pdf_file)
-                                    })
-                            except (ValueError, IndexError):
-                                continue
-            return purchase_data
+                    with metrics.stage('text_extract', source_file):
+                        lines.extend(page.extract_text().split('\n'))
+
+            with metrics.stage('parse', source_file):
+                frame = parse_purchase_lines(lines, source_file)
+            data_lines = sum(1 for line in lines if line.strip() and 'Purchase_' not in line)  # Without page headers
+            metrics.count('rows_accepted', len(frame), source_file)
+            metrics.count('rows_invalid', data_lines - len(frame), source_file)
+            return frame
         except Exception as e:
             print(f"Error processing PDF file {pdf_file}: {e}")
-            return []
+            return self._empty_frame()
 
-    def _extract_from_txt(self, txt_file: str) -> List[Dict]:
+    def _extract_from_txt(self, txt_file: str) -> pd.DataFrame:
+        source_file = os.path.basename(txt_file)
         try:
-            purchase_data = []
             with open(txt_file, 'r', encoding='utf-8') as file:
-                lines = file.readlines()
-                headers = lines[0].strip().split('\t')
-                try:
-                    total_amount_idx = headers.index('Total_Amount')
-                    product_id_idx = headers.index('Product_ID')
-                except ValueError:
-                    return []
-                
-                for line in lines[1:]:
-                    parts = line.strip().split('\t')
-                    if len(parts) >= max(total_amount_idx, product_id_idx) + 1:
-                        try:
-                            purchase_data.append({
-                                'Purchase_ID': parts[product_id_idx],
-                                'Total_Amount': float(parts[total_amount_idx]),
-                                'Source_File': os.path.basename(txt_file)
-                            })
-                        except (ValueError, IndexError):
-                            continue
-            return purchase_data
+                headers = file.readline().strip().split('\t')
+            if 'Total_Amount' not in headers or 'Product_ID' not in headers:
+                return self._empty_frame()
+
+            with metrics.stage('read', source_file):
+                metrics.add_bytes(os.path.getsize(txt_file), source_file)
+                df = read_purchases_tsv(txt_file)
+            with metrics.stage('parse', source_file):
+                frame = clean_purchases_tsv(df, source_file)
+            metrics.count('rows_accepted', len(frame), source_file)
+            metrics.count('rows_invalid', len(df) - len(frame), source_file)
+            return frame
         except Exception as e:
             print(f"Error processing TXT file {txt_file}: {e}")
-            return []
+            return self._empty_frame()
 
-    def _extract_from_csv(self, csv_file: str) -> List[Dict]:
+    def _extract_from_csv(self, csv_file: str) -> pd.DataFrame:
+        source_file = os.path.basename(csv_file)
         try:
-            purchase_data = []
-            df = pd.read_csv(csv_file)
-            if 'Purchase_ID' in df.columns and 'Total_Amount' in df.columns:
-                for _, row in df.iterrows():
-                    purchase_data.append({
-                        'Purchase_ID': str(row['Purchase_ID']),
-                        'Total_Amount': float(row['Total_Amount']),
-                        'Source_File': os.path.basename(csv_file)
-                    })
-            return purchase_data
+            columns = pd.read_csv(csv_file, nrows=0).columns
+            if 'Purchase_ID' not in columns or 'Total_Amount' not in columns:
+                return self._empty_frame()
+
+            with metrics.stage('read', source_file):
+                metrics.add_bytes(os.path.getsize(csv_file), source_file)
+                frame = pd.read_csv(
+                    csv_file,
+                    usecols=['Purchase_ID', 'Total_Amount'],
+                    dtype={'Purchase_ID': 'object', 'Total_Amount': 'float64'}
+                )
+            frame['Source_File'] = source_file
+            metrics.count('rows_accepted', len(frame), source_file)
+            return frame[PURCHASE_COLUMNS]
         except Exception as e:
             print(f"Error processing CSV file {csv_file}: {e}")
-            return []
+            return self._empty_frame()
+
+    def _extract(self, file_path: str, signature, extract_func):
+        # (signature, frame) of the version actually read; an upload may replace the file mid-read
+        return extract_consistent(file_path, signature, extract_func, self.shared_cache)
 
     def _is_cache_valid(self) -> bool:
-        if not self._cached_data or not self._last_update:
+        if self._snapshot is None or not self._last_update:
             return False
         elapsed = (datetime.now() - self._last_update).total_seconds()
         return elapsed < self._cache_duration
 
-    def get_all_purchase_data(self, use_cache: bool = True) -> List[PurchaseData]:
+    def get_purchase_frame(self, use_cache: bool = True) -> pd.DataFrame:
         """
-        Get all purchase data from all sources.
+        Get all purchase data from all sources as one columnar frame.
         Args:
             use_cache (bool): Whether to use cached data if available
         Returns:
-            List of PurchaseData objects
+            DataFrame with Purchase_ID, Total_Amount and Source_File columns
         """
-        if use_cache and self._is_cache_valid():
-            return self._cached_data
+        return self.get_snapshot(use_cache)[1]
 
-        all_purchase_data = []
-        
+    def get_snapshot(self, use_cache: bool = True):
+        """
+        Get the purchase frame together with the lake version it was built from.
+        Args:
+            use_cache (bool): Whether to use cached data if available
+        Returns:
+            (version, DataFrame) tuple
+        """
+        snapshot = self._snapshot
+        if use_cache and snapshot is not None and self._is_cache_valid():
+            return snapshot
+
+        frames = []
+        signatures = {}
+
+        with metrics.run('get_all_purchase_data'):
+            for file_path, signature, extract_func in self._scan():
+                signature, frame = self._extract(file_path, signature, extract_func)
+                signatures[file_path] = signature
+                frames.append(frame)
+                metrics.count('files_processed', 1, os.path.basename(file_path))
+
+        frame = pd.concat(frames, ignore_index=True) if frames else self._empty_frame()
+        previous, snapshot = self._snapshot, (lake_version(signatures), frame)
+        self._snapshot = snapshot
+        self._last_update = datetime.now()
+        if previous is None or previous[0] != snapshot[0]:
+            self._save_snapshot(snapshot, signatures)  # An unchanged lake is already on disk
+        return snapshot
+
+    def _scan(self):
+        # (path, (size, mtime_ns), extractor) of every lake file
+        found = []
         for directory, file_type, extract_func in [
             (self.csv_dir, '.csv', self._extract_from_csv),
             (self.pdf_dir, '.pdf', self._extract_from_pdf),
             (self.txt_dir, '.txt', self._extract_from_txt)
         ]:
-            if os.path.exists(directory):
-                for file_name in os.listdir(directory):
-                    if file_name.endswith(file_type):
-                        file_path = os.path.join(directory, file_name)
-                        all_purchase_data.extend(extract_func(file_path))
+            for file_path, signature in list_lake_files(directory, file_type):
+                found.append((file_path, signature, extract_func))
+        return found
+
+    def _save_snapshot(self, snapshot, signatures):
+        if not self.snapshot_path:
+            return
+        version, frame = snapshot
+        try:
+            write_snapshot(self.snapshot_path, 'purchases', {'purchases': frame}, signatures,
+                           meta={'version': version})
+        except OSError as e:
+            print(f"Error writing purchases snapshot {self.snapshot_path}: {e}")
 
-        self._cached_data = all_purchase_data
+    def warm_start(self) -> bool:
+        """
+        Load the purchase frame from the snapshot if the lake still matches its manifest.
+        Returns:
+            True if the snapshot was used
+        """
+        snapshot = read_snapshot(self.snapshot_path, 'purchases') if self.snapshot_path else None
+        if snapshot is None:
+            return False
+        if not snapshot.matches({file_path: signature for file_path, signature, _ in self._scan()}):
+            print(f"Purchases snapshot {self.snapshot_path} is stale; the lake will be parsed on first use")
+            return False
+        self._snapshot = (snapshot.meta['version'], snapshot.tables['purchases'])
         self._last_update = datetime.now()
-        return all_purchase_data
+        return True
+
+    def get_all_purchase_data(self, use_cache: bool = True) -> List[PurchaseData]:
+        """
+        Get all purchase data from all sources.
+        Args:
+            use_cache (bool): Whether to use cached data if available
+        Returns:
+            List of PurchaseData objects
+        """
+        return self.get_purchase_frame(use_cache).to_dict('records')
 
     def get_purchase_by_id(self, purchase_id: str) -> Optional[PurchaseData]:
         """
@@ -146,11 +223,11 @@ class DataProcessor:
         Returns:
             PurchaseData object if found, None otherwise
         """
-        data = self.get_all_purchase_data()
-        for purchase in data:
-            if purchase['Purchase_ID'] == purchase_id:
-                return purchase
-        return None
+        df = self.get_purchase_frame()
+        matches = df[df['Purchase_ID'] == purchase_id]
+        if matches.empty:
+            return None
+        return matches.iloc[0].to_dict()
 
     def get_purchases_by_amount_range(self, min_amount: float, max_amount: float) -> List[PurchaseData]:
         """
@@ -161,8 +238,8 @@ class DataProcessor:
         Returns:
             List of PurchaseData objects within the range
         """
-        data = self.get_all_purchase_data()
-        return [p for p in data if min_amount <= p['Total_Amount'] <= max_amount]
+        df = self.get_purchase_frame()
+        return df[df['Total_Amount'].between(min_amount, max_amount)].to_dict('records')
 
     def get_purchase_statistics(self) -> PurchaseStats:
         """
@@ -170,8 +247,8 @@ class DataProcessor:
         Returns:
             PurchaseStats object containing summary statistics
         """
-        data = self.get_all_purchase_data()
-        if not data:
+        df = self.get_purchase_frame()
+        if df.empty:
             return PurchaseStats(
                 total_purchases=0,
                 total_amount=0,
@@ -179,14 +256,13 @@ class DataProcessor:
                 file_summary=[]
             )
 
-        df = pd.DataFrame(data)
         file_summary = df.groupby('Source_File').agg({
             'Purchase_ID': 'count',
             'Total_Amount': 'sum'
         }).reset_index().to_dict('records')
 
         return PurchaseStats(
-            total_purchases=len(data),
+            total_purchases=len(df),
             total_amount=df['Total_Amount'].sum(),
             average_amount=df['Total_Amount'].mean(),
             file_summary=file_summary
@@ -195,13 +271,32 @@ class DataProcessor:
 # Create FastAPI instance
 app = FastAPI(title="Purchase Data API")
 
-# Initialize data processor
-data_processor = DataProcessor()
+# Warm-start snapshots of the processed lake; LAKE_SNAPSHOT_DIR='' disables them
+snapshot_dir = os.environ.get('LAKE_SNAPSHOT_DIR', "data_lake/snapshots")
+
+# Initialize data processor; with LAKE_CACHE_DIR set, workers share extracted files on disk
+data_processor = DataProcessor(shared_cache=SharedFileCache.from_env('purchases'),
+                               snapshot_path=os.path.join(snapshot_dir, 'purchases.snap') if snapshot_dir else None)
+if data_processor.warm_start():
+    print(f"Warm start: restored {len(data_processor.get_purchase_frame())} purchases from {snapshot_dir}")
+
+# Serialized /purchases/ bodies per lake version, revalidated by ETag
+response_cache = ResponseCache()
 
 @app.get("/purchases/", response_model=List[PurchaseData])
-async def get_all_purchases():
+async def get_all_purchases(request: Request):
     """Get all purchase data"""
-    return data_processor.get_all_purchase_data()
+    version, frame = data_processor.get_snapshot()
+    encoding = choose_encoding(request.headers.get('accept-encoding'))
+    etag = make_etag(version, encoding=encoding)
+    if etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=cache_headers(etag))
+
+    def build_body():
+        return fast_json.dumps_records(frame)
+
+    body = response_cache.get('purchases', version, encoding, build_body)
+    return Response(body, media_type='application/json', headers=cache_headers(etag, encoding))
 
 @app.get("/purchases/{purchase_id}", response_model=Optional[PurchaseData])
 async def get_purchase(purchase_id: str):
@@ -214,13 +309,51 @@ async def get_purchase(purchase_id: str):
 @app.get("/purchases/range/", response_model=List[PurchaseData])
 async def get_purchases_by_range(min_amount: float, max_amount: float):
     """Get purchases within amount range"""
-    return data_processor.get_purchases_by_amount_range(min_amount, max_amount)
+    # The frame is already typed, so it is encoded directly instead of validated per item
+    df = data_processor.get_purchase_frame()
+    matches = df[df['Total_Amount'].between(min_amount, max_amount)]
+    return Response(fast_json.dumps_records(matches), media_type='application/json')
 
 @app.get("/statistics/", response_model=PurchaseStats)
 async def get_statistics():
     """Get purchase statistics"""
     return data_processor.get_purchase_statistics()
 
+# Read-only SQL over the cached purchase frame (table 'purchases')
+query_engine = QueryEngine({'purchases': lambda: data_processor.get_snapshot()})
+
+def _run_query(sql: str, limit: Optional[int], timeout: Optional[float]) -> Response:
+    try:
+        result = query_engine.query(sql, limit, timeout)
+    except QueryTimeout as e:
+        raise HTTPException(status_code=408, detail=str(e))
+    except QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(fast_json.dumps(result), media_type='application/json')
+
+# Sync endpoints run in the threadpool, so a long query does not block the event loop
+@app.get("/api/query")
+def get_query(sql: str, limit: Optional[int] = None, timeout: Optional[float] = None):
+    """Run a read-only SELECT, e.g. ?sql=SELECT Source_File, SUM(Total_Amount) FROM purchases GROUP BY 1"""
+    return _run_query(sql, limit, timeout)
+
+@app.post("/api/query")
+def post_query(query: QueryRequest):
+    """Run a read-only SELECT sent as JSON {"sql": ..., "limit": ..., "timeout": ...}"""
+    return _run_query(query.sql, query.limit, query.timeout)
+
+@app.get("/api/query/tables")
+def get_query_tables():
+    """List the queryable tables with their columns"""
+    return {"tables": query_engine.tables()}
+
+@app.get("/metrics")
+async def get_metrics(format: str = "json"):
+    """Get ingest stage timers and counters (JSON, or format=prometheus)"""
+    if format == "prometheus":
+        return PlainTextResponse(metrics.to_prometheus())
+    return metrics.snapshot()
+
 # Example usage of the Python functions
 if __name__ == "__main__":
     # Initialize processor
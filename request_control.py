@@ -0,0 +1,130 @@
+import threading
+from contextlib import contextmanager
+
+DEFAULT_MAX_ACTIVE = 2
+DEFAULT_MAX_QUEUED = 8
+DEFAULT_QUEUE_TIMEOUT = 30.0
+
+
+class Overloaded(Exception):
+    """An operation was refused because the concurrency limit and its queue are full."""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one execution: the
+    first caller runs the function, callers arriving while it runs wait for
+    it and get the same result (or exception). Nothing is cached after the
+    call finishes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+
+    def do(self, key, func):
+        """
+        Run func once for all concurrent callers with this key.
+        Args:
+            key: Hashable identity of the work
+            func (callable): The work
+        Returns:
+            (result, shared) where shared is True for callers that joined another's call
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.followers += 1
+                leader = False
+            else:
+                flight = self._flights[key] = _Flight()
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result = func()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result, False
+
+    def in_flight(self):
+        with self._lock:
+            return {str(key): flight.followers for key, flight in self._flights.items()}
+
+
+class AdmissionGate:
+    """
+    Bound the operations running at once. Up to max_active run; up to
+    max_queued more wait for a slot for at most queue_timeout seconds;
+    anything beyond that is refused with Overloaded instead of piling up.
+    Args:
+        max_active (int): Operations running concurrently
+        max_queued (int): Operations allowed to wait for a slot
+        queue_timeout (float): Seconds a queued operation waits before it is refused
+    """
+
+    def __init__(self, max_active=DEFAULT_MAX_ACTIVE, max_queued=DEFAULT_MAX_QUEUED,
+                 queue_timeout=DEFAULT_QUEUE_TIMEOUT):
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_active)
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self.rejected = 0
+
+    @contextmanager
+    def admit(self):
+        """Hold a slot for the block; raises Overloaded if none is free in time."""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                if self._queued >= self.max_queued:
+                    self.rejected += 1
+                    raise Overloaded(f"{self._active} operations running and {self._queued} queued")
+                self._queued += 1
+            try:
+                acquired = self._slots.acquire(timeout=self.queue_timeout)
+            finally:
+                with self._lock:
+                    self._queued -= 1
+            if not acquired:
+                with self._lock:
+                    self.rejected += 1
+                raise Overloaded(f"No slot freed up within {self.queue_timeout:g}s",
+                                 retry_after=max(1, int(self.queue_timeout)))
+        with self._lock:
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active -= 1
+            self._slots.release()
+
+    def status(self):
+        with self._lock:
+            return {'active': self._active, 'queued': self._queued, 'max_active': self.max_active,
+                    'max_queued': self.max_queued, 'rejected': self.rejected}
@@ -0,0 +1,181 @@
+import time
+import hashlib
+import threading
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+# Order quantities per month, territory and product, aggregated by the database
+# in one bulk query against AdventureWorks2019 (CONVERT style 120 gives 'yyyy-mm-dd')
+SQLSERVER_ORDERS_QUERY = """
+SELECT CONVERT(char(7), h.OrderDate, 120) AS month, h.TerritoryID AS territory_key, d.ProductID AS product_key,
+       SUM(d.OrderQty) AS order_quantity, COUNT(*) AS order_lines
+FROM Sales.SalesOrderHeader h
+JOIN Sales.SalesOrderDetail d ON d.SalesOrderID = h.SalesOrderID
+GROUP BY CONVERT(char(7), h.OrderDate, 120), h.TerritoryID, d.ProductID
+"""
+
+# Same rollup from the sales_order table of a local SQLite stand-in (see create_orders_standin)
+SQLITE_ORDERS_QUERY = """
+SELECT strftime('%Y-%m', order_date) AS month, territory_key, product_key,
+       SUM(order_quantity) AS order_quantity, COUNT(*) AS order_lines
+FROM sales_order
+GROUP BY 1, 2, 3
+"""
+
+# Keys the rates can be grouped by; months are 'YYYY-MM'
+RATE_KEYS = ['month', 'territory_key', 'product_key']
+
+DEFAULT_REFRESH_INTERVAL = 3600
+DEFAULT_RETRY_INTERVAL = 60
+
+
+class OrderVolumes:
+    """
+    In-memory rollup of ordered quantities by month, territory and product.
+    It is loaded with one aggregate query and reloaded once refresh_interval
+    has passed, so return rates never query the orders per request.
+    Args:
+        engine: SQLAlchemy engine for AdventureWorks2019 or a SQLite stand-in
+        refresh_interval (int): Seconds before the rollup is reloaded
+        retry_interval (int): Seconds before a failed load is retried
+        query (str): Override the rollup query
+    """
+
+    def __init__(self, engine, refresh_interval=DEFAULT_REFRESH_INTERVAL, retry_interval=DEFAULT_RETRY_INTERVAL,
+                 query=None):
+        self.engine = engine
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self.query = query or (SQLITE_ORDERS_QUERY if engine.dialect.name == 'sqlite' else SQLSERVER_ORDERS_QUERY)
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._rollup = None
+        self._version = None
+        self._loaded_at = None
+        self._last_attempt = None
+        self.last_error = None
+
+    @classmethod
+    def from_url(cls, url, **kwargs):
+        return cls(create_engine(url), **kwargs)
+
+    def load(self):
+        """
+        Bulk-load the order rollup, replacing the cached one atomically.
+        Returns:
+            True if the rollup was loaded, False if the query failed
+        """
+        self._last_attempt = time.monotonic()
+        try:
+            with self.engine.connect() as conn:
+                df = pd.read_sql(text(self.query), conn)
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"Error loading order volumes: {e}")
+            return False
+        # Keys as text, like the extracted returns
+        rollup = pd.DataFrame({
+            'month': df['month'].astype(str),
+            'territory_key': df['territory_key'].astype('int64').astype(str),
+            'product_key': df['product_key'].astype('int64').astype(str),
+            'order_quantity': df['order_quantity'].astype('int64'),
+            'order_lines': df['order_lines'].astype('int64'),
+        })
+        digest = hashlib.sha1(pd.util.hash_pandas_object(rollup, index=False).to_numpy().tobytes())
+        with self._lock:
+            self._rollup = rollup
+            self._version = digest.hexdigest()[:12]
+            self._loaded_at = time.monotonic()
+            self.last_error = None
+        return True
+
+    def _ensure_fresh(self):
+        interval = self.refresh_interval if self.last_error is None else self.retry_interval
+        if self._last_attempt is None or time.monotonic() - self._last_attempt >= interval:
+            with self._load_lock:
+                # Another thread may have reloaded while this one waited
+                if self._last_attempt is None or time.monotonic() - self._last_attempt >= interval:
+                    self.load()
+
+    def rollup(self):
+        """Order rollup with month, territory_key, product_key, order_quantity and order_lines, or None."""
+        self._ensure_fresh()
+        return self._rollup
+
+    def version(self):
+        """Content hash of the loaded rollup, or None if it could not be loaded."""
+        self._ensure_fresh()
+        return self._version
+
+    def status(self):
+        return {
+            'loaded': self._rollup is not None,
+            'groups': len(self._rollup) if self._rollup is not None else 0,
+            'age_seconds': round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None,
+            'refresh_interval': self.refresh_interval,
+            'last_error': self.last_error,
+        }
+
+
+# Restrict a frame with a 'month' column to an inclusive 'YYYY-MM' range
+def _in_months(frame, start=None, end=None):
+    if start is not None:
+        frame = frame[frame['month'] >= start]
+    if end is not None:
+        frame = frame[frame['month'] <= end]
+    return frame
+
+
+def return_rates(returns_rollup, orders_rollup, group_by=None, start=None, end=None):
+    """
+    Hash-join returned and ordered quantities on the group keys.
+    Both sides are pre-aggregated rollups, so the join is over groups, not rows.
+    Args:
+        returns_rollup (DataFrame): ReturnsStore rollup (month, territory_key, product_key, sum_quantity)
+        orders_rollup (DataFrame): OrderVolumes rollup
+        group_by (list): Subset of RATE_KEYS; all of them by default
+        start, end (str): Inclusive 'YYYY-MM' bounds; None leaves a side open
+    Returns:
+        DataFrame with the group columns, order_quantity, return_quantity and
+        return_rate (return_quantity / order_quantity, NaN where nothing was ordered)
+    """
+    group_by = list(group_by or RATE_KEYS)
+    unknown = [column for column in group_by if column not in RATE_KEYS]
+    if unknown:
+        raise ValueError(f"Unsupported group_by columns: {', '.join(unknown)}")
+
+    returned = _in_months(returns_rollup, start, end)
+    ordered = _in_months(orders_rollup, start, end)
+    returned = returned.groupby(group_by, sort=False, observed=True)['sum_quantity'].sum() \
+        .rename('return_quantity')
+    ordered = ordered.groupby(group_by, sort=False, observed=True)['order_quantity'].sum()
+
+    # Outer join: groups ordered but never returned get a rate of 0,
+    # groups returned without matching orders keep order_quantity 0 and no rate
+    joined = pd.concat([ordered, returned], axis=1, join='outer')
+    joined = joined.fillna(0).astype('int64').sort_index().reset_index()
+    order_quantity = joined['order_quantity'].to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = np.where(order_quantity > 0, joined['return_quantity'].to_numpy() / order_quantity, np.nan)
+    joined['return_rate'] = rate
+    return joined
+
+
+# Create (or replace) the sales_order table of a SQLite stand-in
+def create_orders_standin(url_or_engine, orders):
+    """
+    Args:
+        url_or_engine: SQLAlchemy URL or engine of the SQLite database
+        orders (DataFrame): order_date, territory_key, product_key and order_quantity per order line
+    """
+    engine = create_engine(url_or_engine) if isinstance(url_or_engine, str) else url_or_engine
+    frame = pd.DataFrame({
+        'order_date': pd.to_datetime(orders['order_date']).dt.strftime('%Y-%m-%d'),
+        'territory_key': orders['territory_key'].astype('int64'),
+        'product_key': orders['product_key'].astype('int64'),
+        'order_quantity': orders['order_quantity'].astype('int64'),
+    })
+    frame.to_sql('sales_order', engine, if_exists='replace', index=False, chunksize=50_000)
+    return engine
@@ -0,0 +1,429 @@
+import os
+import time
+import hashlib
+import threading
+
+import pandas as pd
+
+from lake_catalog import LakeCatalog
+from lake_files import extract_consistent, file_signature, is_lake_file, list_lake_files
+from lake_snapshot import read_snapshot, write_snapshot
+from sketches import build_group_sketches, merge_group_sketches
+
+# Columns of the extracted return records, in record order
+RECORD_COLUMNS = ['return_date', 'territory_key', 'product_key', 'return_quantity', 'source_file']
+
+# Columns a client may group by; the first three are served from the monthly rollup
+ROLLUP_KEYS = ['month', 'territory_key', 'product_key']
+GROUP_BY_COLUMNS = ROLLUP_KEYS + ['year', 'return_date', 'source_file']
+
+# Per-file sketches are kept per month and territory; answers merge them down
+SKETCH_KEYS = ['month', 'territory_key']
+
+# Supported aggregate metrics
+METRICS = ['sum_quantity', 'count_returns', 'avg_quantity', 'distinct_products', 'distinct_territories']
+
+
+# Next ingest sequence: microseconds since the epoch, and always above the last one,
+# so watermarks handed out before a restart stay below every later sequence
+def next_sequence(last):
+    return max(last + 1, time.time_ns() // 1000)
+
+
+# Stable version string for a set of {path: signature} entries
+def lake_version(signatures):
+    digest = hashlib.sha1()
+    for path in sorted(signatures):
+        digest.update(f"{path}|{signatures[path]}\n".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+# Build a typed frame from extracted return records
+def records_to_frame(records):
+    frame = pd.DataFrame(records, columns=RECORD_COLUMNS)
+    frame['return_date'] = pd.to_datetime(frame['return_date'], format='%Y-%m-%d')
+    frame['return_quantity'] = frame['return_quantity'].astype('int64')
+    return frame
+
+
+# Add the month and year columns used by the rollup to a typed frame
+def with_periods(frame):
+    frame = frame[RECORD_COLUMNS].copy()
+    frame['month'] = frame['return_date'].dt.strftime('%Y-%m')
+    frame['year'] = frame['month'].str[:4]
+    return frame
+
+
+# Convert a typed frame back to the record dicts served by /api/returns
+def frame_to_records(frame):
+    out = frame[RECORD_COLUMNS].copy()
+    out['return_date'] = out['return_date'].dt.strftime('%Y-%m-%d')
+    return out.to_dict('records')
+
+
+class ReturnsStore:
+    """
+    Columnar, per-file cache of the extracted return records.
+    Only files whose size or mtime changed are re-extracted on refresh, and
+    a monthly rollup by territory and product is rebuilt whenever the lake
+    version changes. Every (re)extracted or removed file gets an increasing
+    ingest sequence, which changes() uses as the watermark of a change feed.
+    Args:
+        sources (callable): Returns a list of (directory, extension, extract_func);
+            extractors return a typed frame or a list of record dicts
+        shared_cache (SharedFileCache): Optional cross-process cache of per-file results
+        catalog (LakeCatalog): Period of each file, used to prune month-range reads
+        snapshot_path (callable): Returns the warm-start snapshot file, or None to disable it
+        validation_version (callable): Returns the version of the validation inputs (e.g. dimension
+            keys and date bound); files extracted under another version are extracted again
+    """
+
+    def __init__(self, sources, shared_cache=None, catalog=None, snapshot_path=None, validation_version=None):
+        self.sources = sources
+        self.shared_cache = shared_cache
+        self.catalog = catalog if catalog is not None else LakeCatalog()
+        self.snapshot_path = snapshot_path
+        self.validation_version = validation_version
+        self._lock = threading.RLock()
+        self._files = {}  # path -> (signature, frame, validation version)
+        self._sketches = {}  # path -> (signature, validation version, {(month, territory_key): (HyperLogLog, TopK)})
+        self._validation = None  # Validation version self._frame was built under
+        # Ingest sequence of each cached file and of each removed file; guarded by
+        # _sequence_lock because load_file() stores frames without the store lock
+        self._sequence_lock = threading.Lock()
+        self._sequence = 0
+        self._ingested = {}  # path -> sequence its current frame was stored at
+        self._removed = {}  # path -> sequence it was removed at
+        self._frame = with_periods(records_to_frame([]))
+        self._rollup = self._build_rollup(self._frame)
+        self._version = None
+
+    def scan(self):
+        """
+        List the lake files with their signatures and extractors.
+        Returns:
+            Dict of path -> (signature, extract_func)
+        """
+        found = {}
+        for directory, file_type, extract_func in self.sources():
+            for path, signature in list_lake_files(directory, file_type):
+                found[path] = (signature, extract_func)
+        return found
+
+    def _validation_version(self):
+        return self.validation_version() if self.validation_version is not None else None
+
+    # Frame of one file, extracted again only if its signature or the validation version changed
+    def _load(self, path, signature, extract_func, validation=None):
+        if validation is None:
+            validation = self._validation_version()
+        cached = self._files.get(path)
+        if cached is None or cached[0] != signature or cached[2] != validation:
+            # An upload may replace the file mid-read; keep the signature of the version actually read
+            signature, data = extract_consistent(path, signature, extract_func, self.shared_cache)
+            if not isinstance(data, pd.DataFrame):
+                data = records_to_frame(data)
+            frame = with_periods(data)
+            with self._sequence_lock:
+                self._sequence = next_sequence(self._sequence)
+                cached = self._files[path] = (signature, frame, validation)
+                self._ingested[path] = self._sequence
+                self._removed.pop(path, None)
+            self._sketches[path] = (signature, validation, self._build_sketches(frame))
+        return cached[1]
+
+    @staticmethod
+    def _build_sketches(frame):
+        return build_group_sketches(frame, SKETCH_KEYS, 'product_key', 'return_quantity')
+
+    # Sketches of a cached file; files restored from a snapshot are sketched from their frame
+    def _file_sketches(self, path, signature, frame, validation):
+        cached = self._sketches.get(path)
+        if cached is None or cached[0] != signature or cached[1] != validation:
+            cached = self._sketches[path] = (signature, validation, self._build_sketches(frame))
+        return cached[2]
+
+    def _forget_removed(self, found):
+        for path in list(self._files):
+            if path not in found:
+                with self._sequence_lock:
+                    self._sequence = next_sequence(self._sequence)
+                    del self._files[path]
+                    self._ingested.pop(path, None)
+                    self._removed[path] = self._sequence
+                self._sketches.pop(path, None)
+        self.catalog.retain(found)
+
+    def refresh(self):
+        """
+        Re-extract new or changed files and drop removed ones.
+        Returns:
+            The current lake version
+        """
+        with self._lock:
+            found = self.scan()
+            self._forget_removed(found)
+            validation = self._validation_version()
+            for path, (signature, extract_func) in found.items():
+                self._load(path, signature, extract_func, validation)
+                found[path] = (self._files[path][0], extract_func)
+            version = lake_version({path: signature for path, (signature, _) in found.items()})
+            # Same files re-validated under new dimension keys or date bound also rebuild the frame
+            if version != self._version or validation != self._validation:
+                frames = [self._files[path][1] for path in found]
+                self._frame = (pd.concat(frames, ignore_index=True) if frames
+                               else with_periods(records_to_frame([])))
+                self._rollup = self._build_rollup(self._frame)
+                self._version = version
+                self._validation = validation
+                self.save_snapshot(found)
+            return self._version
+
+    def _snapshot_file(self):
+        return self.snapshot_path() if self.snapshot_path is not None else None
+
+    def save_snapshot(self, found):
+        """Write the records, rollup and catalog of the current version for the next warm start."""
+        path = self._snapshot_file()
+        if not path:
+            return None
+        files, start = [], 0
+        for file_path in found:
+            stop = start + len(self._files[file_path][1])
+            files.append([file_path, start, stop])
+            start = stop
+        with self._sequence_lock:
+            sequences = {'sequence': self._sequence, 'removed': dict(self._removed),
+                         'ingested': {file_path: self._ingested.get(file_path) for file_path in found}}
+        try:
+            return write_snapshot(path, 'returns', {'records': self._frame, 'rollup': self._rollup},
+                                  {file_path: signature for file_path, (signature, _) in found.items()},
+                                  meta={'version': self._version, 'validation': self._validation, 'files': files,
+                                        'catalog': self.catalog.export(), **sequences})
+        except OSError as e:
+            print(f"Error writing returns snapshot {path}: {e}")
+            return None
+
+    def warm_start(self):
+        """
+        Restore the per-file frames, rollup and catalog from the snapshot
+        instead of parsing the lake. Files whose size or mtime no longer
+        match the snapshot manifest are extracted again; a snapshot written
+        under another validation version is not used at all.
+        Returns:
+            True if a snapshot was used
+        """
+        path = self._snapshot_file()
+        snapshot = read_snapshot(path, 'returns') if path else None
+        if snapshot is None:
+            return False
+        validation = self._validation_version()
+        if snapshot.meta.get('validation') != validation:
+            print(f"Returns snapshot {path} was validated under another version; the lake will be parsed again")
+            return False
+        with self._lock:
+            found = self.scan()
+            records = snapshot.tables['records']
+            ingested = snapshot.meta.get('ingested', {})
+            with self._sequence_lock:
+                # Restored files keep their sequence, so a client's watermark survives the restart
+                self._sequence = max(self._sequence, snapshot.meta.get('sequence', 0))
+                self._removed.update(snapshot.meta.get('removed', {}))
+                for file_path, start, stop in snapshot.meta.get('files', []):
+                    signature = snapshot.manifest.get(file_path)
+                    if file_path in found and found[file_path][0] == signature:
+                        self._files[file_path] = (signature, records.iloc[start:stop], validation)
+                        self._ingested[file_path] = ingested.get(file_path) or next_sequence(self._sequence)
+                        self._sequence = max(self._sequence, self._ingested[file_path])
+                    elif file_path not in found:
+                        self._sequence = next_sequence(self._sequence)
+                        self._removed[file_path] = self._sequence
+            self.catalog.restore(snapshot.meta.get('catalog', []))
+            if snapshot.matches({file_path: signature for file_path, (signature, _) in found.items()}):
+                self._frame = records
+                self._rollup = snapshot.tables['rollup']
+                self._version = snapshot.meta['version']
+                self._validation = validation
+            else:
+                self.refresh()
+        return True
+
+    def load_file(self, path):
+        """
+        Extract one lake file into the per-file cache ahead of the next
+        refresh, e.g. right after it was uploaded. Safe to call from
+        several threads; the store lock is not held while extracting.
+        Args:
+            path (str): File in one of the source directories
+        Returns:
+            The file's frame, or None if it is not a lake file of a source
+        """
+        path_abs = os.path.abspath(path)
+        file_name = os.path.basename(path_abs)
+        for directory, file_type, extract_func in self.sources():
+            # Files may sit in shard subfolders of the source directory (see lake_layout.py)
+            if path_abs.startswith(os.path.abspath(directory) + os.sep) and is_lake_file(file_name, file_type):
+                return self._load(path, file_signature(path), extract_func)
+        return None
+
+    def version(self):
+        return self.refresh()
+
+    def snapshot(self, refresh=True):
+        """Return (version, frame) of one consistent lake snapshot."""
+        with self._lock:
+            if refresh:
+                self.refresh()
+            return self._version, self._frame
+
+    def frame(self, refresh=True):
+        if refresh:
+            self.refresh()
+        return self._frame
+
+    def snapshot_range(self, start=None, end=None, whole_files=False):
+        """
+        Snapshot of the returns between two months, opening only the files
+        whose period (see LakeCatalog) falls in the range.
+        Args:
+            start, end (str): Inclusive 'YYYY-MM' bounds; None leaves a side open
+            whole_files (bool): Keep every row of the matching files, e.g. for checkpointed loads
+        Returns:
+            (version, frame) where version covers only the matching files
+        """
+        with self._lock:
+            found = self.scan()
+            self._forget_removed(found)
+            selected = {path: entry for path, entry in found.items()
+                        if self.catalog.matches(path, entry[0], start, end)}
+            frames = []
+            validation = self._validation_version()
+            for path, (signature, extract_func) in sorted(selected.items()):
+                frames.append(self._load(path, signature, extract_func, validation))
+                selected[path] = (self._files[path][0], extract_func)
+            version = lake_version({path: signature for path, (signature, _) in selected.items()})
+        frame = pd.concat(frames, ignore_index=True) if frames else with_periods(records_to_frame([]))
+        if whole_files:
+            return version, frame
+        # Files of unknown period, or with stray rows, may hold other months
+        in_range = pd.Series(True, index=frame.index)
+        if start is not None:
+            in_range &= frame['month'] >= start
+        if end is not None:
+            in_range &= frame['month'] <= end
+        return version, frame[in_range].reset_index(drop=True)
+
+    def sketch(self, group_by=None, start=None, end=None):
+        """
+        Approximate distinct products and top products per group, merged from
+        the per-file sketches instead of scanning the records.
+        Args:
+            group_by (list): Subset of SKETCH_KEYS; [] merges everything
+            start, end (str): Inclusive 'YYYY-MM' bounds; None leaves a side open
+        Returns:
+            (version, dict of group key tuple -> (HyperLogLog, TopK))
+        """
+        group_by = list(SKETCH_KEYS if group_by is None else group_by)
+        unknown = [column for column in group_by if column not in SKETCH_KEYS]
+        if unknown:
+            raise ValueError(f"Unsupported group_by columns: {', '.join(unknown)}")
+
+        def in_range(key):
+            return (start is None or key['month'] >= start) and (end is None or key['month'] <= end)
+
+        with self._lock:
+            version = self.refresh()
+            # load_file() may add files while the sketches are built
+            with self._sequence_lock:
+                files = list(self._files.items())
+            sketch_sets = [self._file_sketches(path, signature, frame, validation)
+                           for path, (signature, frame, validation) in files]
+        return version, merge_group_sketches(sketch_sets, SKETCH_KEYS, group_by, in_range)
+
+    def changes(self, since=0):
+        """
+        Files extracted or removed after a watermark, for incremental refreshes.
+        A changed file is reported whole: its new frame replaces every record
+        previously received from it.
+        Args:
+            since (int): Watermark returned by an earlier call; 0 for everything
+        Returns:
+            (watermark, changed, removed): changed is a list of (path, sequence, frame)
+            and removed a list of (path, sequence), both in sequence order
+        """
+        with self._lock:
+            self.refresh()
+            with self._sequence_lock:
+                changed = sorted(((path, sequence, self._files[path][1])
+                                  for path, sequence in self._ingested.items() if sequence > since),
+                                 key=lambda entry: entry[1])
+                removed = sorted(((path, sequence) for path, sequence in self._removed.items() if sequence > since),
+                                 key=lambda entry: entry[1])
+                return max(self._sequence, since), changed, removed
+
+    def records(self, refresh=True):
+        return frame_to_records(self.frame(refresh))
+
+    def rollup(self, refresh=True):
+        """Monthly rollup with sum_quantity and count_returns per month, territory and product."""
+        if refresh:
+            self.refresh()
+        return self._rollup
+
+    @staticmethod
+    def _build_rollup(frame):
+        rollup = frame.groupby(ROLLUP_KEYS, sort=True).agg(
+            sum_quantity=('return_quantity', 'sum'),
+            count_returns=('return_quantity', 'size'),
+        ).reset_index()
+        rollup['year'] = rollup['month'].str[:4]
+        return rollup
+
+    def aggregate(self, group_by, metric='sum_quantity'):
+        """
+        Aggregate the returns with vectorized group-bys.
+        Args:
+            group_by (list): Columns from GROUP_BY_COLUMNS
+            metric (str): One of METRICS
+        Returns:
+            DataFrame with the group columns and the metric column
+        """
+        unknown = [column for column in group_by if column not in GROUP_BY_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unsupported group_by column(s): {', '.join(unknown)}")
+        if metric not in METRICS:
+            raise ValueError(f"Unsupported metric: {metric}")
+
+        with self._lock:
+            self.refresh()
+            if set(group_by) <= set(ROLLUP_KEYS + ['year']):
+                source, quantity, count = self._rollup, 'sum_quantity', 'count_returns'
+            else:
+                source, quantity, count = self._frame, 'return_quantity', None
+
+        if not group_by:
+            source = source.assign(_all=0)
+            keys = ['_all']
+        else:
+            keys = list(group_by)
+        grouped = source.groupby(keys, sort=True)
+
+        if metric == 'sum_quantity':
+            result = grouped[quantity].sum()
+        elif metric == 'count_returns':
+            result = grouped[count].sum() if count else grouped.size()
+        elif metric == 'avg_quantity':
+            totals = grouped[quantity].sum()
+            counts = grouped[count].sum() if count else grouped.size()
+            result = (totals / counts).round(4)
+        elif metric == 'distinct_products':
+            result = grouped['product_key'].nunique()
+        else:
+            result = grouped['territory_key'].nunique()
+
+        result = result.rename(metric).reset_index()
+        if not group_by:
+            result = result.drop(columns=['_all'])
+        if 'return_date' in result.columns:
+            result['return_date'] = result['return_date'].dt.strftime('%Y-%m-%d')
+        return result
@@ -0,0 +1,135 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Raw columns produced by the extractors before validation, all as text
+RAW_COLUMNS = ['return_date', 'territory_key', 'product_key', 'return_quantity']
+
+# Reason codes written to the quarantine files
+REASON_MISSING_FIELDS = 'missing_fields'
+REASON_INVALID_DATE = 'invalid_date'
+REASON_DATE_OUT_OF_RANGE = 'date_out_of_range'
+REASON_INVALID_QUANTITY = 'invalid_quantity'
+REASON_NEGATIVE_QUANTITY = 'negative_quantity'
+REASON_UNKNOWN_TERRITORY = 'unknown_territory'
+REASON_INVALID_PRODUCT_KEY = 'invalid_product_key'
+REASON_UNKNOWN_PRODUCT = 'unknown_product'
+
+# Accepted return date range; the upper bound defaults to today
+MIN_RETURN_DATE = pd.Timestamp('2000-01-01')
+
+# Quantities must be below this in magnitude to be stored as int64
+INT64_LIMIT = 2.0 ** 63
+
+# AdventureWorks sales territories
+TERRITORY_KEYS = frozenset(str(key) for key in range(1, 11))
+
+_quarantine_lock = threading.Lock()
+
+
+# Split whitespace-separated text lines into the raw return columns
+def split_return_lines(lines):
+    lines = pd.Series(lines, dtype='object').str.strip()
+    lines = lines[lines != '']
+    parts = lines.str.split(n=4, expand=True) if len(lines) else pd.DataFrame(columns=range(4))
+    for column in range(4):
+        if column not in parts.columns:
+            parts[column] = None
+    raw = parts[[0, 1, 2, 3]].reset_index(drop=True)
+    raw.columns = RAW_COLUMNS
+    return raw
+
+
+# Parse raw date strings; without a format, strict m/d/Y is tried before mixed formats
+def parse_return_dates(values, date_format='%m/%d/%Y'):
+    parsed = pd.to_datetime(values, format=date_format or '%m/%d/%Y', errors='coerce')
+    if date_format is None:
+        retry = parsed.isna() & values.notna()
+        if retry.any():
+            parsed[retry] = pd.to_datetime(values[retry], format='mixed', errors='coerce')
+    return parsed
+
+
+def validate_returns(raw, source_file, date_format='%m/%d/%Y', min_date=None, max_date=None,
+                     territory_keys=None, product_keys=None):
+    """
+    Validate a batch of raw return rows with vectorized checks.
+    Args:
+        raw (DataFrame): Text columns RAW_COLUMNS, one row per source record
+        source_file (str): File name recorded on every row
+        date_format (str): Expected date format, or None to also accept other formats
+        min_date, max_date: Accepted return date range (default MIN_RETURN_DATE to today)
+        territory_keys (set): Valid territory keys (default TERRITORY_KEYS)
+        product_keys (set): Valid product keys; only checked when given
+    Returns:
+        (accepted, rejected) frames; accepted has typed record columns, rejected
+        keeps the raw text plus a '|'-separated 'reason' column
+    """
+    min_date = pd.Timestamp(min_date) if min_date is not None else MIN_RETURN_DATE
+    max_date = pd.Timestamp(max_date) if max_date is not None else pd.Timestamp.now().normalize()
+    territory_keys = TERRITORY_KEYS if territory_keys is None else territory_keys
+
+    raw = raw[RAW_COLUMNS].reset_index(drop=True)
+    text = raw.astype('object').apply(lambda column: column.astype('str').str.strip().where(column.notna()))
+    text = text.mask(text == '')
+
+    missing = text.isna().any(axis=1)
+    dates = parse_return_dates(text['return_date'], date_format)
+    quantities = pd.to_numeric(text['return_quantity'], errors='coerce')
+    # Whole numbers that fit in the int64 column; 'inf' and '1e30' parse as floats but do not
+    whole = (quantities.notna() & np.isfinite(quantities) & (quantities.abs() < INT64_LIMIT) &
+             (quantities == quantities.round()))
+    territory_keys_text = text['territory_key'].astype('object')
+    product_keys_text = text['product_key'].astype('object')
+
+    checks = [
+        (REASON_MISSING_FIELDS, missing),
+        (REASON_INVALID_DATE, ~missing & dates.isna()),
+        (REASON_DATE_OUT_OF_RANGE, dates.notna() & ((dates < min_date) | (dates > max_date))),
+        (REASON_INVALID_QUANTITY, ~missing & ~whole),
+        (REASON_NEGATIVE_QUANTITY, whole & (quantities < 0)),
+        (REASON_UNKNOWN_TERRITORY, ~missing & ~territory_keys_text.isin(territory_keys)),
+        (REASON_INVALID_PRODUCT_KEY, ~missing & ~product_keys_text.str.fullmatch(r'\d+', na=False)),
+    ]
+    if product_keys is not None:
+        checks.append((REASON_UNKNOWN_PRODUCT, ~missing & ~product_keys_text.isin(product_keys)))
+
+    reasons = pd.Series('', index=text.index, dtype='object')
+    for code, failed in checks:
+        reasons = reasons.mask(failed, reasons + '|' + code)
+    rejected_mask = reasons != ''
+
+    accepted_mask = ~rejected_mask
+    accepted = pd.DataFrame({
+        'return_date': dates[accepted_mask].dt.normalize(),
+        'territory_key': territory_keys_text[accepted_mask],
+        'product_key': product_keys_text[accepted_mask],
+        'return_quantity': quantities[accepted_mask].astype('int64'),
+        'source_file': source_file,
+    }).reset_index(drop=True)
+
+    rejected = raw[rejected_mask].copy()
+    rejected.insert(0, 'row_number', rejected.index + 1)
+    rejected.insert(0, 'source_file', source_file)
+    rejected['reason'] = reasons[rejected_mask].str[1:]
+    return accepted, rejected.reset_index(drop=True)
+
+
+# Write a source file's rejected rows to <quarantine_dir>/<source_file>.rejects.csv.
+# Each extraction replaces the file, so re-reading a lake file never duplicates rejects.
+def write_quarantine(rejected, source_file, quarantine_dir):
+    path = os.path.join(quarantine_dir, f"{source_file}.rejects.csv")
+    with _quarantine_lock:
+        if rejected.empty:
+            if os.path.exists(path):
+                os.remove(path)
+            return None
+        os.makedirs(quarantine_dir, exist_ok=True)
+        out = rejected.copy()
+        out.insert(0, 'quarantined_at', pd.Timestamp.now().isoformat(timespec='seconds'))
+        tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+        out.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    return path
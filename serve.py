@@ -0,0 +1,62 @@
+import os
+import sys
+import argparse
+import multiprocessing
+
+from shared_cache import CACHE_DIR_ENV
+
+# Production entry points: (import path, server) per app
+APPS = {
+    'returns': ('data_lake_solution:app', 'gunicorn'),  # Flask returns API (SQL Server)
+    'purchases': ('purchase_data_api:app', 'uvicorn'),  # FastAPI purchases API
+    'purchases-postgres': ('test:app', 'gunicorn'),  # Flask purchases API (PostgreSQL)
+}
+
+DEFAULT_CACHE_DIR = '.lake_cache'
+
+
+def default_workers():
+    return multiprocessing.cpu_count() * 2 + 1
+
+
+def build_gunicorn_argv(target, host, port, workers, threads, timeout):
+    return [
+        sys.executable, '-m', 'gunicorn',
+        '--bind', f"{host}:{port}",
+        '--workers', str(workers),
+        '--threads', str(threads),
+        '--timeout', str(timeout),
+        '--access-logfile', '-',
+        target,
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run an API with multiple worker processes")
+    parser.add_argument('app', choices=sorted(APPS), help="Which API to serve")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=default_workers(), help="Worker processes")
+    parser.add_argument('--threads', type=int, default=4, help="Threads per gunicorn worker")
+    parser.add_argument('--timeout', type=int, default=300, help="Worker timeout in seconds (full-lake parses are slow)")
+    parser.add_argument('--cache-dir', default=os.environ.get(CACHE_DIR_ENV, DEFAULT_CACHE_DIR),
+                        help="On-disk cache of extracted files shared by the workers")
+    args = parser.parse_args(argv)
+
+    # Workers read the cache location at import time
+    os.makedirs(args.cache_dir, exist_ok=True)
+    os.environ[CACHE_DIR_ENV] = os.path.abspath(args.cache_dir)
+
+    target, server = APPS[args.app]
+    if server == 'gunicorn':
+        command = build_gunicorn_argv(target, args.host, args.port, args.workers, args.threads, args.timeout)
+        print(f"Starting {target} with {args.workers} gunicorn workers on {args.host}:{args.port}")
+        os.execv(sys.executable, command)
+    else:
+        import uvicorn
+        print(f"Starting {target} with {args.workers} uvicorn workers on {args.host}:{args.port}")
+        uvicorn.run(target, host=args.host, port=args.port, workers=args.workers, timeout_keep_alive=30)
+
+
+if __name__ == "__main__":
+    main()
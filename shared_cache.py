@@ -0,0 +1,131 @@
+import os
+import hashlib
+import threading
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking, each process may extract once
+    fcntl = None
+
+# Directory shared by all worker processes; unset disables the shared cache
+CACHE_DIR_ENV = 'LAKE_CACHE_DIR'
+
+# Entries are locked through byte ranges of one lock file per cache directory;
+# entries whose key hashes to the same byte share a lock
+LOCK_FILE = '.lock'
+LOCK_STRIPES = 1024
+
+# lockf() locks belong to the process, so every cache of one directory in this
+# process shares its thread locks and lock file: lock path -> (file, stripe locks)
+_directory_locks = {}
+_directory_locks_guard = threading.Lock()
+
+
+def _locks_for(lock_path):
+    with _directory_locks_guard:
+        locks = _directory_locks.get(lock_path)
+        if locks is None:
+            # Kept open: closing any descriptor of the file would drop this process's locks on it
+            lock_file = open(lock_path, 'a+') if fcntl is not None else None
+            locks = _directory_locks[lock_path] = (lock_file, [threading.Lock() for _ in range(LOCK_STRIPES)])
+        return locks
+
+
+class SharedFileCache:
+    """
+    Cross-process on-disk cache of per-file extraction results.
+    Entries are keyed by the source path, its (size, mtime) signature and
+    the version of everything else the extraction depends on, e.g. the
+    validation rules. The first worker that needs a file extracts it under
+    an exclusive lock and stores the frame; the other workers wait on the
+    lock and read the stored frame instead of reparsing the file.
+    Args:
+        cache_dir (str): Directory shared by the worker processes
+        namespace (str): Keeps caches of different extractors apart
+        version (callable): Returns the current version of the extraction's other inputs, or None
+    """
+
+    def __init__(self, cache_dir, namespace, version=None):
+        self.directory = os.path.join(cache_dir, namespace)
+        self.version = version
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock_file, self._thread_locks = _locks_for(os.path.abspath(os.path.join(self.directory, LOCK_FILE)))
+
+    @classmethod
+    def from_env(cls, namespace, version=None):
+        """Create a cache in $LAKE_CACHE_DIR, or return None when it is not set."""
+        cache_dir = os.environ.get(CACHE_DIR_ENV)
+        return cls(cache_dir, namespace, version) if cache_dir else None
+
+    def _entry_path(self, path, signature):
+        key = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()[:20]
+        size, mtime_ns = signature
+        version = self.version() if self.version is not None else None
+        suffix = f"-{hashlib.sha1(str(version).encode('utf-8')).hexdigest()[:12]}" if version is not None else ''
+        return os.path.join(self.directory, f"{key}-{size}-{mtime_ns}{suffix}.pkl")
+
+    @contextmanager
+    def _locked(self, entry_path):
+        # Threads of one process serialize on the entry's stripe; processes on
+        # a lockf() byte range of the shared lock file
+        stripe = int(hashlib.sha1(entry_path.encode('utf-8')).hexdigest()[:8], 16) % LOCK_STRIPES
+        with self._thread_locks[stripe]:
+            if self._lock_file is None:
+                yield
+                return
+            fcntl.lockf(self._lock_file, fcntl.LOCK_EX, 1, stripe)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._lock_file, fcntl.LOCK_UN, 1, stripe)
+
+    @staticmethod
+    def _read(entry_path):
+        try:
+            return pd.read_pickle(entry_path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Discarding unreadable cache entry {entry_path}: {e}")
+            return None
+
+    def get_or_extract(self, path, signature, extract_func):
+        """
+        Get the extraction result of a file, extracting it at most once across processes.
+        Args:
+            path (str): Source file
+            signature (tuple): (size, mtime_ns) of the source file
+            extract_func (callable): Extracts the file into a DataFrame
+        Returns:
+            The extracted DataFrame
+        """
+        entry_path = self._entry_path(path, signature)
+        frame = self._read(entry_path)
+        if frame is not None:
+            return frame
+        with self._locked(entry_path):
+            # Another worker may have stored it while this one waited
+            frame = self._read(entry_path)
+            if frame is not None:
+                return frame
+            frame = extract_func(path)
+            if isinstance(frame, pd.DataFrame):
+                tmp_path = f"{entry_path}.tmp-{os.getpid()}-{threading.get_ident()}"
+                frame.to_pickle(tmp_path)
+                os.replace(tmp_path, entry_path)
+                self._remove_stale(entry_path)
+            return frame
+
+    def _remove_stale(self, entry_path):
+        # Drop entries of older versions of the same source file
+        prefix = os.path.basename(entry_path).split('-', 1)[0] + '-'
+        current = os.path.basename(entry_path)
+        for name in os.listdir(self.directory):
+            if name.startswith(prefix) and name != current:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
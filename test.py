@@ -6,6 +6,9 @@ import pandas as pd
 from flask import Flask, jsonify, request 
 from sqlalchemy import create_engine
 from sqlalchemy.exc import SQLAlchemyError
+from checkpointed_load import CheckpointedLoader, LoadError
+from pg_copy import bulk_insert_method, copy_replace_table, is_postgres
+from lake_files import list_lake_files
 
 
 # Define directories for CSV, PDF, and TXT files
@@ -15,17 +18,23 @@ txt_dir = "data_lake/txt"
 
 app = Flask(__name__)
 
-# Retrieve PostgreSQL credentials from environment variables
-pwd = os.environ['PGPASS']
-uid = os.environ['PGIUD']
-
 # PostgreSQL connection details
 pg_host = "localhost"
 pg_port = "5432"
 pg_database = "adventureworks"
 
-# PostgreSQL connection string using SQLAlchemy
-postgresql_connection_string = f"postgresql://{uid}:{pwd}@{pg_host}:{pg_port}/{pg_database}"
+# Optional SQLAlchemy URL override, e.g. a local SQLite stand-in for benchmarks
+postgresql_connection_string = os.environ.get('PURCHASES_DATABASE_URL')
+
+if postgresql_connection_string:
+    uid = os.environ.get('PGIUD')
+else:
+    # Retrieve PostgreSQL credentials from environment variables
+    pwd = os.environ['PGPASS']
+    uid = os.environ['PGIUD']
+
+    # PostgreSQL connection string using SQLAlchemy
+    postgresql_connection_string = f"postgresql://{uid}:{pwd}@{pg_host}:{pg_port}/{pg_database}"
 
 # Create PostgreSQL engine using SQLAlchemy
 engine = create_engine(postgresql_connection_string)
@@ -117,52 +126,68 @@ def process_all_files():
         (pdf_dir, '.pdf', extract_from_pdf),
         (txt_dir, '.txt', extract_from_txt)
     ]:
-        if os.path.exists(directory):
-            for file_name in os.listdir(directory):
-                if file_name.endswith(file_type):
-                    file_path = os.path.join(directory, file_name)
-                    data = process_func(file_path)
-                    all_purchase_data.extend(data)
-                    print(f"Processed {file_type.upper()} file: {file_name}")
-                    if data:
-                        print(f"Found {len(data)} records in {file_name}")
+        for file_path, _ in list_lake_files(directory, file_type):
+            file_name = os.path.basename(file_path)
+            data = process_func(file_path)
+            all_purchase_data.extend(data)
+            print(f"Processed {file_type.upper()} file: {file_name}")
+            if data:
+                print(f"Found {len(data)} records in {file_name}")
     return all_purchase_data
 
-# Function to insert purchase data into PostgreSQL
+# Chunked loads into the purchases table with a checkpoint per source file;
+# on PostgreSQL each chunk is streamed through COPY FROM STDIN
+purchases_loader = CheckpointedLoader(engine, 'purchases', method=bulk_insert_method(engine))
+
+# Typed purchase rows ready to load, without rows that fail to parse
+def prepare_purchase_frame(purchase_data):
+    df = pd.DataFrame(purchase_data)
+
+    # Ensure data types are correct
+    df['purchase_date'] = pd.to_datetime(df['purchase_date'], errors='coerce')
+    df['total_amount'] = pd.to_numeric(df['total_amount'], errors='coerce')
+
+    # Drop any rows with invalid data
+    return df.dropna()
+
+# Function to insert purchase data into PostgreSQL. Each chunk commits with
+# its checkpoint, so a retry after a failure only loads the remaining chunks;
+# LoadError is raised once retries are exhausted.
 def insert_into_postgres(purchase_data):
     print(f"Current PostgreSQL user: {uid}")  # Add this line
-    try:
-        if purchase_data:
-            df = pd.DataFrame(purchase_data)
-            
-            # Ensure data types are correct
-            df['purchase_date'] = pd.to_datetime(df['purchase_date'], errors='coerce')
-            df['total_amount'] = pd.to_numeric(df['total_amount'], errors='coerce')
-            
-            # Drop any rows with invalid data
-            df = df.dropna()
-            
-            if not df.empty:
-                # Add a timestamp column to track insertion time
-                df['inserted_at'] = pd.Timestamp.now()
-                
-                # Use if_exists='append' to add new data to existing table
-                df.to_sql('purchases', engine, if_exists='append', index=False)
-                print(f"Successfully inserted {len(df)} records into PostgreSQL")
-                return len(df)
-            else:
-                print("No valid data to insert after cleaning")
-                return 0
-        else:
-            print("No data to insert into PostgreSQL")
-            return 0
-    except SQLAlchemyError as e:
-        print(f"SQLAlchemy Error inserting data into PostgreSQL: {e}")
+    if not purchase_data:
+        print("No data to insert into PostgreSQL")
         return 0
-    except Exception as e:
-        print(f"Unexpected error inserting data into PostgreSQL: {e}")
+
+    df = prepare_purchase_frame(purchase_data)
+
+    if df.empty:
+        print("No valid data to insert after cleaning")
         return 0
 
+    try:
+        stats = purchases_loader.load(df)
+    except LoadError as e:
+        print(f"Error inserting data into PostgreSQL: {e} (committed {e.stats['rows_loaded']} records before the failure)")
+        raise
+    print(f"Successfully inserted {stats['rows_loaded']} records into PostgreSQL"
+          f" ({stats['rows_skipped']} already loaded by an earlier run)")
+    return stats['rows_loaded']
+
+# Function to replace the purchases table with the given data: rows are
+# COPYed into an unlogged staging table that is swapped in atomically
+def replace_postgres_table(purchase_data):
+    df = prepare_purchase_frame(purchase_data) if purchase_data else pd.DataFrame()
+    if df.empty:
+        print("No valid data to replace the purchases table with")
+        return 0
+    rows = copy_replace_table(engine, 'purchases', df.assign(inserted_at=pd.Timestamp.now()))
+    # The table now holds exactly these rows; later appends of them are no-ops
+    purchases_loader.clear()
+    purchases_loader.mark_loaded(df)
+    print(f"Replaced the purchases table with {rows} records")
+    return rows
+
 # API endpoint to get all purchase data with save option
 @app.route('/api/purchases', methods=['GET'])
 def get_purchases():
@@ -171,8 +196,22 @@ def get_purchases():
     # Check if save to PostgreSQL is requested via query parameter
     save_to_postgres = request.args.get('save', 'false').lower() == 'true'
     
-    if save_to_postgres:
-        inserted_count = insert_into_postgres(purchase_data)
+    # ?mode=replace swaps in a freshly COPYed table instead of appending (PostgreSQL only)
+    replace_table = request.args.get('mode', 'append').lower() == 'replace'
+
+    if save_to_postgres and replace_table:
+        if not is_postgres(engine):
+            return jsonify({"error": "mode=replace requires PostgreSQL"}), 400
+        inserted_count = replace_postgres_table(purchase_data)
+        response_message = {
+            "data": purchase_data,
+            "message": f"Replaced the purchases table with {inserted_count} records"
+        }
+    elif save_to_postgres:
+        try:
+            inserted_count = insert_into_postgres(purchase_data)
+        except LoadError as e:
+            return jsonify({"error": str(e), "load": e.stats}), 503
         response_message = {
             "data": purchase_data,
             "message": f"Inserted {inserted_count} records into PostgreSQL"
@@ -206,8 +245,11 @@ def get_summary():
             save_to_postgres = request.args.get('save', 'false').lower() == 'true'
             
             if save_to_postgres:
-                insert_into_postgres(purchase_data)
-                summary["message"] = f"Inserted {total_purchases} records into PostgreSQL"
+                try:
+                    inserted_count = insert_into_postgres(purchase_data)
+                except LoadError as e:
+                    return jsonify({"error": str(e), "load": e.stats}), 503
+                summary["message"] = f"Inserted {inserted_count} records into PostgreSQL"
             else:
                 summary["message"] = "Summary retrieved but not saved to PostgreSQL. Add ?save=true to save."
             
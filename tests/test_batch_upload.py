@@ -0,0 +1,132 @@
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+import batch_upload
+from batch_upload import STATUS_ERROR, STATUS_LOADED, STATUS_SAVED, STATUS_SKIPPED, BatchUploader
+
+CSV = b'ReturnDate,TerritoryKey,ProductKey,ReturnQuantity\n1/1/2011,2,781,1\n'
+
+
+def zip_archive(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def tar_archive(members, symlinks=()):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        for name, data in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+        for name, target in symlinks:
+            info = tarfile.TarInfo(name)
+            info.type, info.linkname = tarfile.SYMTYPE, target
+            archive.addfile(info)
+    buffer.seek(0)
+    return buffer
+
+
+class Unseekable(io.RawIOBase):
+    def __init__(self, data):
+        self._data = io.BytesIO(data)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        return self._data.readinto(buffer)
+
+
+@pytest.fixture
+def lake(tmp_path):
+    directory = tmp_path / 'lake' / 'csv'
+    directory.mkdir(parents=True)
+    return directory
+
+
+# Data lines of a published file, standing in for the returns extractor
+def count_rows(path):
+    with open(path) as file:
+        return [None] * (sum(1 for _ in file) - 1)
+
+
+def make_uploader(lake, extract_func=count_rows):
+    def directory_for(file_name):
+        return str(lake) if file_name.lower().endswith('.csv') else None
+
+    return BatchUploader(directory_for, extract_func, max_workers=2)
+
+
+# Every file written under root, apart from publish_file's lock files
+def lake_files(root):
+    return sorted(os.path.relpath(os.path.join(directory, name), root)
+                  for directory, _, names in os.walk(root) if '.locks' not in directory for name in names)
+
+
+@pytest.mark.parametrize('archive', [zip_archive, tar_archive])
+def test_member_paths_are_flattened_into_the_lake_folder(lake, tmp_path, archive):
+    uploaded = archive({
+        '../../Returns Jan 2011.csv': CSV,
+        '/etc/Returns Feb 2011.csv': CSV,
+        'nested/dir/Returns Mar 2011.csv': CSV,
+        'windows\\..\\..\\Returns Apr 2011.csv': CSV,
+    })
+    result = make_uploader(lake).ingest([('returns.zip' if archive is zip_archive else 'returns.tgz', uploaded)])
+
+    assert result['counts'][STATUS_LOADED] == 4
+    assert result['rows'] == 4
+    assert lake_files(tmp_path) == [os.path.join('lake', 'csv', f'Returns_{month}_2011.csv')
+                                          for month in ('Apr', 'Feb', 'Jan', 'Mar')]
+
+
+def test_non_data_members_are_rejected(lake, tmp_path):
+    uploaded = tar_archive({
+        'Returns Jan 2011.csv': CSV,
+        'setup.exe': b'MZ',
+        '.hidden.csv': CSV,
+        '__MACOSX/._Returns Jan 2011.csv': b'\x00',
+    }, symlinks=[('Returns Feb 2011.csv', '/etc/passwd')])
+    result = make_uploader(lake).ingest([('returns.tar.gz', uploaded)])
+
+    assert {(item['member'], item['status']) for item in result['files']} == {
+        ('Returns Jan 2011.csv', STATUS_LOADED), ('setup.exe', STATUS_SKIPPED)}
+    assert lake_files(tmp_path) == [os.path.join('lake', 'csv', 'Returns_Jan_2011.csv')]
+
+
+def test_plain_files_and_unseekable_zips(lake):
+    uploads = [('Returns Jan 2011.csv', io.BytesIO(CSV)),
+               ('more.zip', Unseekable(zip_archive({'Returns Feb 2011.csv': CSV}).getvalue()))]
+    result = make_uploader(lake).ingest(uploads)
+    assert [item['status'] for item in result['files']] == [STATUS_LOADED, STATUS_LOADED]
+    assert sorted(os.listdir(lake)) == ['.locks', 'Returns_Feb_2011.csv', 'Returns_Jan_2011.csv']
+
+
+def test_unreadable_archives_and_member_limit(lake, monkeypatch):
+    monkeypatch.setattr(batch_upload, 'MAX_MEMBERS', 2)
+    members = {f'Returns {month} 2011.csv': CSV for month in ('Jan', 'Feb', 'Mar')}
+    result = make_uploader(lake).ingest([('broken.zip', io.BytesIO(b'not a zip')),
+                                         ('many.tar', tar_archive(members))])
+
+    errors = [item for item in result['files'] if item['status'] == STATUS_ERROR]
+    assert [item['source'] for item in errors] == ['broken.zip', 'many.tar']
+    assert 'more than 2 files' in errors[1]['error']
+    assert result['counts'][STATUS_LOADED] == 2
+
+
+def test_failed_extraction_keeps_the_published_file(lake):
+    def fail(path):
+        raise ValueError('bad rows')
+
+    result = make_uploader(lake, fail).ingest([('Returns Jan 2011.csv', io.BytesIO(CSV))])
+    assert result['files'][0]['status'] == STATUS_SAVED
+    assert 'bad rows' in result['files'][0]['error']
+    assert (lake / 'Returns_Jan_2011.csv').exists()
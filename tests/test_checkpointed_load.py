@@ -0,0 +1,198 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, exc
+
+from checkpointed_load import CheckpointedLoader, LoadError, is_transient_error, retry_with_backoff
+
+RECORD_COLUMNS = ['return_date', 'territory_key', 'product_key', 'return_quantity', 'source_file']
+
+
+def returns_frame(source_file, quantities):
+    return pd.DataFrame({
+        'return_date': pd.Timestamp('2011-06-01'),
+        'territory_key': '1',
+        'product_key': [str(310 + index) for index in range(len(quantities))],
+        'return_quantity': quantities,
+        'source_file': source_file,
+    })
+
+
+def table_rows(engine, table='Returns'):
+    return pd.read_sql(f'SELECT * FROM "{table}" ORDER BY source_file, product_key', engine)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    return create_engine(f"sqlite:///{tmp_path / 'load.db'}")
+
+
+def make_loader(engine, **kwargs):
+    kwargs.setdefault('chunk_rows', 2)
+    return CheckpointedLoader(engine, 'Returns', columns=RECORD_COLUMNS, retries=0, **kwargs)
+
+
+def test_resave_inserts_nothing(engine):
+    loader = make_loader(engine)
+    frame = pd.concat([returns_frame('Jan.csv', [1, 2, 3]), returns_frame('Feb.csv', [4])])
+    assert loader.load(frame)['rows_loaded'] == 4
+
+    stats = loader.load(frame)
+    assert stats['rows_loaded'] == 0
+    assert stats['rows_skipped'] == 4
+    assert len(table_rows(engine)) == 4
+
+
+def test_resumes_after_failed_chunk(engine, monkeypatch):
+    loader = make_loader(engine)
+    frame = returns_frame('Jan.csv', [1, 2, 3, 4, 5])
+    commit_chunk = loader._commit_chunk
+
+    def fail_on_second_chunk(source_file, fingerprint, chunk_index, total_chunks, chunk):
+        if chunk_index == 1:
+            raise ValueError('connection lost')
+        return commit_chunk(source_file, fingerprint, chunk_index, total_chunks, chunk)
+
+    monkeypatch.setattr(loader, '_commit_chunk', fail_on_second_chunk)
+    with pytest.raises(LoadError) as failure:
+        loader.load(frame)
+    assert failure.value.stats['rows_loaded'] == 2
+    assert len(table_rows(engine)) == 2
+
+    monkeypatch.setattr(loader, '_commit_chunk', commit_chunk)
+    stats = loader.load(frame)
+    assert stats['rows_skipped'] == 2
+    assert stats['rows_loaded'] == 3
+    assert table_rows(engine)['return_quantity'].tolist() == [1, 2, 3, 4, 5]
+
+
+def test_changed_file_replaces_its_rows(engine):
+    loader = make_loader(engine)
+    loader.load(pd.concat([returns_frame('Jan.csv', [1, 2, 3]), returns_frame('Feb.csv', [4])]))
+
+    corrected = returns_frame('Jan.csv', [1, 20, 3])
+    assert loader.load(corrected)['rows_loaded'] == 3
+
+    rows = table_rows(engine)
+    assert rows.groupby('source_file').size().to_dict() == {'Feb.csv': 1, 'Jan.csv': 3}
+    assert rows[rows['source_file'] == 'Jan.csv']['return_quantity'].tolist() == [1, 20, 3]
+    assert loader.checkpoint('Jan.csv')['rows_loaded'] == 3
+
+
+def test_extra_columns_are_not_loaded_or_fingerprinted(engine):
+    loader = make_loader(engine)
+    frame = returns_frame('Jan.csv', [1, 2])
+    loader.load(frame)
+
+    enriched = frame.assign(product_name='Road Bike', territory_name='Northwest')
+    assert loader.load(enriched)['rows_loaded'] == 0
+    assert 'product_name' not in table_rows(engine).columns
+
+
+def test_transient_errors_are_retried(engine, monkeypatch):
+    loader = CheckpointedLoader(engine, 'Returns', columns=RECORD_COLUMNS, retries=2, base_delay=0)
+    commit_chunk = loader._commit_chunk
+    failures = [exc.OperationalError('INSERT', {}, Exception('server closed the connection'),
+                                     connection_invalidated=True)]
+
+    def flaky(*args):
+        if failures:
+            raise failures.pop()
+        return commit_chunk(*args)
+
+    monkeypatch.setattr(loader, '_commit_chunk', flaky)
+    assert loader.load(returns_frame('Jan.csv', [1, 2]))['rows_loaded'] == 2
+
+
+class PgError(Exception):
+    def __init__(self, pgcode):
+        super().__init__(f'SQLSTATE {pgcode}')
+        self.pgcode = pgcode
+
+
+@pytest.mark.parametrize('orig, transient', [
+    (PgError('08006'), True),  # Connection failure
+    (PgError('40P01'), True),  # Deadlock
+    (PgError('40001'), True),  # Serialization failure
+    (PgError('42P01'), False),  # Undefined table
+    (Exception('40001', '[40001] [SQL Server]Transaction was deadlocked (1205) (SQLExecDirectW)'), True),
+    (Exception('HYT00', '[HYT00] Query timeout expired (0) (SQLExecDirectW)'), True),
+    (Exception('42S02', "[42S02] [SQL Server]Invalid object name 'Returns'. (208) (SQLExecDirectW)"), False),
+    (Exception(1205, b'Transaction was deadlocked'), True),
+    (Exception('server closed the connection'), False),
+])
+def test_transient_error_codes(orig, transient):
+    assert is_transient_error(exc.OperationalError('INSERT', {}, orig)) is transient
+
+
+def test_missing_table_fails_without_retry(engine):
+    sleeps = []
+
+    def query():
+        with engine.connect() as conn:
+            conn.exec_driver_sql('SELECT * FROM missing_table')
+
+    with pytest.raises(exc.OperationalError, match='no such table'):
+        retry_with_backoff(query, retries=3, sleep=sleeps.append)
+    assert sleeps == []
+
+
+def test_locked_database_is_retried(engine):
+    sleeps = []
+    with engine.connect() as locker:
+        locker.exec_driver_sql('BEGIN EXCLUSIVE')
+        locked = create_engine(engine.url, connect_args={'timeout': 0})
+
+        def query():
+            if len(sleeps) == 2:
+                locker.rollback()
+            with locked.connect() as conn:
+                return conn.exec_driver_sql('SELECT count(*) FROM sqlite_master').scalar()
+
+        assert retry_with_backoff(query, retries=3, base_delay=0, sleep=sleeps.append) == 0
+    assert len(sleeps) == 2
+
+def race_after_checkpoint_read(monkeypatch, loader, other_load, chunk_index=0):
+    # Run other_load right after loader reads the checkpoint to commit chunk_index
+    read_checkpoint = loader.checkpoint
+    reads = []
+
+    def checkpoint(source_file, conn=None):
+        row = read_checkpoint(source_file, conn)
+        if conn is not None:
+            reads.append(source_file)
+            if len(reads) == chunk_index + 1:
+                other_load()
+        return row
+
+    monkeypatch.setattr(loader, 'checkpoint', checkpoint)
+
+
+def test_interleaved_loaders_commit_each_chunk_once(engine, monkeypatch):
+    first, second = make_loader(engine), make_loader(engine)
+    frame = returns_frame('Jan.csv', [1, 2, 3, 4, 5])
+    race_after_checkpoint_read(monkeypatch, first, lambda: second.load(frame), chunk_index=1)
+
+    stats = first.load(frame)
+    assert (stats['rows_loaded'], stats['rows_skipped']) == (2, 3)
+    assert table_rows(engine)['return_quantity'].tolist() == [1, 2, 3, 4, 5]
+    assert first.checkpoint('Jan.csv')['rows_loaded'] == 5
+
+
+def test_interleaved_first_loads_do_not_duplicate(engine, monkeypatch):
+    first, second = make_loader(engine), make_loader(engine)
+    frame = returns_frame('Jan.csv', [1, 2, 3])
+    race_after_checkpoint_read(monkeypatch, first, lambda: second.load(frame))
+
+    stats = first.load(frame)
+    assert stats['rows_loaded'] == 0
+    assert table_rows(engine)['return_quantity'].tolist() == [1, 2, 3]
+
+
+def test_interleaved_loads_of_changed_content_do_not_mix(engine, monkeypatch):
+    first, second = make_loader(engine), make_loader(engine)
+    old, new = returns_frame('Jan.csv', [1, 2, 3, 4, 5]), returns_frame('Jan.csv', [6, 7, 8, 9, 10])
+    race_after_checkpoint_read(monkeypatch, first, lambda: second.load(new), chunk_index=1)
+
+    first.load(old)  # Finishes last, so its content replaces the other loader's
+    assert table_rows(engine)['return_quantity'].tolist() == [1, 2, 3, 4, 5]
+    assert first.checkpoint('Jan.csv')['rows_loaded'] == 5
@@ -0,0 +1,43 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_process_calculate import PURCHASE_COLUMNS, save_results, save_results_chunked
+
+
+def purchase_chunks(n_chunks, rows, seed):
+    rng = random.Random(seed)
+    ids = ['', None, 'P000', 'P001', 'P010', 'P2', 'p001', 'P001 ']
+    chunks = []
+    for index in range(n_chunks):
+        chunks.append(pd.DataFrame({
+            'Purchase_ID': pd.Series([rng.choice(ids) for _ in range(rows)], dtype='object'),
+            'Total_Amount': [rng.choice([np.nan, 738.3, 12.0, 0.5, 1e6]) for _ in range(rows)],
+            'Source_File': f'Purchases {index:02d}.txt',
+        }, columns=PURCHASE_COLUMNS))
+    return chunks
+
+
+@pytest.mark.parametrize('seed', [1, 2, 3])
+def test_chunked_output_matches_in_memory_sort(tmp_path, seed):
+    chunks = purchase_chunks(7, 25, seed)
+    expected, actual = tmp_path / 'expected.csv', tmp_path / 'actual.csv'
+    save_results(pd.concat(chunks, ignore_index=True), str(expected))
+    stats = save_results_chunked(iter(chunks), str(actual), spill_dir=str(tmp_path), fan_in=2)
+    assert stats['runs'] == 7
+    assert actual.read_bytes() == expected.read_bytes()
+
+
+def test_empty_ids_sort_first_and_missing_ids_last(tmp_path):
+    chunks = [pd.DataFrame({'Purchase_ID': ['P000', None], 'Total_Amount': [1.0, 2.0], 'Source_File': 'a.csv'}),
+              pd.DataFrame({'Purchase_ID': ['', 'P001'], 'Total_Amount': [738.3, np.nan], 'Source_File': 'b.txt'})]
+    output = tmp_path / 'out.csv'
+    save_results_chunked(iter(chunks), str(output), spill_dir=str(tmp_path), fan_in=2)
+    lines = output.read_text().splitlines()
+    assert lines[1:] == [',738.3,b.txt', 'P000,1.0,a.csv', 'P001,,b.txt', ',2.0,a.csv']
+
+
+def test_no_rows_writes_nothing(tmp_path):
+    assert save_results_chunked(iter([]), str(tmp_path / 'out.csv'), spill_dir=str(tmp_path)) is None
@@ -0,0 +1,55 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import fast_json
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        'return_quantity': [1, 2, 3],
+        'return_date': pd.to_datetime(['2011-01-01', None, '2011-01-01']),
+        'territory_key': ['2', None, '10'],
+        'amount': [1.5, np.nan, 3.0],
+    })
+
+
+@pytest.mark.parametrize('batch_rows', [1, 2, 100])
+def test_records_match_the_standard_encoder(frame, batch_rows):
+    encoded = fast_json.dumps_records(frame, sort_keys=True, batch_rows=batch_rows)
+    assert json.loads(encoded) == [
+        {'amount': 1.5, 'return_date': '2011-01-01', 'return_quantity': 1, 'territory_key': '2'},
+        {'amount': None, 'return_date': None, 'return_quantity': 2, 'territory_key': None},
+        {'amount': 3.0, 'return_date': '2011-01-01', 'return_quantity': 3, 'territory_key': '10'},
+    ]
+    assert list(json.loads(encoded)[0]) == sorted(frame.columns)
+
+
+def test_records_keep_column_order_without_sort_keys(frame):
+    assert list(json.loads(fast_json.dumps_records(frame))[0]) == list(frame.columns)
+
+
+def test_empty_frame_encodes_to_an_empty_array(frame):
+    assert fast_json.dumps_records(frame.iloc[:0]) == b'[]'
+    assert list(fast_json.iter_ndjson_records(frame.iloc[:0])) == []
+
+
+def test_records_embedded_with_other_fields(frame):
+    encoded = fast_json.dumps_with_records(frame.iloc[:1], 'data', {'total': 1, 'count': 1}, sort_keys=True)
+    decoded = json.loads(encoded)
+    assert list(decoded) == ['count', 'data', 'total']
+    assert decoded['data'][0]['return_quantity'] == 1
+
+
+def test_ndjson_lines_match_records(frame):
+    lines = b''.join(fast_json.iter_ndjson_records(frame, batch_rows=2)).splitlines()
+    assert [json.loads(line) for line in lines] == json.loads(fast_json.dumps_records(frame))
+
+
+def test_standard_library_fallback(frame, monkeypatch):
+    expected = fast_json.dumps_records(frame, sort_keys=True)
+    monkeypatch.setattr(fast_json, 'orjson', None)
+    assert json.loads(fast_json.dumps_records(frame, sort_keys=True)) == json.loads(expected)
@@ -0,0 +1,39 @@
+import gzip
+
+from http_cache import ResponseCache, cache_headers, choose_encoding, etag_matches, make_etag
+
+
+def test_choose_encoding_honours_q_zero():
+    assert choose_encoding('gzip, deflate') == 'gzip'
+    assert choose_encoding('gzip;q=0, identity') == 'identity'
+    assert choose_encoding(None) == 'identity'
+
+
+def test_etag_matches_any_coding_of_the_same_version():
+    etag = make_etag('v1', 'month', 'gzip')
+    assert etag == '"v1-month+gzip"'
+    assert etag_matches('"v1-month"', etag)
+    assert etag_matches('W/"v1-month+br", "other"', etag)
+    assert etag_matches('*', etag)
+    assert not etag_matches('"v2-month"', etag)
+    assert not etag_matches(None, etag)
+
+
+def test_response_cache_builds_once_per_version():
+    cache = ResponseCache()
+    builds = []
+
+    def build():
+        builds.append(1)
+        return '{"data": []}'
+
+    assert cache.get('returns', 'v1', 'identity', build) == b'{"data": []}'
+    assert gzip.decompress(cache.get('returns', 'v1', 'gzip', build)) == b'{"data": []}'
+    assert len(builds) == 1
+    cache.get('returns', 'v2', 'identity', build)
+    assert len(builds) == 2
+
+
+def test_cache_headers():
+    assert cache_headers('"v1+gzip"', 'gzip')['Content-Encoding'] == 'gzip'
+    assert 'Content-Encoding' not in cache_headers('"v1"')
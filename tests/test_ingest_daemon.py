@@ -0,0 +1,83 @@
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from ingest_daemon import IngestDaemon, OffsetStore
+from lake_files import LakeScanner
+
+
+def read_rows(path):
+    return pd.read_csv(path).assign(source_file=os.path.basename(path))
+
+
+def write_file(path, values, age_seconds=60):
+    pd.DataFrame({'value': values}).to_csv(path, index=False)
+    written = time.time() - age_seconds
+    os.utime(path, (written, written))
+
+
+@pytest.fixture
+def lake(tmp_path, monkeypatch):
+    monkeypatch.setattr('lake_files.lake_scanner', LakeScanner())
+    directory = tmp_path / 'csv'
+    directory.mkdir()
+    return directory
+
+
+def make_daemon(lake, tmp_path, loaded, **kwargs):
+    kwargs.setdefault('settle_seconds', 5)
+    return IngestDaemon(lambda: [(str(lake), '.csv', read_rows)], loaded.append,
+                        OffsetStore(str(tmp_path / 'offsets.json')), **kwargs)
+
+
+def test_files_are_loaded_once_settled(lake, tmp_path):
+    loaded = []
+    write_file(lake / 'Returns Jan 2011.csv', [1, 2])
+    write_file(lake / 'Returns Feb 2011.csv', [3], age_seconds=0)  # Still being written
+    daemon = make_daemon(lake, tmp_path, loaded)
+
+    assert daemon.run_once() == []  # A file is seen twice with the same signature first
+    stats = daemon.run_once()
+    assert [batch['files'] for batch in stats] == [1]
+    assert loaded[0]['value'].tolist() == [1, 2]
+    assert daemon.run_once() == []
+    assert len(loaded) == 1
+
+
+def test_restart_resumes_after_committed_files(lake, tmp_path):
+    loaded = []
+    for month in ('Jan', 'Feb', 'Mar'):
+        write_file(lake / f'Returns {month} 2011.csv', [1])
+    daemon = make_daemon(lake, tmp_path, loaded, batch_files=2)
+    daemon.poll()
+    assert [batch['files'] for batch in daemon.run_once()] == [2, 1]
+
+    restarted = make_daemon(lake, tmp_path, loaded)
+    write_file(lake / 'Returns Feb 2011.csv', [7, 8])
+    os.remove(lake / 'Returns Mar 2011.csv')
+    restarted.poll()
+    assert [batch['rows'] for batch in restarted.run_once()] == [2]
+    assert loaded[-1]['source_file'].tolist() == ['Returns Feb 2011.csv'] * 2
+    assert sorted(os.path.basename(path) for path in restarted.offsets.offsets) == \
+        ['Returns Feb 2011.csv', 'Returns Jan 2011.csv']
+
+
+def test_failed_batch_is_not_committed(lake, tmp_path):
+    write_file(lake / 'Returns Jan 2011.csv', [1])
+
+    def fail(frame):
+        raise ConnectionError('database unavailable')
+
+    daemon = IngestDaemon(lambda: [(str(lake), '.csv', read_rows)], fail,
+                          OffsetStore(str(tmp_path / 'offsets.json')), settle_seconds=0)
+    daemon.poll()
+    with pytest.raises(ConnectionError):
+        daemon.run_once()
+    assert OffsetStore(str(tmp_path / 'offsets.json')).offsets == {}
+
+    loaded = []
+    retry = make_daemon(lake, tmp_path, loaded, settle_seconds=0)
+    retry.poll()
+    assert [batch['files'] for batch in retry.run_once()] == [1]
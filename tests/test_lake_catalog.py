@@ -0,0 +1,95 @@
+import os
+
+import pandas as pd
+import pytest
+
+from lake_catalog import ORIGIN_NAME, ORIGIN_ROWS, ORIGIN_UNKNOWN, LakeCatalog, parse_month, period_from_name
+from lake_files import LakeScanner
+from returns_store import ReturnsStore
+
+
+@pytest.mark.parametrize('file_name, period', [
+    ('AdventureWorks Returns Data - Jun 2011.csv', '2011-06'),
+    ('AdventureWorks_Returns_Data_-_September_2011.pdf', '2011-09'),
+    ('returns-dec-2010.txt', '2010-12'),
+    ('Returns Jan 2011 to Mar 2011.csv', None),
+    ('Returns Q1.csv', None),
+    ('Summary 2011.csv', None),
+])
+def test_period_from_name(file_name, period):
+    assert period_from_name(file_name) == period
+
+
+def test_parse_month():
+    assert parse_month('2011-06') == '2011-06'
+    assert parse_month('') is None
+    with pytest.raises(ValueError):
+        parse_month('2011-13')
+
+
+def write_csv(path, dates):
+    pd.DataFrame({'ReturnDate': dates, 'TerritoryKey': '1', 'ProductKey': '310',
+                  'ReturnQuantity': 1}).to_csv(path, index=False)
+    return path
+
+
+def test_period_from_rows_when_the_name_has_none(tmp_path):
+    catalog = LakeCatalog()
+    single = str(write_csv(tmp_path / 'Returns Q2.csv', ['5/1/2011', '5/20/2011']))
+    spanning = str(write_csv(tmp_path / 'Returns Q3.csv', ['7/1/2011', '8/20/2011']))
+    assert catalog.period(single, (1, 1)) == '2011-05'
+    assert catalog.period(spanning, (1, 1)) is None
+    assert {entry['file']: entry['origin'] for entry in catalog.entries()} == \
+        {'Returns Q2.csv': ORIGIN_ROWS, 'Returns Q3.csv': ORIGIN_UNKNOWN}
+
+
+def test_period_is_cached_until_the_signature_changes(tmp_path):
+    catalog = LakeCatalog()
+    path = str(write_csv(tmp_path / 'Returns Q2.csv', ['5/1/2011']))
+    assert catalog.period(path, (1, 1)) == '2011-05'
+    write_csv(path, ['6/1/2011'])
+    assert catalog.period(path, (1, 1)) == '2011-05'
+    assert catalog.period(path, (2, 2)) == '2011-06'
+
+
+def test_matches_keeps_files_of_unknown_period(tmp_path):
+    catalog = LakeCatalog()
+    june = str(tmp_path / 'Returns Jun 2011.csv')
+    unknown = str(write_csv(tmp_path / 'Returns.csv', ['5/1/2011', '7/1/2011']))
+    assert catalog.matches(june, (1, 1), '2011-06', '2011-06')
+    assert not catalog.matches(june, (1, 1), '2011-07', None)
+    assert not catalog.matches(june, (1, 1), None, '2011-05')
+    assert catalog.matches(unknown, (1, 1), '2011-06', '2011-06')
+    assert [entry['origin'] for entry in catalog.entries()] == [ORIGIN_NAME, ORIGIN_UNKNOWN]
+
+
+def write_returns(path, dates):
+    pd.DataFrame({'return_date': dates, 'territory_key': '1', 'product_key': '310',
+                  'return_quantity': 1}).to_csv(path, index=False)
+
+
+def test_range_snapshot_opens_only_matching_months(tmp_path, monkeypatch):
+    monkeypatch.setattr('lake_files.lake_scanner', LakeScanner())
+    lake = tmp_path / 'csv'
+    lake.mkdir()
+    for month in range(1, 7):
+        write_returns(lake / f'Returns {pd.Timestamp(2011, month, 1):%b} 2011.csv', [f'2011-{month:02d}-15'])
+    # No month in the name and rows of two months: always opened, then filtered by row
+    write_returns(lake / 'Returns Misc.csv', ['2011-03-02', '2011-06-02'])
+    opened = []
+
+    def read_returns(path):
+        opened.append(os.path.basename(path))
+        frame = pd.read_csv(path, dtype={'territory_key': str, 'product_key': str})
+        frame['return_date'] = pd.to_datetime(frame['return_date'])
+        frame['source_file'] = os.path.basename(path)
+        return frame
+
+    store = ReturnsStore(lambda: [(str(lake), '.csv', read_returns)])
+    _, frame = store.snapshot_range('2011-03', '2011-04')
+    assert sorted(opened) == ['Returns Apr 2011.csv', 'Returns Mar 2011.csv', 'Returns Misc.csv']
+    assert sorted(frame['return_date'].dt.strftime('%Y-%m-%d')) == ['2011-03-02', '2011-03-15', '2011-04-15']
+
+    _, whole = store.snapshot_range('2011-03', '2011-04', whole_files=True)
+    assert len(whole) == 4
+    assert len(opened) == 3
@@ -0,0 +1,106 @@
+import os
+import threading
+
+import pytest
+
+from lake_files import LakeScanner, TEMP_SUFFIX, file_signature, publish_file
+
+
+def write_text(path, text):
+    with open(path, 'w') as file:
+        file.write(text)
+
+
+def age(path, seconds):
+    # Move a path's mtime into the past
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns - int(seconds * 1e9)))
+
+
+@pytest.fixture
+def lake(tmp_path):
+    root = tmp_path / 'csv'
+    (root / 'ab').mkdir(parents=True)
+    write_text(root / 'Returns Jan.csv', 'a\n')
+    write_text(root / 'ab' / 'Returns Feb.csv', 'b\n')
+    write_text(root / 'notes.txt', 'x\n')
+    for path in (root / 'Returns Jan.csv', root / 'ab' / 'Returns Feb.csv', root / 'ab', root):
+        age(path, 3600)
+    return root
+
+
+def test_lists_files_recursively(lake):
+    listing = LakeScanner().list(str(lake), '.csv')
+    assert [os.path.relpath(path, lake) for path, _ in listing] == ['Returns Jan.csv',
+                                                                   os.path.join('ab', 'Returns Feb.csv')]
+    assert listing[0][1] == file_signature(lake / 'Returns Jan.csv')
+
+
+def test_sees_in_place_overwrite_of_old_file(lake):
+    scanner = LakeScanner()
+    path = lake / 'ab' / 'Returns Feb.csv'
+    before = dict(scanner.list(str(lake), '.csv'))[str(path)]
+    folder_mtime = os.stat(lake / 'ab').st_mtime_ns
+
+    # Rewrite in place: the folder's mtime does not change
+    write_text(path, 'bigger content\n')
+    age(path, 3600)
+    assert os.stat(lake / 'ab').st_mtime_ns == folder_mtime
+
+    after = dict(scanner.list(str(lake), '.csv'))[str(path)]
+    assert after != before
+    assert after[0] == len('bigger content\n')
+    assert scanner.stats['folders_cached'] > 0
+
+
+def test_recent_cutoff_is_opt_in(lake):
+    scanner = LakeScanner(recent_seconds=60)
+    path = lake / 'ab' / 'Returns Feb.csv'
+    before = dict(scanner.list(str(lake), '.csv'))[str(path)]
+    write_text(path, 'bigger content\n')
+    age(path, 3600)
+    assert dict(scanner.list(str(lake), '.csv'))[str(path)] == before
+
+
+def test_sees_added_and_removed_files(lake):
+    scanner = LakeScanner()
+    scanner.list(str(lake), '.csv')
+    publish_file(str(lake / 'ab' / 'Returns Mar.csv'), lambda path: write_text(path, 'c\n'))
+    os.remove(lake / 'Returns Jan.csv')
+    names = [os.path.basename(path) for path, _ in scanner.list(str(lake), '.csv')]
+    assert names == ['Returns Feb.csv', 'Returns Mar.csv']
+
+
+def test_publish_file_replaces_without_leaving_temp_files(tmp_path):
+    path = tmp_path / 'csv' / 'Returns Jan.csv'
+    publish_file(str(path), lambda tmp: write_text(tmp, 'old\n'))
+    publish_file(str(path), lambda tmp: write_text(tmp, 'new\n'))
+    assert path.read_text() == 'new\n'
+    assert [name for name in os.listdir(path.parent) if name.endswith(TEMP_SUFFIX)] == []
+    assert [os.path.basename(p) for p, _ in LakeScanner().list(str(path.parent), '.csv')] == ['Returns Jan.csv']
+
+
+def test_publish_file_keeps_previous_file_when_write_fails(tmp_path):
+    path = tmp_path / 'Returns Jan.csv'
+    publish_file(str(path), lambda tmp: write_text(tmp, 'old\n'))
+
+    def failing(tmp):
+        write_text(tmp, 'partial')
+        raise OSError('disk full')
+
+    with pytest.raises(OSError):
+        publish_file(str(path), failing)
+    assert path.read_text() == 'old\n'
+    assert [name for name in os.listdir(tmp_path) if name.endswith(TEMP_SUFFIX)] == []
+
+
+def test_concurrent_publishes_leave_one_whole_file(tmp_path):
+    path = tmp_path / 'Returns Jan.csv'
+    contents = [f'{index}\n' * 1000 for index in range(8)]
+    threads = [threading.Thread(target=publish_file, args=(str(path), lambda tmp, text=text: write_text(tmp, text)))
+               for text in contents]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert path.read_text() in contents
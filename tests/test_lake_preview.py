@@ -0,0 +1,49 @@
+import pytest
+
+from benchmark_data import generate_return_rows, write_returns_csv, write_returns_pdf, write_returns_txt
+from lake_files import LakeScanner
+from lake_preview import preview_file, preview_lake
+
+WRITERS = {'csv': write_returns_csv, 'txt': write_returns_txt, 'pdf': write_returns_pdf}
+
+
+def rows_of_march(n_rows):
+    rows = generate_return_rows(n_rows, month=3)
+    # First and last day fixed, so the date range is known
+    return [('3/1/2011',) + rows[0][1:]] + rows[1:-1] + [('3/31/2011',) + rows[-1][1:]]
+
+
+@pytest.mark.parametrize('extension', ['csv', 'txt', 'pdf'])
+def test_small_file_preview_is_exact(tmp_path, extension):
+    path = WRITERS[extension](str(tmp_path / f'Returns Mar 2011.{extension}'), rows_of_march(8))
+    preview = preview_file(path, n_rows=20)
+    assert preview['columns'] == ['ReturnDate', 'TerritoryKey', 'ProductKey', 'ReturnQuantity']
+    assert preview['sample_rows'] == 8
+    assert preview['sample'][0]['return_date'] == '3/1/2011'
+    assert (preview['estimated_rows'], preview['estimate_basis']) == (8, 'exact')
+    assert (preview['date_min'], preview['date_max']) == ('2011-03-01', '2011-03-31')
+
+
+@pytest.mark.parametrize('extension, basis', [('csv', 'bytes'), ('txt', 'bytes'), ('pdf', 'pages')])
+def test_large_file_preview_reads_head_and_tail(tmp_path, extension, basis):
+    path = WRITERS[extension](str(tmp_path / f'Returns Mar 2011.{extension}'), rows_of_march(600))
+    preview = preview_file(path, n_rows=10)
+    assert preview['sample_rows'] == 10
+    assert preview['estimate_basis'] == basis
+    assert 500 <= preview['estimated_rows'] <= 700
+    assert (preview['date_min'], preview['date_max']) == ('2011-03-01', '2011-03-31')
+
+
+def test_unreadable_file_reports_an_error(tmp_path):
+    path = tmp_path / 'Returns Mar 2011.pdf'
+    path.write_bytes(b'not a pdf')
+    assert 'error' in preview_file(str(path))
+
+
+def test_lake_preview_filters_by_name(tmp_path, monkeypatch):
+    monkeypatch.setattr('lake_files.lake_scanner', LakeScanner())
+    for month in ('Jan', 'Feb'):
+        write_returns_csv(str(tmp_path / f'Returns {month} 2011.csv'), generate_return_rows(3))
+    previews = preview_lake([(str(tmp_path), '.csv')], n_rows=5000, name='feb')
+    assert [preview['file'] for preview in previews] == ['Returns Feb 2011.csv']
+    assert previews[0]['sample_rows'] == 3
@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+
+from lake_query import QueryEngine, QueryError, QueryTimeout
+
+
+@pytest.fixture
+def engine():
+    returns = pd.DataFrame({'return_date': pd.to_datetime(['2011-01-05', '2011-02-07']),
+                            'product_key': ['310', '311'], 'return_quantity': [1, 2]})
+    return QueryEngine({'returns': lambda: ('v1', returns)})
+
+
+def test_select_reads_the_cached_frame(engine):
+    result = engine.query('SELECT return_date, SUM(return_quantity) AS total FROM returns GROUP BY return_date')
+    assert result['columns'] == ['return_date', 'total']
+    assert result['rows'] == [['2011-01-05', 1], ['2011-02-07', 2]]
+    assert result['versions'] == {'returns': 'v1'}
+
+
+def test_row_limit_truncates(engine):
+    result = engine.query('SELECT * FROM returns', limit=1)
+    assert result['row_count'] == 1
+    assert result['truncated']
+
+
+@pytest.mark.parametrize('sql', [
+    "INSERT INTO returns (product_key) VALUES ('999')",
+    "DELETE FROM returns",
+    "PRAGMA table_info(returns)",
+    "ATTACH DATABASE ':memory:' AS other",
+    "CREATE TEMP TABLE copy AS SELECT * FROM returns",
+    "SELECT 1; DELETE FROM returns",
+    "",
+])
+def test_rejects_everything_but_a_single_select(engine, sql):
+    with pytest.raises(QueryError):
+        engine.query(sql)
+    assert engine.query('SELECT COUNT(*) FROM returns')['rows'] == [[2]]
+
+
+def test_timeout_interrupts_long_queries(engine):
+    sql = ('WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) '
+           'SELECT COUNT(*) FROM n')
+    with pytest.raises(QueryTimeout):
+        engine.query(sql, time_limit=0.05)
+
+
+def test_blobs_are_returned_as_hex(engine):
+    result = engine.query("SELECT x'00ff' AS raw, length(randomblob(4)) AS size, randomblob(2) AS noise")
+    raw, size, noise = result['rows'][0]
+    assert raw == '00ff'
+    assert size == 4
+    assert isinstance(noise, str) and len(noise) == 4
@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from lake_snapshot import read_snapshot, write_snapshot
+
+
+@pytest.fixture
+def frame():
+    return pd.DataFrame({
+        'return_date': pd.to_datetime(['2011-01-15', None, '2011-02-01']),
+        'return_quantity': np.array([1, 2, 3], dtype='int64'),
+        'amount': [1.5, np.nan, 3.0],
+        'territory_key': ['2', None, '2'],
+        'month': pd.Categorical(['2011-01', '2011-01', '2011-02']),
+        'valid': [True, False, True],
+    })
+
+
+def test_round_trip_keeps_values_and_dtypes(tmp_path, frame):
+    path = str(tmp_path / 'returns.snap')
+    manifest = {'data_lake/csv/Returns Jan 2011.csv': (120, 1_700_000_000_000_000_000)}
+    write_snapshot(path, 'returns', {'returns': frame, 'empty': frame.iloc[:0]}, manifest, meta={'version': 'v1'})
+
+    snapshot = read_snapshot(path, 'returns')
+    pd.testing.assert_frame_equal(snapshot.tables['returns'], frame)
+    assert list(snapshot.tables['empty'].columns) == list(frame.columns)
+    assert snapshot.tables['empty'].empty
+    assert snapshot.meta == {'version': 'v1'}
+    assert snapshot.matches(manifest)
+
+
+def test_stale_manifest_is_rejected(tmp_path, frame):
+    lake_file = tmp_path / 'Returns Jan 2011.csv'
+    lake_file.write_text('ReturnDate\n')
+    stat = os.stat(lake_file)
+    signatures = {str(lake_file): (stat.st_size, stat.st_mtime_ns)}
+    path = str(tmp_path / 'returns.snap')
+    write_snapshot(path, 'returns', {'returns': frame}, signatures)
+
+    snapshot = read_snapshot(path, 'returns')
+    assert snapshot.matches(signatures)
+    lake_file.write_text('ReturnDate\n1/1/2011\n')
+    stat = os.stat(lake_file)
+    assert not snapshot.matches({str(lake_file): (stat.st_size, stat.st_mtime_ns)})
+    assert not snapshot.matches({**signatures, str(tmp_path / 'Returns Feb 2011.csv'): (1, 1)})
+    assert not snapshot.matches({})
+
+
+def test_unusable_files_are_ignored(tmp_path, frame):
+    path = tmp_path / 'returns.snap'
+    assert read_snapshot(str(path), 'returns') is None
+    write_snapshot(str(path), 'returns', {'returns': frame}, {})
+    assert read_snapshot(str(path), 'purchases') is None
+
+    data = path.read_bytes()
+    path.write_bytes(b'NOTASNAP' + data[8:])
+    assert read_snapshot(str(path), 'returns') is None
+    path.write_bytes(data[:40])
+    assert read_snapshot(str(path), 'returns') is None
+
+
+def test_write_replaces_the_file_atomically(tmp_path, frame):
+    path = str(tmp_path / 'snapshots' / 'returns.snap')
+    write_snapshot(path, 'returns', {'returns': frame}, {}, meta={'version': 'v1'})
+    old = read_snapshot(path, 'returns')
+    write_snapshot(path, 'returns', {'returns': frame.iloc[:1]}, {}, meta={'version': 'v2'})
+
+    # The first snapshot stays readable through its mapping of the replaced file
+    assert len(old.tables['returns']) == 3
+    assert read_snapshot(path, 'returns').meta == {'version': 'v2'}
+    assert os.listdir(tmp_path / 'snapshots') == ['returns.snap']
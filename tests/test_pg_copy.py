@@ -0,0 +1,80 @@
+import csv
+import io
+
+import pytest
+from sqlalchemy import create_engine
+
+from pg_copy import CsvRowStream, bulk_insert_method, copy_replace_table, copy_rows, qualified_name
+
+ROWS = [('PO-1', 1.5, 'Purchases Jan.csv'), ('PO-2', None, 'a "quoted", name'), ('PO-3', 3.0, 'line\nbreak')]
+
+
+def parse(text):
+    return [tuple(row) for row in csv.reader(io.StringIO(text))]
+
+
+@pytest.mark.parametrize('buffer_rows', [1, 2, 100])
+def test_stream_formats_rows_as_csv(buffer_rows):
+    stream = CsvRowStream(ROWS, buffer_rows=buffer_rows)
+    assert parse(stream.read()) == [('PO-1', '1.5', 'Purchases Jan.csv'), ('PO-2', '', 'a "quoted", name'),
+                                    ('PO-3', '3.0', 'line\nbreak')]
+    assert stream.rows_written == 3
+    assert stream.read() == ''
+
+
+def test_stream_reads_in_sizes_and_lines():
+    expected = CsvRowStream(ROWS).read()
+    stream = CsvRowStream(ROWS, buffer_rows=1)
+    chunks = []
+    while chunk := stream.read(7):
+        assert len(chunk) <= 7
+        chunks.append(chunk)
+    assert ''.join(chunks) == expected
+
+    stream = CsvRowStream(ROWS, buffer_rows=1)
+    assert stream.readline() == 'PO-1,1.5,Purchases Jan.csv\n'
+    assert stream.readline(4) == 'PO-2'
+    assert stream.read() == expected.split('PO-2', 1)[1]
+
+
+class FakeCursor:
+    def __init__(self, copied):
+        self.copied = copied
+
+    def copy_expert(self, sql, stream):
+        self.copied.append((sql, stream.read()))
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    # Stands in for both the SQLAlchemy connection and its DBAPI connection
+    def __init__(self):
+        self.connection = self
+        self.copied = []
+
+    def cursor(self):
+        return FakeCursor(self.copied)
+
+
+class FakeTable:
+    name = 'purchases'
+    schema = 'sales'
+
+
+def test_copy_rows_streams_into_copy_from_stdin():
+    conn = FakeConnection()
+    assert copy_rows(FakeTable(), conn, ['Purchase_ID', 'Total_Amount', 'Source_File'], iter(ROWS)) == 3
+    sql, data = conn.copied[0]
+    assert sql == ('COPY "sales"."purchases" ("Purchase_ID", "Total_Amount", "Source_File") '
+                   'FROM STDIN WITH (FORMAT csv)')
+    assert len(parse(data)) == 3
+
+
+def test_other_engines_keep_pandas_inserts(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'load.db'}")
+    assert bulk_insert_method(engine) is None
+    with pytest.raises(ValueError):
+        copy_replace_table(engine, 'purchases', None)
+    assert qualified_name('odd"name') == '"odd""name"'
@@ -0,0 +1,99 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from pipelined_load import run_pipeline
+
+
+def frame_of(item):
+    return pd.DataFrame({'item': [item] * (item % 3)})  # Every third item is empty
+
+
+def run_with_deadline(*args, **kwargs):
+    # run_pipeline in a thread, so a deadlock fails the test instead of hanging it
+    outcome = {}
+
+    def target():
+        try:
+            outcome['result'] = run_pipeline(*args, **kwargs)
+        except Exception as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    thread.join(10)
+    assert not thread.is_alive(), "run_pipeline did not return"
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome['result']
+
+
+def test_every_batch_is_loaded():
+    loaded = []
+    lock = threading.Lock()
+
+    def load(frame):
+        with lock:
+            loaded.extend(frame['item'])
+        return len(frame)
+
+    stats = run_with_deadline(range(30), frame_of, load, extract_workers=3, load_workers=2, queue_batches=2)
+    expected = [item for item in range(30) for _ in range(item % 3)]
+    assert sorted(loaded) == expected
+    assert stats['rows_loaded'] == len(expected)
+    assert stats['extract']['batches'] == 30
+    assert stats['load']['batches'] == 20
+
+
+def test_queue_bounds_batches_held_in_memory():
+    extract_workers, load_workers, queue_batches = 2, 1, 3
+    counts = {'extracted': 0, 'loaded': 0, 'held': 0}
+    lock = threading.Lock()
+
+    def extract(item):
+        with lock:
+            counts['extracted'] += 1
+            counts['held'] = max(counts['held'], counts['extracted'] - counts['loaded'])
+        return pd.DataFrame({'item': [item]})
+
+    def load(frame):
+        time.sleep(0.005)  # Loading is the slower stage
+        with lock:
+            counts['loaded'] += 1
+        return len(frame)
+
+    stats = run_with_deadline(range(40), extract, load, extract_workers=extract_workers,
+                              load_workers=load_workers, queue_batches=queue_batches)
+    assert stats['rows_loaded'] == 40
+    assert stats['peak_queue_depth'] <= queue_batches
+    # Queued batches, plus one being loaded and one per extractor waiting to queue
+    assert counts['held'] <= queue_batches + load_workers + extract_workers
+
+
+def test_extract_error_stops_the_pipeline():
+    extracted = []
+
+    def extract(item):
+        extracted.append(item)
+        if item == 2:
+            raise ValueError('unreadable file')
+        return pd.DataFrame({'item': [item]})
+
+    with pytest.raises(ValueError, match='unreadable file'):
+        run_with_deadline(range(100), extract, len, extract_workers=1)
+    assert extracted == [0, 1, 2]
+
+
+def test_load_error_propagates_while_extractors_wait_on_a_full_queue():
+    loads = []
+
+    def load(frame):
+        loads.append(len(frame))
+        raise ConnectionError('database unavailable')
+
+    with pytest.raises(ConnectionError, match='database unavailable'):
+        run_with_deadline(range(100), lambda item: pd.DataFrame({'item': [item]}), load,
+                          extract_workers=2, queue_batches=1)
+    assert len(loads) == 1
@@ -0,0 +1,76 @@
+import importlib
+import os
+
+import pytest
+
+from benchmark_data import build_purchases_lake, generate_purchase_rows, write_purchases_csv
+
+
+@pytest.fixture(scope='module')
+def purchase_api():
+    # The module builds its own processor at import; keep it off the snapshot directory
+    previous = os.environ.get('LAKE_SNAPSHOT_DIR')
+    os.environ['LAKE_SNAPSHOT_DIR'] = ''
+    try:
+        yield importlib.import_module('purchase_data_api')
+    finally:
+        if previous is None:
+            os.environ.pop('LAKE_SNAPSHOT_DIR', None)
+        else:
+            os.environ['LAKE_SNAPSHOT_DIR'] = previous
+
+
+@pytest.fixture
+def lake(tmp_path):
+    build_purchases_lake(tmp_path / 'lake', 4, formats=('.csv',))
+    return tmp_path
+
+
+def make_processor(purchase_api, lake):
+    root = lake / 'lake'
+    return purchase_api.DataProcessor(csv_dir=str(root / 'csv'), pdf_dir=str(root / 'pdf'),
+                                      txt_dir=str(root / 'txt'), snapshot_path=str(lake / 'purchases.snap'))
+
+
+def test_expired_cache_rewrites_snapshot_only_when_lake_changed(purchase_api, lake, monkeypatch):
+    writes = []
+    write_snapshot = purchase_api.write_snapshot
+
+    def counting_write(path, *args, **kwargs):
+        writes.append(path)
+        return write_snapshot(path, *args, **kwargs)
+
+    monkeypatch.setattr(purchase_api, 'write_snapshot', counting_write)
+    processor = make_processor(purchase_api, lake)
+    processor._cache_duration = 0
+
+    first = processor.get_snapshot()
+    second = processor.get_snapshot()
+    assert second[0] == first[0]
+    assert len(writes) == 1
+
+    path = lake / 'lake' / 'csv' / 'Purchases 02.csv'
+    write_purchases_csv(str(path), generate_purchase_rows(3, month=2, seed=5))
+    version, frame = processor.get_snapshot()
+    assert version != first[0]
+    assert len(frame) == 7
+    assert len(writes) == 2
+
+
+def test_snapshot_pairs_version_and_frame(purchase_api, lake):
+    processor = make_processor(purchase_api, lake)
+    snapshot = processor.get_snapshot()
+    assert processor.get_snapshot() is snapshot
+    assert processor.get_purchase_frame() is snapshot[1]
+
+    warm = make_processor(purchase_api, lake)
+    assert warm.warm_start()
+    version, frame = warm.get_snapshot()
+    assert version == snapshot[0]
+    assert frame['Purchase_ID'].tolist() == snapshot[1]['Purchase_ID'].tolist()
+
+
+def test_warm_start_rejects_a_snapshot_of_another_lake(purchase_api, lake):
+    make_processor(purchase_api, lake).get_snapshot()
+    write_purchases_csv(str(lake / 'lake' / 'csv' / 'Purchases 02.csv'), generate_purchase_rows(3, seed=5))
+    assert not make_processor(purchase_api, lake).warm_start()
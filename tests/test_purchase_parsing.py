@@ -0,0 +1,34 @@
+import pandas as pd
+
+from data_process_calculate import PURCHASE_COLUMNS, clean_purchases_tsv, parse_purchase_lines
+from purchase_data_api import DataProcessor
+
+
+def test_parse_purchase_lines_skips_headers_and_bad_rows():
+    lines = [
+        'Purchase_Date Purchase_ID Customer_ID Product_ID Quantity Unit_Price Total_Amount',
+        '2011-01-05 P0001 C01 PR1 2 10.00 20.00',
+        '2011-01-06 X0002 C02 PR2 1 5.00 5.00',
+        '2011-01-07 P0003 C03 PR3 1 5.00 n/a',
+        'too short',
+        '2011-01-08 P0004 C04 PR4 3 1.50 4.50',
+    ]
+    frame = parse_purchase_lines(lines, 'Purchases 01.pdf')
+    assert list(frame.columns) == PURCHASE_COLUMNS
+    assert frame['Purchase_ID'].tolist() == ['P0001', 'P0004']
+    assert frame['Total_Amount'].tolist() == [20.0, 4.5]
+
+
+def test_clean_purchases_tsv_drops_only_bad_cells():
+    raw = pd.DataFrame({'Product_ID': ['PR1', None, 'PR3'], 'Total_Amount': ['20.5', '3', 'oops']})
+    frame = clean_purchases_tsv(raw, 'Purchases 02.txt')
+    assert frame['Purchase_ID'].tolist() == ['PR1']
+    assert frame['Total_Amount'].dtype == 'float64'
+
+
+def test_api_txt_extractor_keeps_the_file_with_a_bad_amount(tmp_path):
+    path = tmp_path / 'Purchases 02.txt'
+    path.write_text('Product_ID\tTotal_Amount\nPR1\t20.5\nPR2\tnot-a-number\nPR3\t7\n', encoding='utf-8')
+    frame = DataProcessor()._extract_from_txt(str(path))
+    assert frame['Purchase_ID'].tolist() == ['PR1', 'PR3']
+    assert frame['Source_File'].unique().tolist() == ['Purchases 02.txt']
@@ -0,0 +1,67 @@
+import threading
+import time
+
+import pytest
+
+from request_control import AdmissionGate, Overloaded, SingleFlight
+
+
+def run_threads(count, target):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def test_single_flight_runs_concurrent_calls_once():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls, results = [], []
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return 42
+
+    threads = run_threads(4, lambda: results.append(flights.do('save', work)))
+    deadline = time.monotonic() + 5
+    while sum(flights.in_flight().values()) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert sorted(results) == [(42, False), (42, True), (42, True), (42, True)]
+    assert flights.in_flight() == {}
+
+
+def test_single_flight_shares_errors_and_forgets_the_key():
+    flights = SingleFlight()
+
+    def fail():
+        raise RuntimeError('load failed')
+
+    with pytest.raises(RuntimeError):
+        flights.do('save', fail)
+    assert flights.do('save', lambda: 'again') == ('again', False)
+
+
+def test_admission_gate_refuses_beyond_the_queue():
+    gate = AdmissionGate(max_active=1, max_queued=0, queue_timeout=5)
+    with gate.admit():
+        with pytest.raises(Overloaded):
+            with gate.admit():
+                pass
+    assert gate.status()['rejected'] == 1
+    with gate.admit():
+        assert gate.status()['active'] == 1
+
+
+def test_admission_gate_times_out_queued_operations():
+    gate = AdmissionGate(max_active=1, max_queued=1, queue_timeout=0.05)
+    with gate.admit():
+        with pytest.raises(Overloaded) as refused:
+            with gate.admit():
+                pass
+    assert refused.value.retry_after == 1
+    assert gate.status()['queued'] == 0
@@ -0,0 +1,57 @@
+import pandas as pd
+import pytest
+
+from return_rates import OrderVolumes, create_orders_standin, return_rates
+
+
+@pytest.fixture
+def orders(tmp_path):
+    engine = create_orders_standin(f"sqlite:///{tmp_path / 'orders.db'}", pd.DataFrame({
+        'order_date': ['2011-01-03', '2011-01-20', '2011-01-21', '2011-02-02'],
+        'territory_key': [1, 1, 2, 1],
+        'product_key': [310, 310, 310, 311],
+        'order_quantity': [4, 6, 5, 2],
+    }))
+    return OrderVolumes(engine)
+
+
+def returns_rollup(rows):
+    return pd.DataFrame(rows, columns=['month', 'territory_key', 'product_key', 'sum_quantity'])
+
+
+def test_rollup_is_aggregated_by_the_database(orders):
+    rollup = orders.rollup().sort_values(['month', 'territory_key']).reset_index(drop=True)
+    assert rollup.to_dict('records') == [
+        {'month': '2011-01', 'territory_key': '1', 'product_key': '310', 'order_quantity': 10, 'order_lines': 2},
+        {'month': '2011-01', 'territory_key': '2', 'product_key': '310', 'order_quantity': 5, 'order_lines': 1},
+        {'month': '2011-02', 'territory_key': '1', 'product_key': '311', 'order_quantity': 2, 'order_lines': 1},
+    ]
+    assert orders.status()['groups'] == 3
+
+
+def test_rates_join_returns_with_orders(orders):
+    returned = returns_rollup([('2011-01', '1', '310', 2), ('2011-01', '2', '310', 1),
+                               ('2011-03', '4', '999', 3)])
+    rates = return_rates(returned, orders.rollup(), ['month'])
+    assert rates['month'].tolist() == ['2011-01', '2011-02', '2011-03']
+    assert rates['order_quantity'].tolist() == [15, 2, 0]
+    assert rates['return_quantity'].tolist() == [3, 0, 3]
+    assert rates['return_rate'].tolist()[:2] == [0.2, 0.0]
+    assert pd.isna(rates['return_rate'].iloc[2])  # Returned without matching orders
+
+
+def test_rates_by_month_range(orders):
+    returned = returns_rollup([('2011-01', '1', '310', 2), ('2011-02', '1', '311', 1)])
+    rates = return_rates(returned, orders.rollup(), ['territory_key'], start='2011-02')
+    assert rates.to_dict('records') == [{'territory_key': '1', 'order_quantity': 2, 'return_quantity': 1,
+                                         'return_rate': 0.5}]
+    with pytest.raises(ValueError):
+        return_rates(returned, orders.rollup(), ['customer'])
+
+
+def test_failed_load_keeps_the_previous_rollup(orders):
+    version = orders.version()
+    orders.query = 'SELECT * FROM missing_table'
+    assert not orders.load()
+    assert orders.version() == version
+    assert orders.status()['last_error'] is not None
@@ -0,0 +1,133 @@
+import gzip
+import importlib
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+from request_control import AdmissionGate
+
+LAKE_FILE = 'AdventureWorks Returns Data - Jan 2011.csv'
+
+
+@pytest.fixture(scope='module')
+def returns_app(tmp_path_factory):
+    # The app reads the lake relative to the working directory and connects at import
+    workdir = tmp_path_factory.mktemp('returns_api')
+    os.makedirs(workdir / 'data_lake' / 'csv')
+    (workdir / 'data_lake' / 'csv' / LAKE_FILE).write_text(
+        'ReturnDate,TerritoryKey,ProductKey,ReturnQuantity\n1/1/2011,2,781,1\n1/2/2011,10,724,2\n')
+    previous = os.getcwd(), {name: os.environ.get(name) for name in ('RETURNS_DATABASE_URL', 'LAKE_SNAPSHOT_DIR')}
+    os.environ['RETURNS_DATABASE_URL'] = f"sqlite:///{workdir / 'returns.db'}"
+    os.environ['LAKE_SNAPSHOT_DIR'] = ''
+    os.chdir(workdir)
+    sys.modules.pop('data_lake_solution', None)
+    try:
+        yield importlib.import_module('data_lake_solution')
+    finally:
+        os.chdir(previous[0])
+        for name, value in previous[1].items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+@pytest.fixture
+def client(returns_app):
+    return returns_app.app.test_client()
+
+
+def test_imports_without_the_sql_server_driver(returns_app):
+    assert 'pyodbc' not in sys.modules
+
+
+def test_get_returns(client):
+    response = client.get('/api/returns')
+    assert response.status_code == 200
+    assert [row['product_key'] for row in response.get_json()['data']] == ['781', '724']
+
+
+def test_unchanged_lake_answers_304(client):
+    first = client.get('/api/returns')
+    etag = first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'no-cache'
+
+    again = client.get('/api/returns', headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.get_data() == b''
+    assert client.get('/api/returns?enrich=true', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_gzip_variant_shares_the_etag_version(client):
+    plain = client.get('/api/returns')
+    zipped = client.get('/api/returns', headers={'Accept-Encoding': 'gzip'})
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(zipped.get_data()) == plain.get_data()
+    assert client.get('/api/returns', headers={'If-None-Match': zipped.headers['ETag']}).status_code == 304
+
+
+def test_changed_lake_gets_a_new_etag(client, returns_app):
+    etag = client.get('/api/returns').headers['ETag']
+    path = os.path.join('data_lake', 'csv', 'AdventureWorks Returns Data - Feb 2011.csv')
+    with open(path, 'w') as file:
+        file.write('ReturnDate,TerritoryKey,ProductKey,ReturnQuantity\n2/1/2011,3,310,4\n')
+    try:
+        changed = client.get('/api/returns', headers={'If-None-Match': etag})
+        assert changed.status_code == 200
+        assert changed.headers['ETag'] != etag
+        assert len(changed.get_json()['data']) == 3
+    finally:
+        os.remove(path)
+
+
+def test_save_is_refused_with_429_when_no_slot_is_free(client, returns_app, monkeypatch):
+    gate = AdmissionGate(max_active=1, max_queued=0)
+    monkeypatch.setattr(returns_app, 'save_gate', gate)
+    with gate.admit():
+        response = client.get('/api/returns?save=true&pipeline=false')
+    assert response.status_code == 429
+    assert response.headers['Retry-After'] == '1'
+    assert client.get('/api/returns?save=true&pipeline=false').status_code == 200
+
+
+def test_concurrent_identical_saves_share_one_load(returns_app, monkeypatch):
+    release = threading.Event()
+    loads = []
+
+    def slow_save(frame):
+        loads.append(len(frame))
+        release.wait(5)
+        return len(frame)
+
+    monkeypatch.setattr(returns_app, 'admitted_save', slow_save)
+    messages = []
+
+    def save():
+        response = returns_app.app.test_client().get('/api/returns?save=true&pipeline=false')
+        messages.append((response.status_code, response.get_json()['message']))
+
+    threads = [threading.Thread(target=save) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while sum(returns_app.save_flights.in_flight().values()) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(loads) == 1
+    assert [status for status, _ in messages] == [200, 200, 200]
+    assert sum('shared with a concurrent identical save' in message for _, message in messages) == 2
+
+
+def test_new_dimension_version_changes_the_etag(client, returns_app, monkeypatch):
+    etag = client.get('/api/returns').headers['ETag']
+    assert client.get('/api/returns', headers={'If-None-Match': etag}).status_code == 304
+
+    monkeypatch.setattr(returns_app.dimensions, 'version', lambda: 'reloaded-dimensions')
+    response = client.get('/api/returns', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
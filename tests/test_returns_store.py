@@ -0,0 +1,119 @@
+import os
+
+import pandas as pd
+import pytest
+
+from lake_files import LakeScanner
+from returns_store import ReturnsStore
+
+
+def read_returns(path):
+    frame = pd.read_csv(path, dtype={'territory_key': str, 'product_key': str})
+    frame['return_date'] = pd.to_datetime(frame['return_date'])
+    frame['source_file'] = os.path.basename(path)
+    return frame
+
+
+def write_returns(path, month, products):
+    pd.DataFrame({'return_date': f'2011-{month:02d}-15', 'territory_key': '1', 'product_key': products,
+                  'return_quantity': 1}).to_csv(path, index=False)
+
+
+@pytest.fixture
+def lake(tmp_path, monkeypatch):
+    # A private scanner so cached listings of other tests are not shared
+    monkeypatch.setattr('lake_files.lake_scanner', LakeScanner())
+    directory = tmp_path / 'csv'
+    directory.mkdir()
+    write_returns(directory / 'Returns Jan 2011.csv', 1, ['310', '311', '312'])
+    write_returns(directory / 'Returns Feb 2011.csv', 2, ['310', '313'])
+    return directory
+
+
+def test_sketch_counts_distinct_products_per_month(lake):
+    store = ReturnsStore(lambda: [(str(lake), '.csv', read_returns)])
+    _, sketches = store.sketch(['month'])
+    assert {key: round(hll.estimate()) for key, (hll, _) in sketches.items()} == {('2011-01',): 3, ('2011-02',): 2}
+
+
+def test_sketch_tolerates_files_loaded_meanwhile(lake, monkeypatch):
+    store = ReturnsStore(lambda: [(str(lake), '.csv', read_returns)])
+    file_sketches = store._file_sketches
+    uploads = [lake / 'Returns Mar 2011.csv']
+
+    def upload_while_sketching(*args):
+        if uploads:
+            # e.g. a batch upload's background extraction, after sketch() refreshed the store
+            upload = uploads.pop()
+            write_returns(upload, 3, ['314'])
+            store.load_file(str(upload))
+        return file_sketches(*args)
+
+    monkeypatch.setattr(store, '_file_sketches', upload_while_sketching)
+    _, sketches = store.sketch([])
+    assert round(sketches[()][0].estimate()) >= 4
+
+
+def test_validation_version_change_extracts_files_again(lake):
+    version = ['dims-a-2026-10-18']
+    extracted = []
+
+    def read_counted(path):
+        extracted.append(os.path.basename(path))
+        return read_returns(path).assign(territory_key=version[0][:6])
+
+    store = ReturnsStore(lambda: [(str(lake), '.csv', read_counted)], validation_version=lambda: version[0])
+    _, frame = store.snapshot()
+    assert len(extracted) == 2
+    store.snapshot()
+    assert len(extracted) == 2
+
+    version[0] = 'dims-b-2026-10-19'
+    _, frame = store.snapshot()
+    assert len(extracted) == 4
+    assert frame['territory_key'].unique().tolist() == ['dims-b']
+    _, sketches = store.sketch(['territory_key'])
+    assert list(sketches) == [('dims-b',)]
+
+
+def test_warm_start_rejects_a_snapshot_of_another_validation_version(lake, tmp_path):
+    version = ['dims-a']
+    snapshot_path = str(tmp_path / 'returns.snap')
+
+    def make_store():
+        return ReturnsStore(lambda: [(str(lake), '.csv', read_returns)], snapshot_path=lambda: snapshot_path,
+                            validation_version=lambda: version[0])
+
+    make_store().refresh()
+    assert make_store().warm_start()
+    version[0] = 'dims-b'
+    store = make_store()
+    assert not store.warm_start()
+    assert len(store.frame()) == 5
+
+
+def test_changes_report_a_replaced_file_once_after_the_watermark(lake):
+    store = ReturnsStore(lambda: [(str(lake), '.csv', read_returns)])
+    watermark, changed, removed = store.changes()
+    assert sorted(os.path.basename(path) for path, _, _ in changed) == ['Returns Feb 2011.csv',
+                                                                         'Returns Jan 2011.csv']
+    assert removed == []
+    assert store.changes(watermark) == (watermark, [], [])
+
+    # Replaced the way uploads publish files: a new file renamed over the old one
+    replacement = lake / 'upload.tmp'
+    write_returns(replacement, 1, ['320', '321', '322', '323'])
+    os.replace(replacement, lake / 'Returns Jan 2011.csv')
+    after_replace, changed, removed = store.changes(watermark)
+    assert [(os.path.basename(path), frame['product_key'].tolist()) for path, _, frame in changed] == \
+        [('Returns Jan 2011.csv', ['320', '321', '322', '323'])]
+    assert changed[0][1] > watermark
+    assert after_replace == changed[0][1]
+    assert removed == []
+
+    os.remove(lake / 'Returns Feb 2011.csv')
+    latest, changed, removed = store.changes(after_replace)
+    assert changed == []
+    assert [(os.path.basename(path), sequence > after_replace) for path, sequence in removed] == \
+        [('Returns Feb 2011.csv', True)]
+    assert store.changes(latest) == (latest, [], [])
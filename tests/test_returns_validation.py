@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+
+from returns_validation import (RAW_COLUMNS, REASON_INVALID_QUANTITY, split_return_lines, validate_returns,
+                                write_quarantine)
+
+
+def raw_rows(*rows):
+    return pd.DataFrame(list(rows), columns=RAW_COLUMNS)
+
+
+def test_valid_rows_are_typed():
+    accepted, rejected = validate_returns(raw_rows(['1/15/2011', '3', '780', '2']), 'Jan.csv')
+    assert rejected.empty
+    assert accepted.loc[0, 'return_date'] == pd.Timestamp('2011-01-15')
+    assert accepted.loc[0, 'return_quantity'] == 2
+    assert accepted.loc[0, 'source_file'] == 'Jan.csv'
+
+
+@pytest.mark.parametrize('quantity', ['inf', '-inf', '1e30', 'nan', '1.5', 'abc'])
+def test_invalid_quantities_are_quarantined_not_fatal(quantity):
+    accepted, rejected = validate_returns(raw_rows(['1/15/2011', '3', '780', '1'],
+                                                   ['1/16/2011', '3', '780', quantity]), 'Jan.csv')
+    assert accepted['return_quantity'].tolist() == [1]
+    assert rejected['reason'].tolist() == [REASON_INVALID_QUANTITY]
+    assert rejected['row_number'].tolist() == [2]
+
+
+def test_reasons_are_combined():
+    accepted, rejected = validate_returns(raw_rows(['13/45/2011', '99', 'x1', '-1'], ['1/1/2011', None, '700', '1']),
+                                          'Jan.csv')
+    assert accepted.empty
+    assert rejected['reason'].tolist() == ['invalid_date|negative_quantity|unknown_territory|invalid_product_key',
+                                           'missing_fields']
+
+
+def test_dates_after_max_date_are_out_of_range():
+    _, rejected = validate_returns(raw_rows(['1/15/2031', '3', '780', '1']), 'Jan.csv', max_date='2030-12-31')
+    assert rejected['reason'].tolist() == ['date_out_of_range']
+
+
+def test_split_return_lines_pads_short_lines():
+    raw = split_return_lines(['3/1/2011  6  778  1', '3/2/2011 6', ''])
+    assert len(raw) == 2
+    assert raw.loc[1, 'product_key'] is None
+
+
+def test_write_quarantine_replaces_and_removes(tmp_path):
+    _, rejected = validate_returns(raw_rows(['1/15/2011', '3', '780', 'inf']), 'Jan.csv')
+    path = write_quarantine(rejected, 'Jan.csv', str(tmp_path))
+    written = pd.read_csv(path, dtype=str)
+    assert written['reason'].tolist() == [REASON_INVALID_QUANTITY]
+    assert write_quarantine(rejected.iloc[0:0], 'Jan.csv', str(tmp_path)) is None
+    assert not (tmp_path / 'Jan.csv.rejects.csv').exists()
@@ -0,0 +1,58 @@
+import os
+import threading
+
+import pandas as pd
+
+from shared_cache import SharedFileCache
+
+
+def make_source(tmp_path):
+    path = tmp_path / 'Returns Jan 2011.csv'
+    path.write_text('return_quantity\n1\n')
+    stat = os.stat(path)
+    return str(path), (stat.st_size, stat.st_mtime_ns)
+
+
+def test_extracts_once_across_concurrent_readers(tmp_path):
+    path, signature = make_source(tmp_path)
+    calls = []
+    gate = threading.Barrier(4)
+
+    def extract(file_path):
+        calls.append(file_path)
+        return pd.DataFrame({'return_quantity': [1]})
+
+    def read():
+        gate.wait()
+        frames.append(SharedFileCache(str(tmp_path / 'cache'), 'returns').get_or_extract(path, signature, extract))
+
+    frames = []
+    threads = [threading.Thread(target=read) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert all(frame['return_quantity'].tolist() == [1] for frame in frames)
+
+
+def test_version_change_extracts_again_and_drops_old_entry(tmp_path):
+    path, signature = make_source(tmp_path)
+    version = ['dims-a-2026-10-18']
+    cache = SharedFileCache(str(tmp_path / 'cache'), 'returns', version=lambda: version[0])
+    extract = lambda file_path: pd.DataFrame({'version': [version[0]]})
+
+    assert cache.get_or_extract(path, signature, extract)['version'].tolist() == ['dims-a-2026-10-18']
+    assert cache.get_or_extract(path, signature, lambda file_path: None)['version'].tolist() == ['dims-a-2026-10-18']
+
+    version[0] = 'dims-b-2026-10-19'
+    assert cache.get_or_extract(path, signature, extract)['version'].tolist() == ['dims-b-2026-10-19']
+    entries = [name for name in os.listdir(cache.directory) if name.endswith('.pkl')]
+    assert len(entries) == 1
+
+
+def test_leaves_one_lock_file_per_cache_dir(tmp_path):
+    cache = SharedFileCache(str(tmp_path / 'cache'), 'returns')
+    for index in range(20):
+        cache.get_or_extract(str(tmp_path / f'file-{index}.csv'), (index, index), lambda file_path: pd.DataFrame())
+    assert sorted(name for name in os.listdir(cache.directory) if 'lock' in name) == ['.lock']